@@ -0,0 +1,181 @@
+#! /usr/bin/python
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Benchmark the test scripts against the local mock server at several
+    request rates and report utterances per second
+"""
+import csv
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+from argparse import ArgumentParser
+from mock_server import synthetic_intents, DEFAULT_INTENTS, DEFAULT_LATENCY
+
+benchmark_path = os.path.abspath(os.path.dirname(__file__))
+MOCK_SERVER_PATH = os.path.join(benchmark_path, 'mock_server.py')
+utils_path = os.path.join(os.path.dirname(benchmark_path), 'utils')
+TEST_CONVERSATION_PATH = os.path.join(utils_path, 'testConversation.py')
+TEST_CLASSIFIER_PATH = os.path.join(utils_path, 'testNLC.py')
+
+SERVICES = ['v1', 'v2', 'nlu']
+UTTERANCE_COLUMN = 'utterance'
+GOLDEN_INTENT_COLUMN = 'golden intent'
+SERVER_START_TIMEOUT = 30
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, port):
+    server_args = [sys.executable, MOCK_SERVER_PATH, '--port', str(port),
+                   '--intents', str(args.intents),
+                   '--latency', args.latency,
+                   '--throttle_rate', str(args.throttle_rate),
+                   '--error_rate', str(args.error_rate)]
+    if args.retry_after is not None:
+        server_args += ['--retry_after', str(args.retry_after)]
+    server = subprocess.Popen(server_args, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('Mock server did not start')
+
+
+def write_input(file, num_utterances, num_intents):
+    """ Synthetic test input, half of the golden intents match the mock
+        server's top intent and half its second one
+    """
+    utterances = ['benchmark utterance {}'.format(idx)
+                  for idx in range(num_utterances)]
+    golden = [synthetic_intents(utterance, num_intents)[idx % 2]['intent']
+              for idx, utterance in enumerate(utterances)]
+    pd.DataFrame({UTTERANCE_COLUMN: utterances,
+                  GOLDEN_INTENT_COLUMN: golden}) \
+      .to_csv(file, encoding='utf-8', quoting=csv.QUOTE_ALL, index=False)
+
+
+def test_command(service, url, in_file, out_file, rate):
+    if service == 'nlu':
+        return [sys.executable, TEST_CLASSIFIER_PATH,
+                '-l', url + '/instances/benchmark', '-w', 'benchmark-model',
+                '-i', in_file, '-o', out_file, '-r', str(rate),
+                '-a', 'token', '--auth-type', 'bearer',
+                '-t', UTTERANCE_COLUMN, '-g', GOLDEN_INTENT_COLUMN]
+    return [sys.executable, TEST_CONVERSATION_PATH, '-p', service,
+            '-l', url, '-w', 'benchmark-workspace',
+            '-i', in_file, '-o', out_file, '-r', str(rate),
+            '-a', 'token', '--auth-type', 'bearer',
+            '-t', UTTERANCE_COLUMN, '-g', GOLDEN_INTENT_COLUMN]
+
+
+def run_benchmark(service, rate, url, in_file, work_dir, num_utterances):
+    out_file = os.path.join(work_dir, '{}-{}-out.csv'.format(service, rate))
+    start = time.monotonic()
+    returncode = subprocess.run(test_command(service, url, in_file,
+                                             out_file, rate),
+                                stdout=subprocess.DEVNULL).returncode
+    seconds = time.monotonic() - start
+    result = {'service': service, 'rate limit': rate,
+              'utterances': num_utterances,
+              'seconds': round(seconds, 2),
+              'utterances/sec': round(num_utterances / seconds, 1),
+              'status': 'ok' if returncode == 0 else 'failed'}
+    perf_file = os.path.splitext(out_file)[0] + '.perf.json'
+    if os.path.exists(perf_file):
+        with open(perf_file) as f:
+            perf = json.load(f)
+        result.update({'requests/sec': perf['requests_per_second'],
+                       'p50 ms': perf['latency_ms'].get('p50'),
+                       'p95 ms': perf['latency_ms'].get('p95'),
+                       'retries': perf['retries']})
+    return result
+
+
+def func(args):
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='benchmark-')
+    os.makedirs(work_dir, exist_ok=True)
+    in_file = os.path.join(work_dir, 'benchmark-in.csv')
+    write_input(in_file, args.utterances, args.intents)
+
+    port = free_port()
+    url = 'http://127.0.0.1:{}'.format(port)
+    server = start_server(args, port)
+    results = []
+    try:
+        for service in args.services:
+            for rate in args.rates:
+                result = run_benchmark(service, rate, url, in_file, work_dir,
+                                       args.utterances)
+                print("{service} at -r {rate limit}: {utterances/sec} "
+                      "utterances/sec ({status})".format(**result))
+                results.append(result)
+    finally:
+        server.terminate()
+        server.wait()
+
+    out_df = pd.DataFrame(results)
+    out_df.to_csv(args.out_file, encoding='utf-8', quoting=csv.QUOTE_ALL,
+                  index=False)
+    print(out_df.to_string(index=False))
+    print("Wrote benchmark results to {}, test outputs in {}".format(
+        args.out_file, work_dir))
+
+
+def create_parser():
+    parser = ArgumentParser(
+        description='Benchmark test script throughput against a mock server')
+    parser.add_argument('-s', '--services', type=str, nargs='+',
+                        default=SERVICES, choices=SERVICES,
+                        help='Services to benchmark')
+    parser.add_argument('-r', '--rates', type=float, nargs='+',
+                        default=[10, 50, 100],
+                        help='Request rate limits (and concurrency) to benchmark')
+    parser.add_argument('-n', '--utterances', type=int, default=1000,
+                        help='Number of synthetic test utterances')
+    parser.add_argument('-o', '--out_file', type=str,
+                        default='benchmark.csv',
+                        help='Benchmark result file')
+    parser.add_argument('--work_dir', type=str,
+                        help='Directory for test inputs and outputs, a new temporary directory by default')
+    parser.add_argument('--intents', type=int, default=DEFAULT_INTENTS,
+                        help='Number of synthetic intents')
+    parser.add_argument('--latency', type=str, default=DEFAULT_LATENCY,
+                        help="Mock response latency, see mock_server.py")
+    parser.add_argument('--throttle_rate', type=float, default=0.0,
+                        help='Share of requests answered with HTTP 429')
+    parser.add_argument('--error_rate', type=float, default=0.0,
+                        help='Share of requests answered with HTTP 500')
+    parser.add_argument('--retry_after', type=float,
+                        help='Retry-After seconds sent with 429 responses')
+    return parser
+
+
+if __name__ == '__main__':
+    ARGS = create_parser().parse_args()
+    func(ARGS)
@@ -0,0 +1,200 @@
+#! /usr/bin/python
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Local stand-in for the Watson Assistant and NLU endpoints used by the
+    test scripts, for benchmarking without spending API quota.
+
+    Serves v1 workspace message, v2 stateless message and NLU analyze
+    (classifications) under any service URL prefix.  Intents are derived
+    from a hash of the utterance so every run answers the same way.
+"""
+import asyncio
+import hashlib
+import random
+from argparse import ArgumentParser
+from collections import Counter
+from aiohttp import web
+
+DEFAULT_INTENTS = 20
+ALTERNATE_INTENTS = 10
+DEFAULT_LATENCY = 'fixed:0.05'
+
+
+def parse_latency(spec, rng):
+    """ Latency sampler from 'fixed:S', 'uniform:MIN,MAX',
+        'normal:MEAN,STDDEV' or 'lognormal:MU,SIGMA' (seconds)
+    """
+    try:
+        kind, values = spec.split(':')
+        values = [float(value) for value in values.split(',')]
+        samplers = {
+            'fixed': lambda: values[0],
+            'uniform': lambda: rng.uniform(values[0], values[1]),
+            'normal': lambda: max(0.0, rng.gauss(values[0], values[1])),
+            'lognormal': lambda: rng.lognormvariate(values[0], values[1])}
+        sampler = samplers[kind]
+        sampler()
+    except (KeyError, IndexError, ValueError):
+        raise ValueError("Unknown latency distribution '{}'".format(spec))
+    return sampler
+
+
+def synthetic_intents(text, num_intents):
+    """ Ranked intents for an utterance, the same for every request
+    """
+    digest = hashlib.sha256(text.encode('utf-8')).digest()
+    first = int.from_bytes(digest[:4], 'big') % num_intents
+    confidence = 0.5 + digest[4] / 255 * 0.49
+    intents = []
+    for rank in range(min(ALTERNATE_INTENTS, num_intents)):
+        intents.append({'intent': 'intent_{}'.format(
+                            (first + rank) % num_intents),
+                        'confidence': round(confidence / (rank + 1), 4)})
+    return intents
+
+
+class MockService:
+    """ aiohttp application answering with synthetic results after a
+        sampled latency, failing a configurable share of requests with
+        429 (and Retry-After) or 500
+    """
+    def __init__(self, num_intents=DEFAULT_INTENTS, latency=DEFAULT_LATENCY,
+                 throttle_rate=0.0, error_rate=0.0, retry_after=None, seed=0):
+        self.rng = random.Random(seed)
+        self.num_intents = num_intents
+        self.latency = parse_latency(latency, self.rng)
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.statuses = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def injected_failure(self):
+        draw = self.rng.random()
+        if draw < self.throttle_rate:
+            headers = {}
+            if self.retry_after is not None:
+                headers['Retry-After'] = str(self.retry_after)
+            return web.json_response({'error': 'Rate limit exceeded',
+                                      'code': 429},
+                                     status=429, headers=headers)
+        if draw < self.throttle_rate + self.error_rate:
+            return web.json_response({'error': 'Internal Server Error',
+                                      'code': 500}, status=500)
+        return None
+
+    def intents(self, text):
+        """ Ranked intents of an utterance
+        """
+        return synthetic_intents(text, self.num_intents)
+
+    def entities(self, text):
+        return []
+
+    def reply(self, text):
+        """ Output text of an utterance
+        """
+        return ['You said: ' + text]
+
+    def result(self, path, body):
+        if path.endswith('/v1/analyze'):
+            classes = self.intents(body['text'])
+            return {'language': 'en',
+                    'classifications': [{'class_name': c['intent'],
+                                         'confidence': c['confidence']}
+                                        for c in classes]}
+        text = body['input']['text']
+        intents = self.intents(text)
+        # Only the top intent unless alternate intents are asked for
+        options = body['input'].get('options', body['input'])
+        if not options.get('alternate_intents', False):
+            intents = intents[:1]
+        if '/v1/workspaces/' in path:
+            return {'intents': intents, 'entities': self.entities(text),
+                    'input': body['input'], 'context': body.get('context', {}),
+                    'output': {'text': self.reply(text)}}
+        return {'output': {'intents': intents, 'entities': self.entities(text),
+                           'generic': [{'response_type': 'text',
+                                        'text': ' '.join(self.reply(text))}]}}
+
+    async def handle_post(self, request):
+        path = request.path
+        if not (path.endswith('/v1/analyze') or path.endswith('/message')):
+            raise web.HTTPNotFound()
+        body = await request.json()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency())
+        finally:
+            self.in_flight -= 1
+        response = self.injected_failure()
+        if response is None:
+            response = web.json_response(self.result(path, body))
+        self.statuses[response.status] += 1
+        return response
+
+    async def handle_get(self, request):
+        """ Workspace export and classifications model, for response cache
+            fingerprints
+        """
+        model_id = request.match_info['path'].rstrip('/').split('/')[-1]
+        if '/models/classifications/' in request.path:
+            return web.json_response({'model_id': model_id,
+                                      'model_version': '1.0.0',
+                                      'status': 'available'})
+        return web.json_response({
+            'workspace_id': model_id, 'name': 'mock',
+            'intents': [{'intent': 'intent_{}'.format(idx)}
+                        for idx in range(self.num_intents)]})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/{path:.*}', self.handle_post)
+        app.router.add_get('/{path:.*}', self.handle_get)
+        return app
+
+
+def create_parser():
+    parser = ArgumentParser(
+        description='Mock Watson Assistant and NLU server for benchmarks')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='Port to listen on')
+    parser.add_argument('--intents', type=int, default=DEFAULT_INTENTS,
+                        help='Number of synthetic intents')
+    parser.add_argument('--latency', type=str, default=DEFAULT_LATENCY,
+                        help="Response latency in seconds: 'fixed:S', 'uniform:MIN,MAX', 'normal:MEAN,STDDEV' or 'lognormal:MU,SIGMA'")
+    parser.add_argument('--throttle_rate', type=float, default=0.0,
+                        help='Share of requests answered with HTTP 429')
+    parser.add_argument('--error_rate', type=float, default=0.0,
+                        help='Share of requests answered with HTTP 500')
+    parser.add_argument('--retry_after', type=float,
+                        help='Retry-After seconds sent with 429 responses')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the latency and failure draws')
+    return parser
+
+
+if __name__ == '__main__':
+    ARGS = create_parser().parse_args()
+    service = MockService(num_intents=ARGS.intents, latency=ARGS.latency,
+                          throttle_rate=ARGS.throttle_rate,
+                          error_rate=ARGS.error_rate,
+                          retry_after=ARGS.retry_after, seed=ARGS.seed)
+    web.run_app(service.app(), host=ARGS.host, port=ARGS.port)
@@ -20,13 +20,17 @@ import sys
 import configparser
 import subprocess
 import json
+import importlib
+import traceback
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout, nullcontext
 import csv
 import pandas as pd
 from ibm_watson import AssistantV1
 from ibm_watson import NaturalLanguageUnderstandingV1
-from ibm_cloud_sdk_core.authenticators import IAMAuthenticator, BearerTokenAuthenticator
 from utils import TRAIN_FILENAME, TEST_FILENAME, UTTERANCE_COLUMN, \
+                  TRAIN_INTENT_FILENAME, \
                   GOLDEN_INTENT_COLUMN, TEST_OUT_FILENAME, WORKSPACE_ID_TAG, CLASSIFIER_ID_TAG, ENVIRONMENT_ID_TAG, \
                   WA_API_VERSION_ITEM, DEFAULT_WA_VERSION, UTF_8, INTENT_JUDGE_COLUMN, BOOL_MAP, \
                   DEFAULT_TEST_RATE, POPULATION_WEIGHT_MODE, DEFAULT_TEMP_DIR, FOLD_NUM_DEFAULT, \
@@ -34,9 +38,12 @@ from utils import TRAIN_FILENAME, TEST_FILENAME, UTTERANCE_COLUMN, \
                   WA_DISABLE_SSL, WCS_CREDS_SECTION, CREATE_TEST_TRAIN_FOLDS_PATH, \
                   TRAIN_CONVERSATION_PATH, TEST_CONVERSATION_PATH, \
                   TEST_CLASSIFIER_PATH, TRAIN_CLASSIFIER_PATH, CREATE_PRECISION_CURVE_PATH, SPEC_FILENAME, \
-                  delete_workspaces, KFOLD, BLIND_TEST, STANDARD_TEST, \
+                  delete_workspaces, workspace_exists, KFOLD, BLIND_TEST, STANDARD_TEST, \
                   INTENT_METRICS_PATH, CONFUSION_MATRIX_PATH, \
-                  WORKSPACE_PARSER_PATH, WORKSPACE_BASE_FILENAME, BASE_URL, WCS_AUTH_TYPE_ITEM
+                  WORKSPACE_PARSER_PATH, WORKSPACE_BASE_FILENAME, BASE_URL, WCS_AUTH_TYPE_ITEM, \
+                  get_authenticator, get_service_client, TOKEN_CACHE_ENV, \
+                  TOKEN_CACHE_FILENAME, RUN_STARTED_ENV, utc_timestamp
+from utils.stage_cache import StageCache, stage_key
 
 # SECTIONS
 DEFAULT_SECTION = 'DEFAULT'
@@ -61,10 +68,34 @@ CONF_THRES_ITEM = 'conf_thres'
 WORKSPACE_BASE_ITEM = 'workspace_base'
 PARTIAL_CREDIT_TABLE_ITEM = 'partial_credit_table'
 BLIND_FIGURE_TITLE = 'blind_figure_title'
+RESPONSE_CACHE_ITEM = 'response_cache'
+RESPONSE_ARCHIVE_ITEM = 'response_archive'
+REQUEST_TIMEOUT_ITEM = 'request_timeout'
+HEDGE_BUDGET_ITEM = 'hedge_budget'
+LEAN_RESPONSES_ITEM = 'lean_responses'
+IN_PROCESS_ITEM = 'in_process'
+SHARE_IAM_TOKENS_ITEM = 'share_iam_tokens'
+STAGE_CACHE_ITEM = 'stage_cache'
+WORKSPACE_BUDGET_ITEM = 'workspace_budget'
+REUSE_WORKSPACES_ITEM = 'reuse_workspaces'
+WORKSPACE_LIMIT_ITEM = 'workspace_limit'
+EARLY_STOP_MARGIN_ITEM = 'early_stop_margin'
+EARLY_STOP_PER_INTENT_ITEM = 'early_stop_per_intent'
 WATSON_SERVICE = 'assistant'
 
 # Max test request rate
 MAX_TEST_RATE = DEFAULT_TEST_RATE
+# Run the stage scripts in this process rather than one sub-process each
+IN_PROCESS = False
+# Completed stages, skipped while their inputs are unchanged
+STAGE_CACHE = StageCache()
+# Keep trained workspaces and reuse them on identical training data, evicting
+# the least recently used beyond WORKSPACE_LIMIT
+REUSE_WORKSPACES = False
+WORKSPACE_LIMIT = None
+# Folds are shuffled the same on every run when workspaces are reused, so
+# fold workspaces can be reused too
+REUSE_FOLD_SEED = 0
 
 def validate_config(fields, section):
     for field in fields:
@@ -74,34 +105,146 @@ def validate_config(fields, section):
                 format(field))
 
 
+def load_stage(module_path):
+    """ Stage script imported into this process. The scripts import their
+        siblings by name, so their directory joins the module path
+    """
+    module_dir = os.path.dirname(module_path)
+    if module_dir not in sys.path:
+        sys.path.append(module_dir)
+    return importlib.import_module(
+        os.path.splitext(os.path.basename(module_path))[0])
+
+
+def call_stage(module_path, args, **frames):
+    """ Result of a stage script's func called in this process with command
+        line args.  frames are the DataFrames the func takes instead of
+        reading them from disk
+    """
+    module = load_stage(module_path)
+    return module.func(module.create_parser().parse_args(args), **frames)
+
+
+def run_stage(module_path, args, stdout=None, **frames):
+    """ Exit code of a stage script run with command line args, in this
+        process when IN_PROCESS (frames are only used then)
+    """
+    if not IN_PROCESS:
+        return subprocess.run([sys.executable, module_path] + args,
+                              stdout=stdout).returncode
+    try:
+        with redirect_stdout(stdout) if stdout is not None else nullcontext():
+            call_stage(module_path, args, **frames)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else int(e.code is not None)
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+def spec_workspace_exists(spec_file, id_tag, iam_apikey, url, version,
+                          auth_type, disable_ssl):
+    """ Whether the workspace of a spec file still exists.  A kept workspace
+        may have been evicted by workspace_limit or deleted by hand since
+    """
+    with open(spec_file) as f:
+        workspace_id = json.load(f)[id_tag]
+    return workspace_exists(iam_apikey, url, version, workspace_id,
+                            auth_type, disable_ssl)
+
+
+def train_stage(name, train_args, spec_file, inputs, params,
+                keep_workspace, exists):
+    """ Exit code of training a workspace into spec_file, skipped when the
+        stage is fresh and exists() finds its workspace.  Deleted
+        workspaces cannot be reused, so training is only cached when the
+        workspace is kept
+    """
+    def train():
+        with open(spec_file, 'w') as f:
+            return run_stage(TRAIN_CONVERSATION_PATH, train_args, stdout=f)
+    return STAGE_CACHE.run(name, train, inputs=inputs, outputs=[spec_file],
+                           params=params, cacheable=keep_workspace,
+                           valid=exists)
+
+
+def reuse_args(evict=True):
+    """ Train script arguments of the workspace reuse items.  Without evict
+        the training leaves workspace_limit to reserve_workspaces()
+    """
+    args = ['--reuse'] if REUSE_WORKSPACES else []
+    if WORKSPACE_LIMIT is not None and evict:
+        args += ['--workspace_limit', str(WORKSPACE_LIMIT)]
+    return args
+
+
+def metrics_outputs(out_file):
+    """ Files intentmetrics.py writes for out_file
+    """
+    return [out_file, out_file[:-4] + '_summary.csv', out_file[:-4] + '.png']
+
+
+def confusion_outputs(out_file):
+    """ Files confusionmatrix.py writes for out_file
+    """
+    return [out_file, out_file[:-4] + '.png', out_file[:-4] + '_scaled.png']
+
+
+def request_args(request_timeout, hedge_budget, lean_responses=False):
+    """ Test script arguments of the request timeout, hedging and lean
+        response items
+    """
+    args = ['--lean'] if lean_responses else []
+    if request_timeout is not None:
+        args += ['--timeout', str(request_timeout)]
+    if hedge_budget is not None:
+        args += ['--hedge_budget', str(hedge_budget)]
+    return args
+
+
+def early_stop_args(early_stop_margin, early_stop_per_intent):
+    """ Test script arguments of the early stop config items
+    """
+    if early_stop_margin is None:
+        return []
+    args = ['--early_stop_margin', str(early_stop_margin)]
+    if early_stop_per_intent:
+        args += ['--early_stop_per_intent']
+    return args
+
+
 def list_workspaces(auth_token, version, url, auth_type='iam', disable_ssl="False"):
-    if auth_type == 'iam':
-        authenticator = IAMAuthenticator(auth_token)
-    elif auth_type == 'bearer':
-        authenticator = BearerTokenAuthenticator(auth_token)
-    else:
-        raise Exception(f'Unknown auth type: "{auth_type}"')
+    authenticator = get_authenticator(auth_type, auth_token)
     if 'natural-language-understanding' in url:
         WATSON_SERVICE = 'nlc'
     else:
         WATSON_SERVICE = 'assistant'
     if WATSON_SERVICE != 'nlc':
-        c = AssistantV1(
-            version=version,
-            authenticator=authenticator
-        )
-        c.set_disable_ssl_verification(eval(str(disable_ssl)))
-        c.set_service_url(url)
+        c = get_service_client(AssistantV1, authenticator, url, version,
+                               disable_ssl)
         return c.list_workspaces()
     else:
-        c = NaturalLanguageUnderstandingV1(version=version,authenticator=authenticator)
-        c.set_service_url(url)
+        c = get_service_client(NaturalLanguageUnderstandingV1, authenticator,
+                               url, version, disable_ssl)
         return c.list_classifications_models().get_result()
 
 
+def workspace_updated(workspaces, workspace_id):
+    """ Last update time of workspace_id in a list_workspaces response, None
+        if it is not listed
+    """
+    for workspace in workspaces.get_result().get('workspaces', []):
+        if workspace.get('workspace_id') == workspace_id:
+            return workspace.get('updated')
+    return None
+
+
 def kfold(fold_num, out_dir, intent_train_file, workspace_base_file, test_out_path,
           figure_path, keep_workspace, iam_apikey, url, version, weight_mode,
-          conf_thres, partial_credit_table, auth_type, disable_ssl):
+          conf_thres, partial_credit_table, auth_type, disable_ssl,
+          response_cache=None, response_archive=False, request_timeout=None,
+          hedge_budget=None, lean_responses=False, workspace_budget=None):
     FOLD_TRAIN = 'fold_train'
     FOLD_TEST = 'fold_test'
     WORKSPACE_SPEC = 'fold_workspace'
@@ -122,20 +265,17 @@ def kfold(fold_num, out_dir, intent_train_file, workspace_base_file, test_out_pa
     print('{}={}'.format(WA_API_VERSION_ITEM, version))
     print('{}={}'.format(WA_DISABLE_SSL, disable_ssl))
     print('{}={}'.format(PARTIAL_CREDIT_TABLE_ITEM, partial_credit_table))
+    print('{}={}'.format(RESPONSE_CACHE_ITEM, response_cache))
+    print('{}={}'.format(RESPONSE_ARCHIVE_ITEM, BOOL_MAP[response_archive]))
+    print('{}={}'.format(REQUEST_TIMEOUT_ITEM, request_timeout))
+    print('{}={}'.format(HEDGE_BUDGET_ITEM, hedge_budget))
+    print('{}={}'.format(LEAN_RESPONSES_ITEM, BOOL_MAP[lean_responses]))
+    print('{}={}'.format(WORKSPACE_BUDGET_ITEM, workspace_budget))
 
     working_dir = os.path.join(out_dir, KFOLD)
     if not os.path.exists(working_dir):
         os.makedirs(working_dir)
 
-    # Prepare folds
-    if subprocess.run([sys.executable, CREATE_TEST_TRAIN_FOLDS_PATH,
-                       '-i', intent_train_file, '-o', working_dir,
-                       '-k', str(fold_num)],
-                      stdout=subprocess.PIPE).returncode == 0:
-        print('Created {} folds'.format(str(fold_num)))
-    else:
-        raise RuntimeError('Failure in folds creation')
-
     # Construct fold params
     fold_params = [{FOLD_TRAIN: os.path.join(working_dir, str(idx),
                                              TRAIN_FILENAME),
@@ -148,144 +288,273 @@ def kfold(fold_num, out_dir, intent_train_file, workspace_base_file, test_out_pa
                     WORKSPACE_NAME: '{}_{}'.format(KFOLD, str(idx))}
                    for idx in range(fold_num)]
 
-    # Begin training
-    train_processes_specs = {}
-    for fold_param in fold_params:
-        spec_file = open(fold_param[WORKSPACE_SPEC], 'w')
-        if WATSON_SERVICE != 'nlc':
-            train_module_path = TRAIN_CONVERSATION_PATH
-        else:
-            train_module_path = TRAIN_CLASSIFIER_PATH
-        train_args = [sys.executable, train_module_path,
-                      '-i', fold_param[FOLD_TRAIN],
+    # Prepare folds
+    fold_args = ['-i', intent_train_file, '-o', working_dir,
+                 '-k', str(fold_num)]
+    if REUSE_WORKSPACES:
+        fold_args += ['--seed', str(REUSE_FOLD_SEED)]
+    folds = None
+
+    def create_folds():
+        nonlocal folds
+        if IN_PROCESS:
+            folds = call_stage(CREATE_TEST_TRAIN_FOLDS_PATH, fold_args)
+            return 0
+        return subprocess.run([sys.executable, CREATE_TEST_TRAIN_FOLDS_PATH] +
+                              fold_args, stdout=subprocess.PIPE).returncode
+
+    if STAGE_CACHE.run('{}/folds'.format(KFOLD), create_folds,
+                       inputs=[intent_train_file],
+                       outputs=[fold_param[key] for fold_param in fold_params
+                                for key in (FOLD_TRAIN, FOLD_TEST)],
+                       params={'fold_num': fold_num,
+                               'seed': REUSE_WORKSPACES and REUSE_FOLD_SEED}) != 0:
+        raise RuntimeError('Failure in folds creation')
+    print('Created {} folds'.format(str(fold_num)))
+
+    if WATSON_SERVICE != 'nlc':
+        train_module_path = TRAIN_CONVERSATION_PATH
+        test_module_path = TEST_CONVERSATION_PATH
+        id_tag = WORKSPACE_ID_TAG
+    else:
+        train_module_path = TRAIN_CLASSIFIER_PATH
+        test_module_path = TEST_CLASSIFIER_PATH
+        id_tag = CLASSIFIER_ID_TAG
+    # Reused workspaces stay for the next run, NLU models are not reused
+    delete_workspace = not keep_workspace and \
+        not (REUSE_WORKSPACES and WATSON_SERVICE != 'nlc')
+
+    def fold_train_key(idx):
+        fold_param = fold_params[idx]
+        return stage_key([fold_param[FOLD_TRAIN], workspace_base_file],
+                         {'name': fold_param[WORKSPACE_NAME],
+                          'url': url, 'version': version})
+
+    def fold_trained(idx):
+        """ Whether the kept workspace of fold idx is still up to date
+        """
+        return not delete_workspace and STAGE_CACHE.fresh(
+            '{}/train/{}'.format(KFOLD, idx), fold_train_key(idx),
+            [fold_params[idx][WORKSPACE_SPEC]]) and \
+            spec_workspace_exists(fold_params[idx][WORKSPACE_SPEC], id_tag,
+                                  iam_apikey, url, version, auth_type,
+                                  disable_ssl)
+
+    def fold_train_args(idx):
+        fold_param = fold_params[idx]
+        train_args = ['-i', fold_param[FOLD_TRAIN],
                       '-n', fold_param[WORKSPACE_NAME],
                       '-a', iam_apikey,
                       '-l', url,
                       '--auth-type', auth_type,
                       '--disable_ssl', disable_ssl]
         if WATSON_SERVICE != 'nlc':
-            train_args += ['-v', version,'-w', workspace_base_file]
-        train_processes_specs[
-            subprocess.Popen(train_args, stdout=spec_file)] = spec_file
-
-    train_failure_idx = []
-    for idx, (process, file) in enumerate(train_processes_specs.items()):
-        if process.wait() == 0:
-            file.close()
-        else:
-            train_failure_idx.append(idx)
-
-    try:
-        if len(train_failure_idx) != 0:
-            raise RuntimeError(
-                'Fail to train {} fold workspace'.format(','.join(
-                    str(train_failure_idx))))
-
-        print('Trained {} workspaces'.format(str(fold_num)))
-
-        # Begin testing
-        test_processes = []
-        workspace_ids = []
-        FOLD_TEST_RATE = int(MAX_TEST_RATE / fold_num)
-        for fold_param in fold_params:
-            workspace_id = None
-            if WATSON_SERVICE != 'nlc':
-                test_module_path = TEST_CONVERSATION_PATH
-                id_tag = WORKSPACE_ID_TAG
-            else:
-                test_module_path = TEST_CLASSIFIER_PATH
-                id_tag = CLASSIFIER_ID_TAG
-            with open(fold_param[WORKSPACE_SPEC]) as f:
-                workspace_id = json.load(f)[id_tag]
-                workspace_ids.append(workspace_id)
-            test_args = [sys.executable, test_module_path,
-                         '-i', fold_param[FOLD_TEST],
-                         '-o', fold_param[TEST_OUT],
-                         '-a', iam_apikey, '-l', url,
-                         '-t', UTTERANCE_COLUMN, '-g', GOLDEN_INTENT_COLUMN,
-                         '-w', workspace_id, '-r', str(FOLD_TEST_RATE),
-                         '-m', '--auth-type', auth_type,
-                         '--disable_ssl', disable_ssl]
-            if partial_credit_table is not None:
-                test_args += ['--partial_credit_table', partial_credit_table]
-            if WATSON_SERVICE != 'nlc':
-                test_args += ['-v', version]
-            test_processes.append(subprocess.Popen(test_args))
-
-        test_failure_idx_str = []
-        for idx, process in enumerate(test_processes):
-            if process.wait() != 0:
-                test_failure_idx_str.append(str(idx))
-
+            # The folds train together, their slots are reserved up front
+            train_args += ['-v', version,'-w', workspace_base_file] + \
+                reuse_args(evict=False)
+        return train_args
+
+    # Workspaces trained by this run, the ones it may delete
+    trained_ids = []
+
+    def train_fold(idx):
+        """ Exit code of training fold idx into its spec file. Trained
+            workspaces are only reused when they are kept
+        """
+        fold_param = fold_params[idx]
+        train_stage = '{}/train/{}'.format(KFOLD, idx)
+        if fold_trained(idx):
+            print("Stage '{}' is up to date".format(train_stage))
+            return 0
+        train_args = fold_train_args(idx)
+        with open(fold_param[WORKSPACE_SPEC], 'w') as spec_file:
+            frames = {}
+            if IN_PROCESS:
+                # Folds train in threads sharing stdout
+                frames['out'] = spec_file
+                if WATSON_SERVICE != 'nlc' and folds is not None:
+                    frames['intent_df'] = folds[idx][0]
+            code = run_stage(train_module_path, train_args,
+                             stdout=None if IN_PROCESS else spec_file,
+                             **frames)
+        if code == 0:
+            trained_ids.append(workspace_id_of(idx))
+        if code == 0 and not delete_workspace:
+            STAGE_CACHE.record(train_stage, fold_train_key(idx),
+                               [fold_param[WORKSPACE_SPEC]])
+        return code
+
+    def workspace_id_of(idx):
+        with open(fold_params[idx][WORKSPACE_SPEC]) as f:
+            return json.load(f)[id_tag]
+
+    # Options that change the test outputs, part of the test stage keys
+    test_options = []
+    if partial_credit_table is not None:
+        test_options += ['--partial_credit_table', partial_credit_table]
+    if response_cache is not None:
+        test_options += ['--cache_file', response_cache]
+    if response_archive:
+        test_options += ['--archive']
+    test_options += request_args(request_timeout, hedge_budget,
+                                 lean_responses)
+    if WATSON_SERVICE != 'nlc':
+        test_options += ['-v', version]
+    common_test_args = ['-a', iam_apikey, '-l', url,
+                        '-t', UTTERANCE_COLUMN, '-g', GOLDEN_INTENT_COLUMN,
+                        '-m', '--auth-type', auth_type,
+                        '--disable_ssl', disable_ssl] + test_options
+    test_inputs = [partial_credit_table] \
+        if partial_credit_table is not None else []
+
+    test_out_files = [fold_param[TEST_OUT] for fold_param in fold_params]
+    fold_dfs = {}
+
+    def add_fold_index(idx):
+        """ Add a column for the fold number to the test output of fold idx
+        """
+        this_file = test_out_files[idx]
+        this_df = pd.read_csv(this_file, quoting=csv.QUOTE_ALL, encoding='utf-8', \
+                           keep_default_na=False)
+        this_df['Fold Index'] = idx
+        this_df.to_csv( this_file, encoding='utf-8', quoting=csv.QUOTE_ALL, index=False )
+        fold_dfs[idx] = this_df
+
+    trainings = [idx for idx in range(fold_num) if not fold_trained(idx)]
+    if WORKSPACE_LIMIT is not None and WATSON_SERVICE != 'nlc' and trainings:
+        # Evict once for every fold, concurrent folds evicting each for
+        # itself could all count the same free slot
+        train_module = load_stage(TRAIN_CONVERSATION_PATH)
+        train_module.reserve_workspaces(
+            [(train_module.create_parser().parse_args(fold_train_args(idx)),
+              folds[idx][0] if folds is not None else None)
+             for idx in trainings],
+            WORKSPACE_LIMIT,
+            slots=workspace_budget if delete_workspace else None)
+
+    def test_folds(wave):
+        """ Test the folds of wave in one process, sharing the whole rate
+            and its backoff
+        """
+        for idx in wave:
+            # A missing output marks a failed fold
+            if os.path.exists(test_out_files[idx]):
+                os.remove(test_out_files[idx])
+
+        test_command = ['-r', str(MAX_TEST_RATE),
+                        '-i'] + [fold_params[idx][FOLD_TEST]
+                                 for idx in wave] + \
+                       ['-w'] + [workspace_id_of(idx) for idx in wave] + \
+                       ['-o'] + [test_out_files[idx] for idx in wave] + \
+                       common_test_args
+        run_stage(test_module_path, test_command)
+
+        test_failure_idx_str = [str(idx) for idx in wave
+                                if not os.path.exists(test_out_files[idx])]
         if len(test_failure_idx_str) != 0:
             raise RuntimeError('Fail to test {} fold workspace'.format(
                 ','.join(test_failure_idx_str)))
 
-        print('Tested {} workspaces'.format(str(fold_num)))
+        for idx in wave:
+            add_fold_index(idx)
+        return 0
 
-        test_out_files = [fold_param[TEST_OUT] for fold_param in fold_params]
-
-        # Add a column for the fold number
-        for idx, this_file in enumerate(test_out_files):
-            this_df = pd.read_csv(this_file, quoting=csv.QUOTE_ALL, encoding='utf-8', \
-                               keep_default_na=False)
-            this_df['Fold Index'] = idx
-            this_df.to_csv( this_file, encoding='utf-8', quoting=csv.QUOTE_ALL, index=False )
+    # Without a budget every fold trains at once.  With one, at most
+    # workspace_budget folds train and are tested together, their
+    # workspaces deleted before the next ones train
+    wave_size = fold_num if workspace_budget is None else workspace_budget
+    waves = [list(range(first, min(first + wave_size, fold_num)))
+             for first in range(0, fold_num, wave_size)]
+    try:
+        for wave in waves:
+            with ThreadPoolExecutor(max_workers=len(wave)) as executor:
+                train_codes = list(executor.map(train_fold, wave))
+            train_failure_idx = [idx for idx, code in zip(wave, train_codes)
+                                 if code != 0]
+            if len(train_failure_idx) != 0:
+                raise RuntimeError(
+                    'Fail to train {} fold workspace'.format(','.join(
+                        str(idx) for idx in train_failure_idx)))
+            print('Trained {} workspaces'.format(len(wave)))
+
+            test_stage = '{}/test'.format(KFOLD)
+            if len(waves) > 1:
+                test_stage += '/{}'.format('-'.join(str(idx) for idx in wave))
+            STAGE_CACHE.run(test_stage, lambda: test_folds(wave),
+                            inputs=[fold_params[idx][key] for idx in wave
+                                    for key in (FOLD_TEST, WORKSPACE_SPEC)] +
+                                   test_inputs,
+                            outputs=[test_out_files[idx] for idx in wave],
+                            params={'url': url, 'args': test_options})
+
+            if delete_workspace and len(waves) > 1:
+                delete_workspaces(iam_apikey, url, version, trained_ids,
+                                  auth_type, disable_ssl)
+                trained_ids.clear()
 
+        print('Tested {} workspaces'.format(str(fold_num)))
 
         # Union test out
         kfold_result_file = test_out_path
-        pd.concat([pd.read_csv(file, quoting=csv.QUOTE_ALL, encoding=UTF_8,
-                               keep_default_na=False)
-                   for file in test_out_files]) \
-          .to_csv(kfold_result_file,
-                  encoding='utf-8', quoting=csv.QUOTE_ALL, index=False)
+        kfold_df = pd.concat([fold_dfs[idx] if idx in fold_dfs else
+                              pd.read_csv(file, quoting=csv.QUOTE_ALL,
+                                          encoding=UTF_8,
+                                          keep_default_na=False)
+                              for idx, file in enumerate(test_out_files)])
+        kfold_df.to_csv(kfold_result_file,
+                        encoding='utf-8', quoting=csv.QUOTE_ALL, index=False)
         print("Wrote k-fold result file to {}".format(kfold_result_file))
 
         classfier_names = ['Fold {}'.format(idx) for idx in range(fold_num)]
 
-        plot_args = [sys.executable, CREATE_PRECISION_CURVE_PATH,
-                     '-t', '{} Fold Test'.format(str(fold_num)),
+        plot_args = ['-t', '{} Fold Test'.format(str(fold_num)),
                      '-o', figure_path, '-w', weight_mode,
                      '--tau', conf_thres, '-n'] + \
             classfier_names + ['-i'] + test_out_files
 
-        if subprocess.run(plot_args).returncode != 0:
+        if STAGE_CACHE.run('{}/curve'.format(KFOLD),
+                           lambda: run_stage(CREATE_PRECISION_CURVE_PATH,
+                                             plot_args),
+                           inputs=test_out_files, outputs=[figure_path],
+                           params={'args': plot_args}) != 0:
             raise RuntimeError('Failure in plotting curves')
 
         kfold_result_file_base = kfold_result_file[:-4]
-        metrics_args = [sys.executable, INTENT_METRICS_PATH,
-                     '-i', kfold_result_file,
+        metrics_args = ['-i', kfold_result_file,
                      '-o', kfold_result_file_base+".metrics.csv",
                      '--partial_credit_on', str(partial_credit_table is not None)]
-        if subprocess.run(metrics_args).returncode != 0:
+        if STAGE_CACHE.run('{}/metrics'.format(KFOLD),
+                           lambda: run_stage(INTENT_METRICS_PATH,
+                                             metrics_args, in_df=kfold_df),
+                           inputs=[kfold_result_file],
+                           outputs=metrics_outputs(metrics_args[3]),
+                           params={'args': metrics_args}) != 0:
             raise RuntimeError('Failure in generating intent metrics')
 
-        confusion_args = [sys.executable, CONFUSION_MATRIX_PATH,
-                          '-i', kfold_result_file,
+        confusion_args = ['-i', kfold_result_file,
                           '-o', kfold_result_file_base+".confusion_args.csv"]
-        if subprocess.run(confusion_args).returncode != 0:
+        if STAGE_CACHE.run('{}/confusion'.format(KFOLD),
+                           lambda: run_stage(CONFUSION_MATRIX_PATH,
+                                             confusion_args, in_df=kfold_df),
+                           inputs=[kfold_result_file],
+                           outputs=confusion_outputs(confusion_args[3]),
+                           params={'args': confusion_args}) != 0:
             raise RuntimeError('Failure in generating confusion matrix')
 
     finally:
-        if not keep_workspace:
-            if WATSON_SERVICE != 'nlc':
-                id_tag = WORKSPACE_ID_TAG
-            else:
-                id_tag = CLASSIFIER_ID_TAG
-            workspace_ids = []
-            for idx in range(fold_num):
-                if idx not in train_failure_idx:
-                    with open(fold_params[idx][WORKSPACE_SPEC]) as f:
-                        workspace_id = json.load(f)[id_tag]
-                        workspace_ids.append(workspace_id)
-
-            delete_workspaces(iam_apikey, url, version, workspace_ids, auth_type, disable_ssl)
+        # Only workspaces this run trained, a spec left by an earlier run
+        # may name a workspace that is not ours anymore
+        if delete_workspace and len(trained_ids) != 0:
+            delete_workspaces(iam_apikey, url, version, trained_ids, auth_type, disable_ssl)
 
 
 def blind(out_dir, intent_train_file, workspace_base_file, figure_path,
           test_out_path, test_input_file, previous_blind_out, workspace_id, keep_workspace,
-          iam_apikey, url, version, weight_mode, conf_thres, partial_credit_table, figure_title, auth_type, disable_ssl, apiversion):
+          iam_apikey, url, version, weight_mode, conf_thres, partial_credit_table, figure_title, auth_type, disable_ssl, apiversion,
+          response_cache=None, response_archive=False, request_timeout=None,
+          hedge_budget=None, lean_responses=False,
+          early_stop_margin=None,
+          early_stop_per_intent=False):
     print('Begin {} with following details:'.format(BLIND_TEST.upper()))
     print('{}={}'.format(INTENT_FILE_ITEM, intent_train_file))
     print('{}={}'.format(WORKSPACE_BASE_ITEM, workspace_base_file))
@@ -300,6 +569,14 @@ def blind(out_dir, intent_train_file, workspace_base_file, figure_path,
     print('{}={}'.format(WCS_BASEURL_ITEM, url))
     print('{}={}'.format(WA_API_VERSION_ITEM, version))
     print('{}={}'.format(PARTIAL_CREDIT_TABLE_ITEM, partial_credit_table))
+    print('{}={}'.format(RESPONSE_CACHE_ITEM, response_cache))
+    print('{}={}'.format(RESPONSE_ARCHIVE_ITEM, BOOL_MAP[response_archive]))
+    print('{}={}'.format(REQUEST_TIMEOUT_ITEM, request_timeout))
+    print('{}={}'.format(HEDGE_BUDGET_ITEM, hedge_budget))
+    print('{}={}'.format(LEAN_RESPONSES_ITEM, BOOL_MAP[lean_responses]))
+    print('{}={}'.format(EARLY_STOP_MARGIN_ITEM, early_stop_margin))
+    print('{}={}'.format(EARLY_STOP_PER_INTENT_ITEM,
+                         BOOL_MAP[early_stop_per_intent]))
 
     # Validate previous blind out format
     test_out_files = [test_out_path]
@@ -322,21 +599,30 @@ def blind(out_dir, intent_train_file, workspace_base_file, figure_path,
     if not os.path.exists(working_dir):
         os.makedirs(working_dir)
 
-    if WATSON_SERVICE != 'nlc' and apiversion != 'v2':
+    # Only a workspace trained here is known not to change behind the cache
+    trained = WATSON_SERVICE != 'nlc' and apiversion != 'v2'
+    spec_inputs = []
+    if trained:
         print('Training blind workspace...')
         workspace_spec_json = os.path.join(working_dir, SPEC_FILENAME)
-        train_args = [sys.executable, TRAIN_CONVERSATION_PATH,
-                      '-i', intent_train_file, '-n', 'blind test',
+        spec_inputs = [workspace_spec_json]
+        train_args = ['-i', intent_train_file, '-n', 'blind test',
                       '-a', iam_apikey,
                       '-l', url, '-v', version,
                       '-w', workspace_base_file,
                       '--auth-type', auth_type,
-                      '--disable_ssl', disable_ssl]
-        with open(workspace_spec_json, 'w') as f:
-            if subprocess.run(train_args, stdout=f).returncode == 0:
-                print('Trained blind workspace')
-            else:
-                raise RuntimeError('Failure in training workspace')
+                      '--disable_ssl', disable_ssl] + reuse_args()
+        if train_stage('{}/train'.format(BLIND_TEST), train_args,
+                       workspace_spec_json,
+                       [intent_train_file, workspace_base_file],
+                       {'url': url, 'version': version},
+                       keep_workspace or REUSE_WORKSPACES,
+                       lambda: spec_workspace_exists(
+                           workspace_spec_json, WORKSPACE_ID_TAG, iam_apikey,
+                           url, version, auth_type, disable_ssl)) == 0:
+            print('Trained blind workspace')
+        else:
+            raise RuntimeError('Failure in training workspace')
 
         workspace_id = None
         with open(workspace_spec_json, 'r') as f:
@@ -346,53 +632,94 @@ def blind(out_dir, intent_train_file, workspace_base_file, figure_path,
             test_module_path = TEST_CONVERSATION_PATH
         else:
             test_module_path = TEST_CLASSIFIER_PATH
-        test_args = [sys.executable, test_module_path,
-                     '-i', test_input_file,
+        # Options that change the test output, part of the test stage key
+        test_options = []
+        if partial_credit_table is not None:
+            test_options += ['--partial_credit_table', partial_credit_table]
+        if response_cache is not None:
+            test_options += ['--cache_file', response_cache]
+        if response_archive:
+            test_options += ['--archive']
+        test_options += request_args(request_timeout, hedge_budget,
+                                     lean_responses)
+        test_options += early_stop_args(early_stop_margin,
+                                        early_stop_per_intent)
+        if WATSON_SERVICE != 'nlc':
+             test_options += ['-v', version]
+             test_options += ['--apiversion', apiversion]
+        test_args = ['-i', test_input_file,
                      '-o', test_out_path, '-m',
                      '-a', iam_apikey, '-l', url,
                      '-t', UTTERANCE_COLUMN, '-g', GOLDEN_INTENT_COLUMN,
                      '-w', workspace_id,
                      '-r', str(MAX_TEST_RATE),
                      '--auth-type', auth_type,
-                     '--disable_ssl', disable_ssl]
-        if partial_credit_table is not None:
-            test_args += ['--partial_credit_table', partial_credit_table]
-        if WATSON_SERVICE != 'nlc':
-             test_args += ['-v', version]
-             test_args += ['--apiversion', apiversion]
-        if subprocess.run(test_args).returncode == 0:
+                     '--disable_ssl', disable_ssl] + test_options
+        if STAGE_CACHE.run('{}/test'.format(BLIND_TEST),
+                           lambda: run_stage(test_module_path, test_args),
+                           inputs=[test_input_file] + spec_inputs +
+                                  ([partial_credit_table]
+                                   if partial_credit_table is not None
+                                   else []),
+                           outputs=[test_out_path],
+                           params={'workspace_id': workspace_id,
+                                   'url': url, 'args': test_options},
+                           cacheable=trained) == 0:
             print('Tested blind workspace')
         else:
             raise RuntimeError('Failure in testing blind data')
 
-        if subprocess.run([sys.executable, CREATE_PRECISION_CURVE_PATH,
-                           '-t', figure_title, '-w', weight_mode, '--tau',
-                           conf_thres, '-o', figure_path,
-                           '-n'] + classfier_names +
-                          ['-i'] + test_out_files).returncode != 0:
+        plot_args = ['-t', figure_title, '-w', weight_mode, '--tau',
+                     conf_thres, '-o', figure_path,
+                     '-n'] + classfier_names + ['-i'] + test_out_files
+        if STAGE_CACHE.run('{}/curve'.format(BLIND_TEST),
+                           lambda: run_stage(CREATE_PRECISION_CURVE_PATH,
+                                             plot_args),
+                           inputs=test_out_files, outputs=[figure_path],
+                           params={'args': plot_args}) != 0:
             raise RuntimeError('Failure in plotting curves')
 
         blind_result_file = test_out_path
         blind_result_file_base = blind_result_file[:-4]
-        metrics_args = [sys.executable, INTENT_METRICS_PATH,
-                        '-i', blind_result_file,
+        # The metrics stages share one read of the test output
+        frames = {}
+        if IN_PROCESS:
+            frames['in_df'] = pd.read_csv(blind_result_file,
+                                          quoting=csv.QUOTE_ALL,
+                                          encoding=UTF_8,
+                                          keep_default_na=False)
+        metrics_args = ['-i', blind_result_file,
                         '-o', blind_result_file_base+"_metrics.csv",
                         '--partial_credit_on', str(partial_credit_table is not None)]
-        if subprocess.run(metrics_args).returncode != 0:
+        if STAGE_CACHE.run('{}/metrics'.format(BLIND_TEST),
+                           lambda: run_stage(INTENT_METRICS_PATH,
+                                             metrics_args, **frames),
+                           inputs=[blind_result_file],
+                           outputs=metrics_outputs(metrics_args[3]),
+                           params={'args': metrics_args}) != 0:
             raise RuntimeError('Failure in generating intent metrics')
 
-        confusion_args = [sys.executable, CONFUSION_MATRIX_PATH,
-                          '-i', blind_result_file,
+        confusion_args = ['-i', blind_result_file,
                           '-o', blind_result_file_base+"_confusion.csv"]
-        if subprocess.run(confusion_args).returncode != 0:
+        if STAGE_CACHE.run('{}/confusion'.format(BLIND_TEST),
+                           lambda: run_stage(CONFUSION_MATRIX_PATH,
+                                             confusion_args, **frames),
+                           inputs=[blind_result_file],
+                           outputs=confusion_outputs(confusion_args[3]),
+                           params={'args': confusion_args}) != 0:
             raise RuntimeError('Failure in generating confusion matrix')
     finally:
-        if not keep_workspace and WATSON_SERVICE != 'nlc' and apiversion != 'v2':
+        if not keep_workspace and not REUSE_WORKSPACES and \
+                WATSON_SERVICE != 'nlc' and apiversion != 'v2':
             delete_workspaces(iam_apikey, url, version, [workspace_id], auth_type, disable_ssl)
 
 
 def test(out_dir, intent_train_file, workspace_base_file, test_out_path,
-         test_input_file, workspace_id, keep_workspace, iam_apikey, version, url, auth_type, disable_ssl, apiversion):
+         test_input_file, workspace_id, keep_workspace, iam_apikey, version, url, auth_type, disable_ssl, apiversion,
+         response_cache=None, response_archive=False, request_timeout=None,
+         hedge_budget=None, lean_responses=False,
+         early_stop_margin=None,
+         early_stop_per_intent=False):
     print('Begin {} with following details:'.format(STANDARD_TEST.upper()))
     print('{}={}'.format(INTENT_FILE_ITEM, intent_train_file))
     print('{}={}'.format(WORKSPACE_BASE_ITEM, workspace_base_file))
@@ -402,6 +729,14 @@ def test(out_dir, intent_train_file, workspace_base_file, test_out_path,
     print('{}={}'.format(DO_KEEP_WORKSPACE_ITEM, BOOL_MAP[keep_workspace]))
     print('{}={}'.format(WCS_BASEURL_ITEM, url))
     print('{}={}'.format(WA_API_VERSION_ITEM, version))
+    print('{}={}'.format(RESPONSE_CACHE_ITEM, response_cache))
+    print('{}={}'.format(RESPONSE_ARCHIVE_ITEM, BOOL_MAP[response_archive]))
+    print('{}={}'.format(REQUEST_TIMEOUT_ITEM, request_timeout))
+    print('{}={}'.format(HEDGE_BUDGET_ITEM, hedge_budget))
+    print('{}={}'.format(LEAN_RESPONSES_ITEM, BOOL_MAP[lean_responses]))
+    print('{}={}'.format(EARLY_STOP_MARGIN_ITEM, early_stop_margin))
+    print('{}={}'.format(EARLY_STOP_PER_INTENT_ITEM,
+                         BOOL_MAP[early_stop_per_intent]))
 
     # Validate test file
     extra_params = []
@@ -413,27 +748,42 @@ def test(out_dir, intent_train_file, workspace_base_file, test_out_path,
     else:
         if len(header) != 1:
             raise ValueError('Test input has unknown utterance column')
+    if early_stop_margin is not None:
+        if GOLDEN_INTENT_COLUMN not in header:
+            raise ValueError('Early stop needs the golden intent column in '
+                             'test input')
+        extra_params += ['-g', GOLDEN_INTENT_COLUMN] + \
+            early_stop_args(early_stop_margin, early_stop_per_intent)
 
     # Run standard test
     working_dir = os.path.join(out_dir, STANDARD_TEST)
     if not os.path.exists(working_dir):
         os.makedirs(working_dir)
 
-    if WATSON_SERVICE != 'nlc' and apiversion != 'v2':
+    # Only a workspace trained here is known not to change behind the cache
+    trained = WATSON_SERVICE != 'nlc' and apiversion != 'v2'
+    spec_inputs = []
+    if trained:
         print('Training standard test workspace...')
         workspace_spec_json = os.path.join(working_dir, SPEC_FILENAME)
-        train_args = [sys.executable, TRAIN_CONVERSATION_PATH,
-                      '-i', intent_train_file,
+        spec_inputs = [workspace_spec_json]
+        train_args = ['-i', intent_train_file,
                       '-n', 'standard test', '-v', version,
                       '-a', iam_apikey, '-l', url,
                       '-w', workspace_base_file,
                       '--auth-type', auth_type,
-                      '--disable_ssl', disable_ssl]
-        with open(workspace_spec_json, 'w') as f:
-            if subprocess.run(train_args, stdout=f).returncode == 0:
-                print('Trained standard test workspace')
-            else:
-                raise RuntimeError('Failure in training workspace')
+                      '--disable_ssl', disable_ssl] + reuse_args()
+        if train_stage('{}/train'.format(STANDARD_TEST), train_args,
+                       workspace_spec_json,
+                       [intent_train_file, workspace_base_file],
+                       {'url': url, 'version': version},
+                       keep_workspace or REUSE_WORKSPACES,
+                       lambda: spec_workspace_exists(
+                           workspace_spec_json, WORKSPACE_ID_TAG, iam_apikey,
+                           url, version, auth_type, disable_ssl)) == 0:
+            print('Trained standard test workspace')
+        else:
+            raise RuntimeError('Failure in training workspace')
 
         workspace_id = None
         with open(workspace_spec_json, 'r') as f:
@@ -446,20 +796,32 @@ def test(out_dir, intent_train_file, workspace_base_file, test_out_path,
         if WATSON_SERVICE != 'nlc':
              extra_params += ['-v', version]
              extra_params += ['--apiversion', apiversion]
-        if subprocess.run([sys.executable, test_module_path,
-                           '-i', test_input_file,
-                           '-o', test_out_path, '-m',
-                           '-a', iam_apikey, '-l', url,
-                           '-w', workspace_id,
-                           '-r', str(MAX_TEST_RATE),
-                           '--auth-type', auth_type,
-                           '--disable_ssl', disable_ssl] + extra_params
-                          ).returncode == 0:
+        if response_cache is not None:
+            extra_params += ['--cache_file', response_cache]
+        if response_archive:
+            extra_params += ['--archive']
+        extra_params += request_args(request_timeout, hedge_budget,
+                                     lean_responses)
+        test_args = ['-i', test_input_file,
+                     '-o', test_out_path, '-m',
+                     '-a', iam_apikey, '-l', url,
+                     '-w', workspace_id,
+                     '-r', str(MAX_TEST_RATE),
+                     '--auth-type', auth_type,
+                     '--disable_ssl', disable_ssl] + extra_params
+        if STAGE_CACHE.run('{}/test'.format(STANDARD_TEST),
+                           lambda: run_stage(test_module_path, test_args),
+                           inputs=[test_input_file] + spec_inputs,
+                           outputs=[test_out_path],
+                           params={'workspace_id': workspace_id, 'url': url,
+                                   'args': extra_params},
+                           cacheable=trained) == 0:
             print('Tested workspace')
         else:
             raise RuntimeError('Failure in testing data')
     finally:
-        if not keep_workspace and WATSON_SERVICE != 'nlc' and apiversion != 'v2':
+        if not keep_workspace and not REUSE_WORKSPACES and \
+                WATSON_SERVICE != 'nlc' and apiversion != 'v2':
             delete_workspaces(iam_apikey, url, version, [workspace_id], auth_type=auth_type, disable_ssl=disable_ssl)
 
 
@@ -499,14 +861,52 @@ def func(args):
         global WATSON_SERVICE
         WATSON_SERVICE = 'nlc'
 
+    default_section = config[DEFAULT_SECTION]
+
+    if default_section.get(IN_PROCESS_ITEM, 'no').lower() == 'yes':
+        global IN_PROCESS
+        IN_PROCESS = True
+        print('Running every stage in this process')
+
+    #TEMP_DIR_ITEM is legacy configuration variable, subsumed by OUT_DIR_ITEM
+    temp_dir = default_section.get(TEMP_DIR_ITEM, DEFAULT_TEMP_DIR)
+    out_dir  = default_section.get(OUT_DIR_ITEM, temp_dir)
+
+    if default_section.get(SHARE_IAM_TOKENS_ITEM, 'no').lower() == 'yes':
+        # Every stage and sub-process reuses the IAM token saved in the
+        # output directory until it is due for refresh
+        os.environ[TOKEN_CACHE_ENV] = os.path.join(out_dir,
+                                                   TOKEN_CACHE_FILENAME)
+        print('Sharing IAM tokens through {}'.format(
+            os.environ[TOKEN_CACHE_ENV]))
+
+    if default_section.get(STAGE_CACHE_ITEM, 'no').lower() == 'yes':
+        global STAGE_CACHE
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        STAGE_CACHE = StageCache(out_dir)
+        print('Skipping the stages whose inputs are unchanged')
+
+    if default_section.get(REUSE_WORKSPACES_ITEM, 'no').lower() == 'yes':
+        global REUSE_WORKSPACES
+        REUSE_WORKSPACES = True
+        print('Reusing workspaces trained on identical data')
+    if WORKSPACE_LIMIT_ITEM in default_section:
+        global WORKSPACE_LIMIT
+        WORKSPACE_LIMIT = int(default_section[WORKSPACE_LIMIT_ITEM])
+        if WORKSPACE_LIMIT < 1:
+            raise ValueError("Item '{}' must be at least 1".format(
+                WORKSPACE_LIMIT_ITEM))
+        print('Keeping at most {} workspaces'.format(WORKSPACE_LIMIT))
+    # Workspaces used since the run started are not evicted
+    os.environ[RUN_STARTED_ENV] = utc_timestamp()
+
     # List workspaces to see whether the creds is valid.
     # SDK has no method for validation purpose
-    list_workspaces(iam_apikey, version, url, auth_type=auth_type, disable_ssl=disable_ssl)
+    workspaces = list_workspaces(iam_apikey, version, url, auth_type=auth_type, disable_ssl=disable_ssl)
 
     print('Credentials are correct')
 
-    default_section = config[DEFAULT_SECTION]
-
     # Main params validation - make sure required parameters are passed
     workspace_id   = default_section.get(WORKSPACE_ID_ITEM, None)
     environment_id = default_section.get(ENVIRONMENT_ID_ITEM, None)
@@ -518,19 +918,35 @@ def func(args):
         print("ERROR: only one of workspace_id or environment_id can be provided")
         exit(2)
     
-    #TEMP_DIR_ITEM is legacy configuration variable, subsumed by OUT_DIR_ITEM
-    temp_dir = default_section.get(TEMP_DIR_ITEM, DEFAULT_TEMP_DIR)
-    out_dir  = default_section.get(OUT_DIR_ITEM, temp_dir)
-
     if WATSON_SERVICE != 'nlc' and environment_id is None:
         # Prepare folds
-        if subprocess.run([sys.executable, WORKSPACE_PARSER_PATH,
-                           '-i', default_section[WORKSPACE_ID_ITEM],
-                           '-o', out_dir, '-v', version,
-                           '-a', iam_apikey, '-l', url,
-                           '--auth-type', auth_type,
-                           '--disable_ssl', disable_ssl],
-                          stdout=subprocess.PIPE).returncode == 0:
+        def parse_workspace():
+            with open(os.devnull, 'w') as devnull:
+                return run_stage(WORKSPACE_PARSER_PATH,
+                                 ['-i', workspace_id,
+                                  '-o', out_dir, '-v', version,
+                                  '-a', iam_apikey, '-l', url,
+                                  '--auth-type', auth_type,
+                                  '--disable_ssl', disable_ssl],
+                                 stdout=devnull)
+
+        # A workspace file is keyed by its content, a workspace in the
+        # service by its last update time
+        if os.path.isfile(workspace_id):
+            parse_inputs, updated = [workspace_id], None
+        else:
+            parse_inputs = []
+            updated = workspace_updated(workspaces, workspace_id)
+        if STAGE_CACHE.run('parse', parse_workspace, inputs=parse_inputs,
+                           outputs=[os.path.join(out_dir,
+                                                 TRAIN_INTENT_FILENAME),
+                                    os.path.join(out_dir,
+                                                 WORKSPACE_BASE_FILENAME)],
+                           params={'workspace_id': workspace_id,
+                                   'url': url, 'version': version,
+                                   'updated': updated},
+                           cacheable=bool(parse_inputs) or
+                                     updated is not None) == 0:
             print('Parsed workspace')
         else:
             raise RuntimeError('Failure in parsing workspace')
@@ -562,15 +978,24 @@ def func(args):
         user_test_rate = default_section[MAX_TEST_RATE_ITEM]
         try:
             global MAX_TEST_RATE
-            MAX_TEST_RATE = int(user_test_rate)
+            MAX_TEST_RATE = float(user_test_rate)
         except ValueError as e:
             print(e)
-    print('Maximum testing rate: {}/cycle'.format(MAX_TEST_RATE))
+    print('Maximum testing rate: {} requests/sec'.format(MAX_TEST_RATE))
 
     weight_mode          = default_section.get(WEIGHT_MODE_ITEM, POPULATION_WEIGHT_MODE).lower()
     conf_thres_str       = default_section.get(CONF_THRES_ITEM, str(DEFAULT_CONF_THRES))
     partial_credit_table = default_section.get(PARTIAL_CREDIT_TABLE_ITEM, None)
     figure_path          = default_section.get(FIGURE_PATH_ITEM, out_dir + "/" + mode + ".png")
+    response_cache       = default_section.get(RESPONSE_CACHE_ITEM, None)
+    response_archive     = default_section.get(RESPONSE_ARCHIVE_ITEM, 'no').lower() == 'yes'
+    request_timeout      = default_section.get(REQUEST_TIMEOUT_ITEM, None)
+    hedge_budget         = default_section.get(HEDGE_BUDGET_ITEM, None)
+    lean_responses       = default_section.get(LEAN_RESPONSES_ITEM, 'no').lower() == 'yes'
+    early_stop_margin    = default_section.get(EARLY_STOP_MARGIN_ITEM, None)
+    if early_stop_margin is not None:
+        early_stop_margin = float(early_stop_margin)
+    early_stop_per_intent = default_section.get(EARLY_STOP_PER_INTENT_ITEM, 'no').lower() == 'yes'
 
     test_out_path   = default_section.get(TEST_OUT_PATH_ITEM, out_dir + "/" + mode + "-out.csv")
     if KFOLD == mode:
@@ -579,6 +1004,12 @@ def func(args):
             exit(3)
         
         fold_num = default_section.get(FOLD_NUM_ITEM, FOLD_NUM_DEFAULT)
+        workspace_budget = default_section.get(WORKSPACE_BUDGET_ITEM, None)
+        if workspace_budget is not None:
+            workspace_budget = int(workspace_budget)
+            if workspace_budget < 1:
+                raise ValueError("Item '{}' must be at least 1".format(
+                    WORKSPACE_BUDGET_ITEM))
 
         kfold(fold_num=int(fold_num),
               out_dir=out_dir,
@@ -592,7 +1023,13 @@ def func(args):
               weight_mode=weight_mode, conf_thres=conf_thres_str,
               partial_credit_table=partial_credit_table,
               auth_type=auth_type,
-              disable_ssl=disable_ssl)
+              disable_ssl=disable_ssl,
+              response_cache=response_cache,
+              response_archive=response_archive,
+              request_timeout=request_timeout,
+              hedge_budget=hedge_budget,
+              lean_responses=lean_responses,
+              workspace_budget=workspace_budget)
     else:
         test_input_file = default_section.get(TEST_FILE_ITEM, out_dir + "/input.csv")
 
@@ -615,7 +1052,14 @@ def func(args):
                   figure_title=blind_figure_title,
                   auth_type=auth_type,
                   disable_ssl=disable_ssl,
-                  apiversion=apiversion)
+                  apiversion=apiversion,
+                  response_cache=response_cache,
+                  response_archive=response_archive,
+                  request_timeout=request_timeout,
+                  hedge_budget=hedge_budget,
+                  lean_responses=lean_responses,
+                  early_stop_margin=early_stop_margin,
+                  early_stop_per_intent=early_stop_per_intent)
         elif STANDARD_TEST == mode:
             test(out_dir=out_dir,
                  intent_train_file=intent_train_file,
@@ -629,7 +1073,14 @@ def func(args):
                  url=url,
                  auth_type=auth_type,
                  disable_ssl=disable_ssl,
-                 apiversion=apiversion)
+                 apiversion=apiversion,
+                 response_cache=response_cache,
+                 response_archive=response_archive,
+                 request_timeout=request_timeout,
+                 hedge_budget=hedge_budget,
+                 lean_responses=lean_responses,
+                 early_stop_margin=early_stop_margin,
+                 early_stop_per_intent=early_stop_per_intent)
         else:
             raise ValueError("Unknown mode '{}'".format(mode))
 
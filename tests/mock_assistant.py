@@ -0,0 +1,162 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Mock Assistant service shared by the tests
+"""
+import sys
+import os
+import asyncio
+import threading
+import time
+from aiohttp import web
+tool_base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, tool_base)
+from benchmark.mock_server import MockService
+
+RESPONSE_DELAY = 0.05
+
+
+class MockAssistant(MockService):
+    """ Mock service of the benchmark answering with the first word of the
+        utterance as intent, with injected failures and delays, and the
+        workspace endpoints the run.py stages use
+    """
+    def __init__(self):
+        super().__init__(latency='fixed:{}'.format(RESPONSE_DELAY))
+        self.requests = []
+        # (status, headers) returned instead of a result, first in first out.
+        # None lets that request succeed.
+        self.failures = []
+        # Extra seconds taken to answer the n-th request (from 1)
+        self.delays = {}
+        self.latency = lambda: RESPONSE_DELAY + \
+            self.delays.get(len(self.requests), 0)
+        self.workspace = {'workspace_id': 'ws-id', 'name': 'mock',
+                          'intents': [{'intent': 'greeting'}]}
+        # Workspaces created through the API, and the most alive at once
+        self.created = {}
+        self.events = []
+        self.max_workspaces = 0
+        # Seconds a created workspace trains, and status calls received
+        self.training_time = 0
+        self.created_at = {}
+        self.status_calls = {'get': 0, 'list': 0}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True)
+
+    def intents(self, text):
+        return [{'intent': text.split(' ')[0], 'confidence': 0.9},
+                {'intent': 'fallback', 'confidence': 0.1}]
+
+    def entities(self, text):
+        return [{'entity': 'sys-number', 'value': '1'}]
+
+    def reply(self, text):
+        return ['you said', text]
+
+    def injected_failure(self):
+        failure = self.failures.pop(0) if self.failures else None
+        if failure is None:
+            return None
+        status, headers = failure
+        return web.json_response({'error': 'injected', 'code': status},
+                                 status=status, headers=headers)
+
+    async def handle_post(self, request):
+        self.requests.append((request.path, dict(request.query),
+                              await request.json()))
+        return await super().handle_post(request)
+
+    def workspace_status(self, workspace_id):
+        workspace = dict(self.created[workspace_id])
+        if time.monotonic() - self.created_at[workspace_id] < \
+                self.training_time:
+            workspace['status'] = 'Training'
+        return workspace
+
+    async def get_workspace(self, request):
+        workspace_id = request.match_info['workspace_id']
+        if workspace_id in self.created_at and \
+                workspace_id not in self.created:
+            return web.json_response({'error': 'Resource not found',
+                                      'code': 404}, status=404)
+        if workspace_id not in self.created:
+            return web.json_response(self.workspace)
+        self.status_calls['get'] += 1
+        return web.json_response(self.workspace_status(workspace_id))
+
+    async def list_workspaces(self, request):
+        self.status_calls['list'] += 1
+        return web.json_response({
+            'workspaces': [self.workspace_status(workspace_id)
+                           for workspace_id in self.created],
+            'pagination': {}})
+
+    async def create_workspace(self, request):
+        body = await request.json()
+        workspace_id = 'ws-{}'.format(len(self.events))
+        self.created[workspace_id] = {'workspace_id': workspace_id,
+                                      'name': body['name'],
+                                      'metadata': body.get('metadata', {}),
+                                      'status': 'Available'}
+        self.events.append(('create', workspace_id))
+        self.created_at[workspace_id] = time.monotonic()
+        self.max_workspaces = max(self.max_workspaces, len(self.created))
+        return web.json_response(self.created[workspace_id], status=201)
+
+    async def update_workspace(self, request):
+        workspace_id = request.match_info['workspace_id']
+        body = await request.json()
+        self.created[workspace_id]['metadata'] = body['metadata']
+        return web.json_response(self.workspace_status(workspace_id))
+
+    async def delete_workspace(self, request):
+        workspace_id = request.match_info['workspace_id']
+        del self.created[workspace_id]
+        self.events.append(('delete', workspace_id))
+        return web.json_response({})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/v1/workspaces/{workspace_id}', self.get_workspace)
+        app.router.add_post('/v1/workspaces', self.create_workspace)
+        app.router.add_get('/v1/workspaces', self.list_workspaces)
+        app.router.add_post('/v1/workspaces/{workspace_id}',
+                            self.update_workspace)
+        app.router.add_delete('/v1/workspaces/{workspace_id}',
+                              self.delete_workspace)
+        app.router.add_post('/{path:.*}', self.handle_post)
+        return app
+
+    async def start_server(self):
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    def start(self):
+        self.thread.start()
+        port = asyncio.run_coroutine_threadsafe(self.start_server(),
+                                                self.loop).result()
+        return 'http://127.0.0.1:{}'.format(port)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(),
+                                         self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
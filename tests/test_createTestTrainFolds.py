@@ -21,7 +21,8 @@ import os
 tool_base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 print( "base: " + tool_base)
 sys.path.insert(0, tool_base)
-from utils import FOLD_NUM_DEFAULT
+import pandas as pd
+from utils import FOLD_NUM_DEFAULT, TEST_FILENAME
 
 sys.path.append("utils")
 import createTestTrainFolds
@@ -48,11 +49,15 @@ class CreateTestTrainFoldsTestCase(CommandLineTestCase):
                               'intents.csv'),
                  '-o', self.test_dir, '-k', str(FOLD_NUM_DEFAULT)])
         try:
-            createTestTrainFolds.func(args)
+            folds = createTestTrainFolds.func(args)
         except Exception as e:
             print(e)
             raised = True
         self.assertFalse(raised, 'Exception raised')
+        # The returned frames are the ones written to the fold files
+        self.assertEqual(len(folds), FOLD_NUM_DEFAULT)
+        self.assertEqual(len(folds[0][1]), len(pd.read_csv(
+            os.path.join(self.test_dir, '0', TEST_FILENAME))))
 
 
 if __name__ == '__main__':
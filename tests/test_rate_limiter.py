@@ -0,0 +1,37 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+sys.path.append("utils")
+from rate_limiter import RateLimiter
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    def test_aimd(self):
+        """ Throttling halves the rate once per burst, successes restore it
+        """
+        limiter = RateLimiter(10)
+        limiter.on_response(429)
+        limiter.on_response(503)
+        self.assertEqual(limiter.rate, 5)
+        for _ in range(100):
+            limiter.on_response(200)
+        self.assertEqual(limiter.rate, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from test_base import CommandLineTestCase
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+tool_base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, tool_base)
+sys.path.append(os.path.join(tool_base, 'utils'))
+from response_cache import ResponseCache
+
+
+class ResponseCacheTestCase(CommandLineTestCase):
+    def setUp(self):
+        self.cache_file = os.path.join(self.test_dir, 'responses.sqlite')
+        if os.path.exists(self.cache_file):
+            os.remove(self.cache_file)
+
+    def test_threads(self):
+        """ Caches on the same file in several threads share the responses
+        """
+        def fold(n):
+            cache = ResponseCache(self.cache_file, 'model', 'v1')
+            try:
+                cache.put('utterance {}'.format(n), {'n': n})
+                return cache.get('utterance {}'.format(n))
+            finally:
+                cache.close()
+
+        with ThreadPoolExecutor(4) as pool:
+            responses = list(pool.map(fold, range(8)))
+        self.assertEqual(responses, [{'n': n} for n in range(8)])
+
+        cache = ResponseCache(self.cache_file, 'model', 'v1')
+        try:
+            self.assertEqual(cache.get('utterance 7'), {'n': 7})
+            self.assertIsNone(cache.get('utterance 8'))
+        finally:
+            cache.close()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+import asyncio
+import aiohttp
+sys.path.append("utils")
+from retry_policy import RetryPolicy
+from async_client import AsyncApiException
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    def test_retryable(self):
+        """ Network errors, timeouts, throttling and server errors are
+            retried, client errors and bugs are not
+        """
+        policy = RetryPolicy()
+        for exception in [aiohttp.ClientConnectionError(),
+                          asyncio.TimeoutError(),
+                          AsyncApiException(429), AsyncApiException(503)]:
+            self.assertTrue(policy.is_retryable(exception), exception)
+        for exception in [AsyncApiException(401), AsyncApiException(404),
+                          KeyError('intents'), TypeError(), ValueError()]:
+            self.assertFalse(policy.is_retryable(exception), exception)
+
+    def test_bug_not_retried(self):
+        """ A bug fails at once and is counted by its exception class
+        """
+        policy = RetryPolicy()
+        self.assertFalse(policy.should_retry(KeyError('intents'), 0))
+        self.assertEqual(policy.retries, {})
+        self.assertEqual(policy.failures, {'KeyError': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,18 +21,26 @@ import configparser
 import subprocess
 import json
 import os
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 tool_base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, tool_base)
 from utils import FOLD_NUM_DEFAULT, KFOLD, BLIND_TEST, STANDARD_TEST, \
                   TRAIN_CONVERSATION_PATH, WCS_CREDS_SECTION, \
                   WCS_IAM_APIKEY_ITEM, \
                   WORKSPACE_ID_TAG, SPEC_FILENAME, BOOL_MAP, \
-                  delete_workspaces, WCS_BASEURL_ITEM
+                  delete_workspaces, WCS_BASEURL_ITEM, \
+                  INTENT_METRICS_PATH, CONFUSION_MATRIX_PATH
 
 from run import WORKSPACE_ID_ITEM, MODE_ITEM, DEFAULT_SECTION, \
                 DO_KEEP_WORKSPACE_ITEM, TEMP_DIR_ITEM, FIGURE_PATH_ITEM, \
                 FOLD_NUM_ITEM, PREVIOUS_BLIND_OUT_ITEM, TEST_FILE_ITEM, \
                 TEST_OUT_PATH_ITEM, PARTIAL_CREDIT_TABLE_ITEM
+import run
+from utils.stage_cache import StageCache
+from mock_assistant import MockAssistant
+from utils import RUN_STARTED_ENV, utc_timestamp
 
 
 class RunTestCase(CommandLineTestCase):
@@ -60,6 +68,90 @@ class RunTestCase(CommandLineTestCase):
                                self.script_path]).returncode != 0:
                 raise SystemExit()
 
+    def test_in_process_stages(self):
+        """ Stages run in process take DataFrames and report failures as
+            exit codes
+        """
+        in_df = pd.DataFrame({'utterance': ['hi', 'hello', 'bye'],
+                              'golden intent': ['greet', 'greet', 'bye'],
+                              'predicted intent': ['greet', 'bye', 'bye']})
+        metrics_file = os.path.join(self.test_dir, 'test-out_metrics.csv')
+        confusion_file = os.path.join(self.test_dir, 'test-out_confusion.csv')
+        run.IN_PROCESS = True
+        try:
+            # The input file does not exist, the stages read in_df instead
+            self.assertEqual(run.run_stage(INTENT_METRICS_PATH,
+                                           ['-i', 'missing.csv',
+                                            '-o', metrics_file],
+                                           in_df=in_df), 0)
+            self.assertEqual(run.run_stage(CONFUSION_MATRIX_PATH,
+                                           ['-i', 'missing.csv',
+                                            '-o', confusion_file],
+                                           in_df=in_df), 0)
+            self.assertNotEqual(run.run_stage(INTENT_METRICS_PATH,
+                                              ['-i', 'missing.csv']), 0)
+            self.assertNotEqual(run.run_stage(INTENT_METRICS_PATH, []), 0)
+        finally:
+            run.IN_PROCESS = False
+
+        self.assertNotIn('correct', in_df)
+        summary_df = pd.read_csv(metrics_file[:-4] + '_summary.csv')
+        self.assertEqual(summary_df['correct'][0], 2)
+        self.assertTrue(os.path.exists(confusion_file[:-4] + '.png'))
+
+    def test_stage_cache(self):
+        """ Stages re-run only when their inputs, parameters or outputs
+            changed, and only completed stages are recorded
+        """
+        in_file = os.path.join(self.test_dir, 'stage-in.txt')
+        out_file = os.path.join(self.test_dir, 'stage-out.txt')
+        with open(in_file, 'w') as f:
+            f.write('a')
+        runs = []
+
+        def action():
+            runs.append(1)
+            with open(in_file) as f, open(out_file, 'w') as out:
+                out.write(f.read().upper())
+            return 0
+
+        def run_stage(cache, params={'p': 1}):
+            return cache.run('stage', action, inputs=[in_file],
+                             outputs=[out_file], params=params)
+
+        cache = StageCache(self.test_dir)
+        self.assertEqual(run_stage(cache), 0)
+        self.assertEqual(run_stage(cache), 0)
+        self.assertEqual(len(runs), 1)
+
+        # The manifest is kept for the next run
+        self.assertEqual(run_stage(StageCache(self.test_dir)), 0)
+        self.assertEqual(len(runs), 1)
+
+        run_stage(cache, params={'p': 2})
+        self.assertEqual(len(runs), 2)
+        with open(in_file, 'w') as f:
+            f.write('b')
+        run_stage(cache, params={'p': 2})
+        self.assertEqual(len(runs), 3)
+        with open(out_file, 'w') as f:
+            f.write('edited')
+        run_stage(cache, params={'p': 2})
+        self.assertEqual(len(runs), 4)
+
+        # A failed stage runs again
+        self.assertEqual(cache.run('failing', lambda: 1), 1)
+        self.assertNotIn('failing', StageCache(self.test_dir).stages)
+        # Without an output directory every stage runs
+        run_stage(StageCache())
+        self.assertEqual(len(runs), 5)
+
+        # Stages recorded from several threads all reach the manifest
+        names = ['fold{}'.format(i) for i in range(8)]
+        with ThreadPoolExecutor(len(names)) as pool:
+            list(pool.map(lambda name: cache.run(name, lambda: 0), names))
+        self.assertTrue(set(names) <= set(StageCache(self.test_dir).stages))
+
     def test_kfold(self):
         """ User passes correct kfold config, should pass
         """
@@ -259,5 +351,179 @@ class RunTestCase(CommandLineTestCase):
         self.assertFalse(raised, 'Exception raised')
 
 
+class KfoldSchedulerTestCase(CommandLineTestCase):
+    def setUp(self):
+        self.mock = MockAssistant()
+        self.url = self.mock.start()
+        self.intent_file = os.path.join(self.test_dir, 'intent-train.csv')
+        pd.DataFrame({'utterance': ['{} example {}'.format(intent, idx)
+                                    for intent in ['greeting', 'goodbye']
+                                    for idx in range(6)],
+                      'intent': ['greeting'] * 6 + ['goodbye'] * 6}) \
+          .to_csv(self.intent_file, header=False, index=False)
+        self.workspace_base_file = os.path.join(self.test_dir,
+                                                'workspace_base.json')
+        with open(self.workspace_base_file, 'w') as f:
+            json.dump({}, f)
+
+    def tearDown(self):
+        self.mock.stop()
+        run.IN_PROCESS = False
+        run.REUSE_WORKSPACES = False
+        run.WORKSPACE_LIMIT = None
+        run.STAGE_CACHE = StageCache()
+        os.environ.pop(RUN_STARTED_ENV, None)
+
+    def run_kfold(self, workspace_budget, keep_workspace=False, **options):
+        test_out_path = os.path.join(self.test_dir, 'kfold-out.csv')
+        run.kfold(fold_num=3, out_dir=self.test_dir,
+                  intent_train_file=self.intent_file,
+                  workspace_base_file=self.workspace_base_file,
+                  test_out_path=test_out_path,
+                  figure_path=os.path.join(self.test_dir, 'kfold.png'),
+                  keep_workspace=keep_workspace, iam_apikey='token',
+                  url=self.url,
+                  version='2021-06-14', weight_mode='population',
+                  conf_thres='0.2', partial_credit_table=None,
+                  auth_type='bearer', disable_ssl='False',
+                  workspace_budget=workspace_budget, **options)
+        return pd.read_csv(test_out_path, keep_default_na=False)
+
+    def test_all_folds_at_once(self):
+        """ Without a budget every fold trains at once and one test run
+            tests them all
+        """
+        run.IN_PROCESS = True
+        out_df = self.run_kfold(None)
+
+        self.assertEqual(self.mock.max_workspaces, 3)
+        self.assertEqual(self.mock.created, {})
+        self.assertEqual([event for event, _ in self.mock.events],
+                         ['create'] * 3 + ['delete'] * 3)
+        self.assertEqual(set(out_df['Fold Index']), {0, 1, 2})
+
+    def test_workspace_budget(self):
+        """ Folds train and are tested in groups of workspace_budget, whose
+            workspaces are deleted before the next group trains
+        """
+        run.IN_PROCESS = True
+        out_df = self.run_kfold(2)
+
+        self.assertEqual(self.mock.max_workspaces, 2)
+        self.assertEqual(self.mock.created, {})
+        # The third fold trains in the slots of the first two
+        events = [event for event, _ in self.mock.events]
+        self.assertEqual(events, ['create'] * 2 + ['delete'] * 2 +
+                                 ['create', 'delete'])
+        tested = {path.split('/')[3] for path, _, _ in self.mock.requests}
+        self.assertEqual(tested, {workspace_id
+                                  for _, workspace_id in self.mock.events})
+
+        self.assertEqual(len(out_df), 12)
+        self.assertEqual(set(out_df['Fold Index']), {0, 1, 2})
+        self.assertTrue((out_df['predicted intent'] ==
+                         out_df['golden intent']).all())
+
+    def test_cleanup_on_failure(self):
+        """ A failed run deletes the workspaces it trained and no other
+        """
+        run.IN_PROCESS = True
+        # Spec of a fold workspace left by an earlier run
+        stale_dir = os.path.join(self.test_dir, KFOLD, '2')
+        os.makedirs(stale_dir, exist_ok=True)
+        with open(os.path.join(stale_dir, SPEC_FILENAME), 'w') as f:
+            json.dump({WORKSPACE_ID_TAG: 'ws-earlier'}, f)
+        self.mock.created['ws-earlier'] = {'workspace_id': 'ws-earlier'}
+        self.mock.created_at['ws-earlier'] = time.monotonic()
+
+        self.mock.failures = [(400, {})] * 100
+        with self.assertRaisesRegex(RuntimeError, 'Fail to test'):
+            self.run_kfold(2)
+        self.assertEqual(set(self.mock.created), {'ws-earlier'})
+
+    def test_workspace_reuse_cache(self):
+        """ Reused workspaces keep their response cache fingerprint, so the
+            next run is answered from the cache
+        """
+        run.IN_PROCESS = True
+        run.REUSE_WORKSPACES = True
+        cache = os.path.join(self.test_dir, 'reuse-cache.sqlite')
+        if os.path.exists(cache):
+            os.remove(cache)
+        first_df = self.run_kfold(None, response_cache=cache)
+        requests = len(self.mock.requests)
+        self.assertGreater(requests, 0)
+
+        os.environ[RUN_STARTED_ENV] = utc_timestamp()
+        second_df = self.run_kfold(None, response_cache=cache)
+        self.assertEqual(len(self.mock.requests), requests)
+        self.assertTrue(first_df.equals(second_df))
+
+    def test_stage_cache_deleted_workspace(self):
+        """ A cached fold training whose workspace was deleted since is
+            trained again
+        """
+        run.IN_PROCESS = True
+        cache_dir = os.path.join(self.test_dir, 'kfold-stages')
+        os.makedirs(cache_dir, exist_ok=True)
+        run.STAGE_CACHE = StageCache(cache_dir)
+        self.run_kfold(None, keep_workspace=True)
+        first_ids = set(self.mock.created)
+
+        # Evicted behind the stage cache
+        deleted = sorted(first_ids)[0]
+        del self.mock.created[deleted]
+        self.run_kfold(None, keep_workspace=True)
+        self.assertEqual(len(self.mock.created), 3)
+        self.assertEqual(len(set(self.mock.created) - first_ids), 1)
+
+    def test_training_poll(self):
+        """ Folds training together are polled in one list call, and seen
+            soon after they are available
+        """
+        run.IN_PROCESS = True
+        self.mock.training_time = 2
+        started = time.monotonic()
+        self.run_kfold(None)
+
+        # A fixed 10 second poll could not finish this early
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertGreater(self.mock.status_calls['list'], 0)
+
+    def test_workspace_reuse(self):
+        """ Workspaces trained on the same data are reused by the next run,
+            and the least recently used are evicted beyond workspace_limit
+        """
+        run.IN_PROCESS = True
+        run.REUSE_WORKSPACES = True
+        first_df = self.run_kfold(None)
+        first_ids = set(self.mock.created)
+        self.assertEqual(len(first_ids), 3)
+
+        # The same folds find their workspaces
+        second_df = self.run_kfold(None)
+        self.assertEqual(set(self.mock.created), first_ids)
+        self.assertEqual([event for event, _ in self.mock.events],
+                         ['create'] * 3)
+        self.assertTrue(first_df.equals(second_df))
+
+        # New training data, with room for this run's folds only, trained
+        # together
+        with open(self.intent_file, 'a') as f:
+            f.write('greeting,hello there\n')
+        run.WORKSPACE_LIMIT = 3
+        os.environ[RUN_STARTED_ENV] = utc_timestamp()
+        self.run_kfold(None)
+        self.assertEqual(len(self.mock.created), 3)
+        self.assertFalse(first_ids & set(self.mock.created))
+        self.assertEqual(self.mock.max_workspaces, 3)
+
+        # Workspaces the folds reuse take no slot and are not evicted
+        third_ids = set(self.mock.created)
+        os.environ[RUN_STARTED_ENV] = utc_timestamp()
+        self.run_kfold(None)
+        self.assertEqual(set(self.mock.created), third_ids)
+
+
 if __name__ == '__main__':
     unittest.main()
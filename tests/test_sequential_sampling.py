@@ -0,0 +1,44 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import sys
+sys.path.append("utils")
+from sequential_sampling import wilson_interval
+
+Z = 1.96
+
+
+class WilsonIntervalTestCase(unittest.TestCase):
+    def test_contains_estimate(self):
+        """ The finite population correction keeps the estimate inside the
+            interval and narrows it
+        """
+        for correct, total in [(34, 34), (30, 34), (0, 5), (50, 100)]:
+            lower, upper = wilson_interval(correct, total, Z, 400)
+            self.assertLessEqual(lower, correct / total)
+            self.assertGreaterEqual(upper, correct / total)
+            wide_lower, wide_upper = wilson_interval(correct, total, Z)
+            self.assertLess(upper - lower, wide_upper - wide_lower)
+
+    def test_whole_population(self):
+        """ Every row tested leaves no uncertainty
+        """
+        self.assertEqual(wilson_interval(9, 10, Z, 10), (0.9, 0.9))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,632 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from test_base import CommandLineTestCase
+import sys
+import os
+import csv
+import gzip
+import io
+import time
+import json
+import pandas as pd
+tool_base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, tool_base)
+from utils import UTF_8, UTTERANCE_COLUMN, GOLDEN_INTENT_COLUMN, \
+                  PREDICTED_INTENT_COLUMN, CONFIDENCE_COLUMN, \
+                  DETECTED_ENTITY_COLUMN, DIALOG_RESPONSE_COLUMN, \
+                  INTENT_JUDGE_COLUMN, SCORE_COLUMN
+
+sys.path.append("utils")
+import testConversation
+import testNLC
+from checkpoint import Checkpoint, checkpoint_file
+from circuit_breaker import CircuitOpenError
+from response_archive import ResponseArchive, archive_file, read_archive
+import responsemetrics
+import mergeShards
+from sharding import ROW_ID_COLUMN
+from sequential_sampling import sampling_file
+from mock_assistant import MockAssistant, RESPONSE_DELAY
+
+
+class TestConversationTestCase(CommandLineTestCase):
+    def setUp(self):
+        self.parser = testConversation.create_parser()
+        self.mock = MockAssistant()
+        self.url = self.mock.start()
+
+        self.in_file = os.path.join(self.test_dir, 'conversation-in.csv')
+        self.out_file = os.path.join(self.test_dir, 'conversation-out.csv')
+        self.utterances = ['greeting hello {}'.format(idx) for idx in range(20)]
+        pd.DataFrame({UTTERANCE_COLUMN: self.utterances,
+                      GOLDEN_INTENT_COLUMN: ['greeting'] * 19 + ['goodbye']}) \
+          .to_csv(self.in_file, encoding=UTF_8, quoting=csv.QUOTE_ALL,
+                  index=False)
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def run_test(self, extra_args=[]):
+        args = self.parser.parse_args(
+            ['-i', self.in_file, '-o', self.out_file, '-w', 'ws-id',
+             '-a', 'token', '--auth-type', 'bearer', '-l', self.url,
+             '-t', UTTERANCE_COLUMN, '-g', GOLDEN_INTENT_COLUMN] + extra_args)
+        testConversation.func(args)
+        return pd.read_csv(self.out_file, quoting=csv.QUOTE_ALL,
+                           encoding=UTF_8, keep_default_na=False)
+
+    def test_with_empty_args(self):
+        """ User passes no args, should fail with SystemExit
+        """
+        with self.assertRaises(SystemExit):
+            self.parser.parse_args([])
+
+    def test_v1_output(self):
+        """ v1 requests match the SDK body and responses fill every column
+        """
+        out_df = self.run_test(['-r', '10'])
+
+        self.assertEqual(len(self.mock.requests), len(self.utterances))
+        path, query, body = self.mock.requests[0]
+        self.assertEqual(path, '/v1/workspaces/ws-id/message')
+        self.assertIn('version', query)
+        self.assertEqual(body['context'], {'metadata': {'user_id': 'test'}})
+        self.assertTrue(body['input']['alternate_intents'])
+
+        self.assertEqual(list(out_df[UTTERANCE_COLUMN]), self.utterances)
+        self.assertTrue((out_df[PREDICTED_INTENT_COLUMN] == 'greeting').all())
+        self.assertTrue((out_df[CONFIDENCE_COLUMN] == 0.9).all())
+        self.assertTrue((out_df[DETECTED_ENTITY_COLUMN] == 'sys-number:1').all())
+        self.assertEqual(out_df[DIALOG_RESPONSE_COLUMN][0],
+                         'you said greeting hello 0')
+        self.assertEqual(list(out_df[INTENT_JUDGE_COLUMN]),
+                         ['yes'] * 19 + ['no'])
+
+    def test_v2_output(self):
+        """ v2 requests go to the stateless message endpoint
+        """
+        out_df = self.run_test(['-p', 'v2', '-r', '100'])
+
+        path, _, body = self.mock.requests[0]
+        self.assertEqual(path, '/v2/assistants/ws-id/message')
+        self.assertEqual(body['input']['message_type'], 'text')
+        self.assertTrue(body['input']['options']['alternate_intents'])
+        self.assertEqual(out_df[DIALOG_RESPONSE_COLUMN][0],
+                         'you said greeting hello 0')
+
+    def test_nlu_output(self):
+        """ NLU classifications share the runner with Assistant
+        """
+        args = testNLC.create_parser().parse_args(
+            ['-i', self.in_file, '-o', self.out_file, '-w', 'model-id',
+             '-a', 'token', '--auth-type', 'bearer', '-l', self.url,
+             '-t', UTTERANCE_COLUMN, '-g', GOLDEN_INTENT_COLUMN,
+             '-r', '100', '--archive'])
+        testNLC.func(args)
+        out_df = pd.read_csv(self.out_file, quoting=csv.QUOTE_ALL,
+                             encoding=UTF_8, keep_default_na=False)
+
+        path, query, body = self.mock.requests[0]
+        self.assertEqual(path, '/v1/analyze')
+        self.assertIn('version', query)
+        self.assertEqual(body['features'],
+                         {'classifications': {'model': 'model-id'}})
+        self.assertGreater(self.mock.max_in_flight, 1)
+        self.assertTrue((out_df[PREDICTED_INTENT_COLUMN] == 'greeting').all())
+        self.assertTrue((out_df[CONFIDENCE_COLUMN] == 0.9).all())
+        self.assertEqual(list(out_df[INTENT_JUDGE_COLUMN]),
+                         ['yes'] * 19 + ['no'])
+        header, responses = read_archive(archive_file(self.out_file))
+        self.assertEqual(header['apiversion'], 'nlu')
+        self.assertEqual(len(responses), len(self.utterances))
+
+    def test_lean(self):
+        """ Lean requests keep alternate intents, turn off v2 debug and
+            context, give the same results and report the bytes received
+        """
+        for apiversion in ['v1', 'v2']:
+            self.mock.requests = []
+            out_df = self.run_test(['-p', apiversion, '-r', '100', '--lean'])
+
+            _, _, body = self.mock.requests[-1]
+            options = body['input'].get('options', body['input'])
+            self.assertTrue(options['alternate_intents'])
+            if apiversion == 'v2':
+                self.assertFalse(options['debug'])
+                self.assertFalse(options['return_context'])
+            self.assertEqual(len(self.mock.requests), len(self.utterances))
+            self.assertTrue((out_df[PREDICTED_INTENT_COLUMN] == 'greeting').all())
+            self.assertTrue((out_df[DETECTED_ENTITY_COLUMN] == 'sys-number:1').all())
+            self.assertEqual(out_df[DIALOG_RESPONSE_COLUMN][0],
+                             'you said greeting hello 0')
+            with open(os.path.join(self.test_dir,
+                                   'conversation-out.perf.json')) as f:
+                response_bytes = json.load(f)['response_bytes']
+            self.assertTrue(response_bytes['lean'])
+            self.assertEqual(response_bytes['responses'], len(self.utterances))
+            self.assertGreater(response_bytes['bytes_per_response'], 0)
+
+    def test_concurrent_requests(self):
+        """ Requests overlap when the rate allows it
+        """
+        self.run_test(['-r', '200'])
+        self.assertGreater(self.mock.max_in_flight, 1)
+
+    def test_rate_limit(self):
+        """ Requests are spaced to the requested rate per second
+        """
+        start = time.monotonic()
+        self.run_test(['-r', '20'])
+        self.assertGreaterEqual(time.monotonic() - start, 0.9)
+
+    def test_retry_throttled(self):
+        """ 429 and 5xx are retried, honoring Retry-After, and counted
+        """
+        self.mock.failures = [(429, {'Retry-After': '0'}), (503, {})]
+        out_df = self.run_test(['-r', '100'])
+
+        self.assertEqual(len(self.mock.requests), len(self.utterances) + 2)
+        self.assertTrue((out_df[PREDICTED_INTENT_COLUMN] == 'greeting').all())
+        with open(os.path.join(self.test_dir,
+                               'conversation-out.retries.json')) as f:
+            retries = json.load(f)
+        self.assertEqual(retries['retries'], {'429': 1, '503': 1})
+
+    def test_perf_summary(self):
+        """ Every attempt is timed and summarized with its status
+        """
+        self.mock.failures = [(429, {'Retry-After': '0'})]
+        self.run_test(['-r', '100'])
+
+        with open(os.path.join(self.test_dir,
+                               'conversation-out.perf.json')) as f:
+            perf = json.load(f)
+        self.assertEqual(perf['attempts'], len(self.utterances) + 1)
+        self.assertEqual(perf['calls'], len(self.utterances))
+        self.assertEqual(perf['retries'], 1)
+        self.assertEqual(perf['errors'], {'429': 1})
+        self.assertGreaterEqual(perf['latency_ms']['p50'],
+                                RESPONSE_DELAY * 1000)
+        self.assertLessEqual(perf['latency_ms']['p50'],
+                             perf['latency_ms']['p99'])
+        self.assertEqual(sum(bucket['requests']
+                             for bucket in perf['throughput']),
+                         perf['attempts'])
+
+    def test_timeout(self):
+        """ A request slower than the timeout is abandoned and retried
+        """
+        self.mock.delays = {1: 3}
+        start = time.monotonic()
+        out_df = self.run_test(['-r', '100', '--timeout', '0.5'])
+
+        self.assertLess(time.monotonic() - start, 2.5)
+        self.assertEqual(len(self.mock.requests), len(self.utterances) + 1)
+        self.assertTrue((out_df[PREDICTED_INTENT_COLUMN] == 'greeting').all())
+        with open(os.path.join(self.test_dir,
+                               'conversation-out.perf.json')) as f:
+            perf = json.load(f)
+        self.assertEqual(perf['errors'], {'network': 1})
+
+    def test_hedging(self):
+        """ A straggler is hedged after the observed p95 latency
+        """
+        self.utterances = ['greeting hello {}'.format(idx)
+                           for idx in range(40)]
+        pd.DataFrame({UTTERANCE_COLUMN: self.utterances,
+                      GOLDEN_INTENT_COLUMN: ['greeting'] * 40}) \
+          .to_csv(self.in_file, encoding=UTF_8, quoting=csv.QUOTE_ALL,
+                  index=False)
+        self.mock.delays = {30: 3}
+        start = time.monotonic()
+        out_df = self.run_test(['-r', '20', '--hedge_budget', '0.1'])
+
+        self.assertLess(time.monotonic() - start, 3.5)
+        self.assertTrue((out_df[PREDICTED_INTENT_COLUMN] == 'greeting').all())
+        with open(os.path.join(self.test_dir,
+                               'conversation-out.perf.json')) as f:
+            hedging = json.load(f)['hedging']
+        self.assertGreaterEqual(hedging['hedge_wins'], 1)
+        self.assertLessEqual(hedging['hedges'], 0.1 * hedging['requests'])
+        self.assertLessEqual(len(self.mock.requests), 40 + hedging['hedges'])
+
+    def test_hedging_busy_connections(self):
+        """ Hedges are sent while stragglers hold every connection
+        """
+        self.utterances = ['greeting hello {}'.format(idx)
+                           for idx in range(24)]
+        pd.DataFrame({UTTERANCE_COLUMN: self.utterances,
+                      GOLDEN_INTENT_COLUMN: ['greeting'] * 24}) \
+          .to_csv(self.in_file, encoding=UTF_8, quoting=csv.QUOTE_ALL,
+                  index=False)
+        self.mock.delays = {idx: 3 for idx in range(21, 25)}
+        start = time.monotonic()
+        self.run_test(['-r', '4', '--hedge_budget', '0.2'])
+
+        self.assertLess(time.monotonic() - start, 7.5)
+        with open(os.path.join(self.test_dir,
+                               'conversation-out.perf.json')) as f:
+            hedging = json.load(f)['hedging']
+        self.assertEqual(hedging['hedge_wins'], 4)
+
+    def test_no_retry_on_auth_error(self):
+        """ 401 fails immediately without retries
+        """
+        self.mock.failures = [(401, {})] * len(self.utterances)
+        with self.assertRaises(Exception):
+            self.run_test(['-r', '1'])
+        self.assertEqual(len(self.mock.requests), 1)
+
+    def test_resume(self):
+        """ Rows in the checkpoint are not sent again
+        """
+        checkpoint = Checkpoint(checkpoint_file(self.out_file), 'ws-id',
+                                len(self.utterances))
+        checkpoint.open()
+        for row_idx in range(15):
+            checkpoint.append(row_idx, self.utterances[row_idx],
+                              {PREDICTED_INTENT_COLUMN: 'cached',
+                               CONFIDENCE_COLUMN: 0.5,
+                               DETECTED_ENTITY_COLUMN: '',
+                               DIALOG_RESPONSE_COLUMN: ''})
+        checkpoint.close()
+
+        out_df = self.run_test(['-r', '100', '--resume'])
+
+        self.assertEqual(len(self.mock.requests), 5)
+        self.assertEqual(list(out_df[PREDICTED_INTENT_COLUMN]),
+                         ['cached'] * 15 + ['greeting'] * 5)
+        self.assertFalse(os.path.exists(checkpoint.file))
+
+    def test_resume_archive(self):
+        """ A resumed run rewrites the readable part of a killed run's
+            archive, and sends again the rows it had lost
+        """
+        checkpoint = Checkpoint(checkpoint_file(self.out_file), 'ws-id',
+                                len(self.utterances))
+        checkpoint.open()
+        for row_idx in range(15):
+            checkpoint.append(row_idx, self.utterances[row_idx],
+                              {PREDICTED_INTENT_COLUMN: 'greeting',
+                               CONFIDENCE_COLUMN: 0.5,
+                               DETECTED_ENTITY_COLUMN: '',
+                               DIALOG_RESPONSE_COLUMN: ''})
+        checkpoint.close()
+
+        # Killed with rows 10 to 14 still in the compressor, its gzip
+        # member left unfinished
+        raw = io.BytesIO()
+        killed = gzip.GzipFile(fileobj=raw, mode='wb')
+        header = {'workspace_id': 'ws-id', 'apiversion': 'v1',
+                  'rows': len(self.utterances)}
+        killed.write((json.dumps(header) + '\n').encode())
+        for row_idx in range(15):
+            killed.write((json.dumps({'rows': [row_idx],
+                                      'utterance': self.utterances[row_idx],
+                                      'response': {'n': row_idx}}) +
+                          '\n').encode())
+            if row_idx == 9:
+                killed.flush()
+        with open(archive_file(self.out_file), 'wb') as f:
+            f.write(raw.getvalue())
+
+        self.run_test(['-r', '100', '--resume', '--archive'])
+
+        self.assertEqual(len(self.mock.requests), 10)
+        _, responses = read_archive(archive_file(self.out_file))
+        self.assertEqual(sorted(responses), list(range(20)))
+        self.assertEqual(responses[9], {'n': 9})
+        self.assertEqual(responses[19]['input']['text'], self.utterances[19])
+
+    def test_checkpoint_kept_on_failure(self):
+        """ A failed utterance fails the run after the others completed,
+            and they stay in the checkpoint
+        """
+        self.mock.failures = [None, (400, {})]
+        with self.assertRaises(RuntimeError):
+            self.run_test(['-r', '5'])
+        self.assertFalse(os.path.exists(self.out_file))
+        with open(checkpoint_file(self.out_file)) as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), len(self.utterances))
+        self.assertEqual(json.loads(lines[1])['row'], 0)
+        self.assertNotIn(1, [json.loads(line)['row'] for line in lines[1:]])
+
+    def test_circuit_breaker(self):
+        """ Consecutive failures stop the run without sending the rest
+        """
+        self.mock.failures = [(400, {})] * len(self.utterances)
+        with self.assertRaises(CircuitOpenError):
+            self.run_test(['-r', '1', '--failure_threshold', '3'])
+        self.assertEqual(len(self.mock.requests), 3)
+
+    def test_circuit_breaker_fatal(self):
+        """ An unknown workspace stops the run at once
+        """
+        self.mock.failures = [(404, {})] * len(self.utterances)
+        with self.assertRaises(CircuitOpenError) as context:
+            self.run_test(['-r', '1'])
+        self.assertIn('workspace id', str(context.exception))
+        self.assertEqual(len(self.mock.requests), 1)
+
+    def test_response_cache(self):
+        """ Unchanged workspace content is answered from the cache
+        """
+        cache_args = ['-r', '100', '--cache_file',
+                      os.path.join(self.test_dir, 'cache.sqlite')]
+        self.run_test(cache_args)
+        self.assertEqual(len(self.mock.requests), len(self.utterances))
+
+        self.mock.workspace['name'] = 'renamed'
+        out_df = self.run_test(cache_args)
+        self.assertEqual(len(self.mock.requests), len(self.utterances))
+        self.assertTrue((out_df[PREDICTED_INTENT_COLUMN] == 'greeting').all())
+
+        self.mock.workspace['intents'].append({'intent': 'goodbye'})
+        self.run_test(cache_args)
+        self.assertEqual(len(self.mock.requests), 2 * len(self.utterances))
+
+    def test_response_cache_options(self):
+        """ Lean responses are not served to a test without lean mode
+        """
+        cache_args = ['-r', '100', '--cache_file',
+                      os.path.join(self.test_dir, 'cache-options.sqlite')]
+        self.run_test(cache_args + ['--lean'])
+        self.run_test(cache_args + ['--archive'])
+        self.assertEqual(len(self.mock.requests), 2 * len(self.utterances))
+        _, responses = read_archive(archive_file(self.out_file))
+        self.assertEqual(len(responses[0]['intents']), 2)
+
+    def test_response_cache_v2(self):
+        """ v2 responses are never cached, a redeployment cannot be seen
+        """
+        cache_args = ['-p', 'v2', '-r', '100', '--cache_file',
+                      os.path.join(self.test_dir, 'cache.sqlite')]
+        self.run_test(cache_args)
+        self.run_test(cache_args)
+        self.assertEqual(len(self.mock.requests), 2 * len(self.utterances))
+
+    def test_duplicate_utterances(self):
+        """ Duplicate utterances are sent once and share the result
+        """
+        utterances = ['agent please', 'yes', 'agent\nplease', 'yes',
+                      'agent please']
+        pd.DataFrame({UTTERANCE_COLUMN: utterances,
+                      GOLDEN_INTENT_COLUMN: ['agent'] * 5}) \
+          .to_csv(self.in_file, encoding=UTF_8, quoting=csv.QUOTE_ALL,
+                  index=False)
+        out_df = self.run_test(['-r', '100'])
+
+        self.assertEqual(len(self.mock.requests), 2)
+        self.assertEqual(list(out_df[UTTERANCE_COLUMN]), utterances)
+        self.assertEqual(list(out_df[PREDICTED_INTENT_COLUMN]),
+                         ['agent', 'yes', 'agent', 'yes', 'agent'])
+        self.assertEqual(list(out_df[INTENT_JUDGE_COLUMN]),
+                         ['yes', 'no', 'yes', 'no', 'yes'])
+
+    def test_partial_credit(self):
+        """ Scores come from the credit table, 1 on a match and 0 otherwise
+        """
+        utterances = ['greeting hi', 'goodbye now', 'thanks a lot', 'ok']
+        pd.DataFrame({UTTERANCE_COLUMN: utterances,
+                      GOLDEN_INTENT_COLUMN: ['greeting', 'farewell',
+                                             'appreciation', 'unknown']}) \
+          .to_csv(self.in_file, encoding=UTF_8, quoting=csv.QUOTE_ALL,
+                  index=False)
+        credit_file = os.path.join(self.test_dir, 'credit.csv')
+        pd.DataFrame({'Golden Intent': ['farewell', 'appreciation',
+                                        'appreciation'],
+                      'Partial Credit Intent': ['goodbye ', 'thanks', 'thanks'],
+                      'Partial Credit Intent Score': [0.5, 0.2, 0.7]}) \
+          .to_csv(credit_file, encoding=UTF_8, quoting=csv.QUOTE_ALL,
+                  index=False)
+        out_df = self.run_test(['-r', '100', '-c', credit_file])
+
+        self.assertEqual(list(out_df[SCORE_COLUMN]), [1.0, 0.5, 0.7, 0.0])
+
+    def test_response_archive(self):
+        """ Raw responses are archived and re-scored offline for top-k
+        """
+        utterances = ['greeting a', 'greeting b', 'greeting c', 'greeting a']
+        pd.DataFrame({UTTERANCE_COLUMN: utterances,
+                      GOLDEN_INTENT_COLUMN: ['greeting', 'fallback',
+                                             'goodbye', 'greeting']}) \
+          .to_csv(self.in_file, encoding=UTF_8, quoting=csv.QUOTE_ALL,
+                  index=False)
+        self.run_test(['-r', '100', '--archive'])
+
+        header, responses = read_archive(archive_file(self.out_file))
+        self.assertEqual(header['rows'], 4)
+        self.assertEqual(sorted(responses), [0, 1, 2, 3])
+        self.assertEqual(responses[3]['input']['text'], 'greeting a')
+
+        requests = len(self.mock.requests)
+        metrics_file = os.path.join(self.test_dir, 'topk.csv')
+        responsemetrics.func(responsemetrics.create_parser().parse_args(
+            ['-i', self.out_file, '-o', metrics_file, '-k', '2']))
+        self.assertEqual(len(self.mock.requests), requests)
+        metrics_df = pd.read_csv(metrics_file)
+        self.assertEqual(list(metrics_df['correct']), [2, 3])
+        self.assertEqual(list(metrics_df['total']), [4, 4])
+
+        # Rows without an archived response are skipped
+        archive = ResponseArchive(archive_file(self.out_file), header)
+        archive.open()
+        for row_idx in [1, 2, 3]:
+            archive.write([row_idx], utterances[row_idx], responses[row_idx])
+        archive.close()
+        responsemetrics.func(responsemetrics.create_parser().parse_args(
+            ['-i', self.out_file, '-o', metrics_file, '-k', '2']))
+        metrics_df = pd.read_csv(metrics_file)
+        self.assertEqual(list(metrics_df['correct']), [1, 2])
+        self.assertEqual(list(metrics_df['total']), [3, 3])
+
+    def test_multiple_workspaces(self):
+        """ Several workspaces are tested together within one rate limit
+        """
+        pd.DataFrame({UTTERANCE_COLUMN: self.utterances[:5],
+                      GOLDEN_INTENT_COLUMN: ['greeting'] * 5}) \
+          .to_csv(self.in_file, encoding=UTF_8, quoting=csv.QUOTE_ALL,
+                  index=False)
+        out_files = [os.path.join(self.test_dir, name)
+                     for name in ['a-out.csv', 'b-out.csv']]
+        args = self.parser.parse_args(
+            ['-i', self.in_file, '-o'] + out_files + ['-w', 'ws-a', 'ws-b',
+             '-a', 'token', '--auth-type', 'bearer', '-l', self.url,
+             '-t', UTTERANCE_COLUMN, '-g', GOLDEN_INTENT_COLUMN, '-r', '4'])
+        start = time.monotonic()
+        testConversation.func(args)
+
+        self.assertGreaterEqual(time.monotonic() - start, 2.0)
+        self.assertLessEqual(self.mock.max_in_flight, 4)
+        paths = [path for path, _, _ in self.mock.requests]
+        self.assertEqual(paths.count('/v1/workspaces/ws-a/message'), 5)
+        self.assertEqual(paths.count('/v1/workspaces/ws-b/message'), 5)
+        for out_file in out_files:
+            out_df = pd.read_csv(out_file, quoting=csv.QUOTE_ALL,
+                                 encoding=UTF_8, keep_default_na=False)
+            self.assertEqual(list(out_df[INTENT_JUDGE_COLUMN]), ['yes'] * 5)
+
+    def test_mismatched_workspaces(self):
+        """ Each workspace needs its own output file
+        """
+        args = self.parser.parse_args(
+            ['-i', self.in_file, '-o', self.out_file, '-w', 'ws-a', 'ws-b',
+             '-a', 'token', '--auth-type', 'bearer', '-l', self.url])
+        with self.assertRaises(ValueError):
+            testConversation.func(args)
+        self.assertEqual(len(self.mock.requests), 0)
+
+    def test_shards(self):
+        """ Shards cover every row once and merge back in input order
+        """
+        shard_files = []
+        for index in range(1, 4):
+            self.out_file = os.path.join(self.test_dir,
+                                         'shard-{}.csv'.format(index))
+            shard_df = self.run_test(['-r', '100',
+                                      '--shard', '{}/3'.format(index)])
+            self.assertTrue((shard_df[UTTERANCE_COLUMN] == [
+                self.utterances[row_id]
+                for row_id in shard_df[ROW_ID_COLUMN]]).all())
+            shard_files.append(self.out_file)
+        self.assertEqual(len(self.mock.requests), len(self.utterances))
+
+        merged_file = os.path.join(self.test_dir, 'merged.csv')
+        merge_parser = mergeShards.create_parser()
+        mergeShards.func(merge_parser.parse_args(
+            ['-i'] + shard_files + ['-o', merged_file, '-n', '20']))
+        merged_df = pd.read_csv(merged_file, quoting=csv.QUOTE_ALL,
+                                encoding=UTF_8, keep_default_na=False)
+        self.assertNotIn(ROW_ID_COLUMN, merged_df)
+        self.assertEqual(list(merged_df[UTTERANCE_COLUMN]), self.utterances)
+        self.assertEqual(list(merged_df[INTENT_JUDGE_COLUMN]),
+                         ['yes'] * 19 + ['no'])
+
+        with self.assertRaises(ValueError):
+            mergeShards.func(merge_parser.parse_args(
+                ['-i'] + shard_files[:2] + ['-o', merged_file, '-n', '20']))
+        with self.assertRaises(ValueError):
+            mergeShards.func(merge_parser.parse_args(
+                ['-i'] + shard_files + shard_files[:1] +
+                ['-o', merged_file]))
+
+    def test_early_stop(self):
+        """ Sampling stops once accuracy is within the margin and only the
+            tested rows are saved
+        """
+        utterances = ['greeting hi {}'.format(idx) for idx in range(300)] + \
+                     ['goodbye {}'.format(idx) for idx in range(100)]
+        golden = ['greeting'] * 270 + ['other'] * 30 + ['goodbye'] * 100
+        pd.DataFrame({UTTERANCE_COLUMN: utterances,
+                      GOLDEN_INTENT_COLUMN: golden}) \
+          .to_csv(self.in_file, encoding=UTF_8, quoting=csv.QUOTE_ALL,
+                  index=False)
+        out_df = self.run_test(['-r', '100', '--early_stop_margin', '0.1',
+                                '--archive'])
+
+        with open(sampling_file(self.out_file)) as f:
+            sampling = json.load(f)
+        self.assertEqual(sampling['rows_total'], 400)
+        self.assertEqual(sampling['rows_tested'], len(out_df))
+        self.assertLess(len(self.mock.requests), 400)
+        self.assertEqual(sampling['calls_saved'],
+                         400 - sampling['calls_made'])
+        self.assertGreater(sampling['calls_saved'], 0)
+        self.assertLessEqual(
+            (sampling['upper'] - sampling['lower']) / 2, 0.1)
+        self.assertLessEqual(sampling['lower'], sampling['accuracy'])
+        self.assertLessEqual(sampling['accuracy'], sampling['upper'])
+        # Tested rows keep their input order and cover every intent
+        tested = list(out_df[UTTERANCE_COLUMN])
+        self.assertEqual(tested, [utterance for utterance in utterances
+                                  if utterance in set(tested)])
+        self.assertEqual(set(out_df[GOLDEN_INTENT_COLUMN]),
+                         {'greeting', 'other', 'goodbye'})
+        # Archived responses are numbered like the saved rows
+        _, responses = read_archive(archive_file(self.out_file))
+        self.assertEqual(sorted(responses), list(range(len(out_df))))
+        self.assertEqual([responses[row_idx]['input']['text']
+                          for row_idx in range(len(out_df))], tested)
+
+    def test_early_stop_duplicates(self):
+        """ A distinct utterance is one sample however many rows share it,
+            and the calls made are the requests sent
+        """
+        utterances = ['greeting hi {}'.format(idx) for idx in range(200)]
+        pd.DataFrame({UTTERANCE_COLUMN: utterances * 2,
+                      GOLDEN_INTENT_COLUMN: ['greeting'] * 380 +
+                                            ['other'] * 20}) \
+          .to_csv(self.in_file, encoding=UTF_8, quoting=csv.QUOTE_ALL,
+                  index=False)
+        out_df = self.run_test(['-r', '20', '--early_stop_margin', '0.1'])
+
+        with open(sampling_file(self.out_file)) as f:
+            sampling = json.load(f)
+        self.assertEqual(sampling['utterances_total'], 200)
+        self.assertEqual(sampling['rows_total'], 400)
+        self.assertEqual(sampling['rows_tested'], len(out_df))
+        self.assertEqual(sampling['rows_tested'],
+                         2 * sampling['utterances_tested'])
+        self.assertGreaterEqual(sampling['calls_made'],
+                                len(self.mock.requests))
+        self.assertEqual(sampling['calls_saved'],
+                         200 - sampling['calls_made'])
+
+    def test_chunked(self):
+        """ Chunks are appended to the output and a resumed run continues
+            after the last saved chunk
+        """
+        self.mock.failures = [None] * 7 + [(400, {})]
+        with self.assertRaises(Exception):
+            self.run_test(['-r', '100', '--chunk_size', '7'])
+        saved_df = pd.read_csv(self.out_file, quoting=csv.QUOTE_ALL,
+                               encoding=UTF_8, keep_default_na=False)
+        self.assertEqual(len(saved_df), 7)
+
+        requests = len(self.mock.requests)
+        out_df = self.run_test(['-r', '100', '--chunk_size', '7',
+                                '--resume'])
+        self.assertEqual(len(self.mock.requests) - requests, 13)
+        self.assertEqual(list(out_df[UTTERANCE_COLUMN]), self.utterances)
+        self.assertEqual(list(out_df[INTENT_JUDGE_COLUMN]),
+                         ['yes'] * 19 + ['no'])
+
+
+if __name__ == '__main__':
+    unittest.main()
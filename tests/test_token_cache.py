@@ -0,0 +1,80 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from test_base import CommandLineTestCase
+import sys
+import os
+import time
+import jwt
+from unittest import mock
+tool_base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, tool_base)
+from utils import SharedIAMTokenManager, IAMTokenManager
+
+
+class TokenCacheTestCase(CommandLineTestCase):
+    def setUp(self):
+        self.cache_file = os.path.join(self.test_dir, 'tokens.json')
+        if os.path.exists(self.cache_file):
+            os.remove(self.cache_file)
+        self.requests = 0
+
+    def token_response(self, lifetime):
+        now = int(time.time())
+        self.requests += 1
+        return {'access_token': jwt.encode(
+            {'iat': now - 3600 + lifetime, 'exp': now + lifetime,
+             'n': self.requests}, 'secret-key-of-32-bytes-or-longer',
+            algorithm='HS256')}
+
+    def test_shared_token(self):
+        """ A fresh token is exchanged once for every manager of the key
+        """
+        with mock.patch.object(IAMTokenManager, 'request_token',
+                               lambda manager: self.token_response(3000)):
+            tokens = [SharedIAMTokenManager('key', self.cache_file).get_token()
+                      for _ in range(3)]
+            other = SharedIAMTokenManager('other', self.cache_file).get_token()
+        self.assertEqual(self.requests, 2)
+        self.assertEqual(len(set(tokens)), 1)
+        self.assertNotEqual(other, tokens[0])
+        with open(self.cache_file) as f:
+            self.assertNotIn('key', f.read())
+
+    def test_refresh_due(self):
+        """ A token close to expiry is not reused
+        """
+        with mock.patch.object(IAMTokenManager, 'request_token',
+                               lambda manager: self.token_response(60)):
+            first = SharedIAMTokenManager('key', self.cache_file).get_token()
+            second = SharedIAMTokenManager('key', self.cache_file).get_token()
+        self.assertNotEqual(first, second)
+
+    def test_owner_only(self):
+        """ The token file is readable by its owner only
+        """
+        with open(self.cache_file, 'w') as f:
+            f.write('{}')
+        os.chmod(self.cache_file, 0o644)
+        with mock.patch.object(IAMTokenManager, 'request_token',
+                               lambda manager: self.token_response(3000)):
+            SharedIAMTokenManager('key', self.cache_file).get_token()
+        self.assertEqual(os.stat(self.cache_file).st_mode & 0o777, 0o600)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from test_base import CommandLineTestCase
+import sys
+import os
+import time
+from unittest import mock
+tool_base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, tool_base)
+sys.path.append(os.path.join(tool_base, 'utils'))
+import training_poller
+from training_poller import TrainingPoller, TrainingFailedError
+
+
+class TrainingPollerTestCase(CommandLineTestCase):
+    def test_training_poller(self):
+        """ Poll intervals back off, failures raise and a model still
+            training after the timeout gives None
+        """
+        statuses = {'ok': ['Training'] * 3 + ['Available'],
+                    'bad': ['Training', 'Failed'],
+                    'slow': ['Training'] * 100}
+        polls = []
+
+        def get_model(model_id):
+            polls.append((model_id, time.monotonic()))
+            return {'id': model_id, 'status': statuses[model_id].pop(0)}
+
+        poller = TrainingPoller(lambda: [], get_model, 'id', 'Available',
+                                failed=('Failed',), initial_interval=0.05,
+                                backoff=2, timeout=1)
+        self.assertEqual(poller.wait('ok')['status'], 'Available')
+        times = [t for _, t in polls]
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        self.assertEqual(len(gaps), 3)
+        self.assertGreater(gaps[2], gaps[0] * 2)
+        self.assertIn('ok', poller.training_times)
+
+        with self.assertRaises(TrainingFailedError):
+            poller.wait('bad')
+        self.assertIsNone(poller.wait('slow'))
+
+
+    def test_bad_status(self):
+        """ A status the poller cannot read fails the wait
+        """
+        poller = TrainingPoller(lambda: [], lambda model_id: {'id': model_id},
+                                'id', 'Available', initial_interval=0.05)
+        with self.assertRaises(KeyError):
+            poller.wait('model')
+        self.assertFalse(poller.pending)
+
+    def test_wait_timeout(self):
+        """ wait() gives up when the poll loop does not answer in time
+        """
+        def get_model(model_id):
+            time.sleep(1)
+            return {'id': model_id, 'status': 'Training'}
+
+        poller = TrainingPoller(lambda: [], get_model, 'id', 'Available',
+                                initial_interval=0.05, timeout=0.1)
+        with mock.patch.object(training_poller, 'WAIT_MARGIN', 0.1):
+            started = time.monotonic()
+            self.assertIsNone(poller.wait('model'))
+        self.assertLess(time.monotonic() - started, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
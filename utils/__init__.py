@@ -17,10 +17,18 @@
 import logging
 import csv
 import os
+import json
+import time
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import jwt
 import pandas as pd
 from ibm_watson import AssistantV1
 from ibm_watson import NaturalLanguageUnderstandingV1
+from ibm_cloud_sdk_core import ApiException
 from ibm_cloud_sdk_core.authenticators import IAMAuthenticator, BearerTokenAuthenticator
+from ibm_cloud_sdk_core.token_managers.iam_token_manager import IAMTokenManager
 
 UTF_8 = 'utf-8'
 TRAIN_FILENAME = 'train.csv'
@@ -40,6 +48,11 @@ DIALOG_RESPONSE_COLUMN = 'dialog response'
 GOLDEN_INTENT_COLUMN = 'golden intent'
 SCORE_COLUMN = 'score'
 
+# Partial credit table column names
+PARTIAL_CREDIT_GOLDEN_COLUMN = 'Golden Intent'
+PARTIAL_CREDIT_INTENT_COLUMN = 'Partial Credit Intent'
+PARTIAL_CREDIT_SCORE_COLUMN = 'Partial Credit Intent Score'
+
 WCS_IAM_APIKEY_ITEM = 'iam_apikey'
 WCS_AUTH_TYPE_ITEM = 'auth_type'
 WCS_BASEURL_ITEM = 'url'
@@ -91,6 +104,23 @@ EQUAL_WEIGHT_MODE = 'equal'
 # WA BASE_URL - default if no URL is passed
 BASE_URL = 'https://gateway.watsonplatform.net/assistant/api'
 
+# IAM tokens are shared through this file by every process that has it set
+# in its environment
+TOKEN_CACHE_ENV = 'WA_TESTING_TOKEN_CACHE'
+TOKEN_CACHE_FILENAME = '.iam-tokens.json'
+# A token is reused until this share of its lifetime is left, when the SDK
+# itself would refresh it
+TOKEN_REFRESH_SHARE = 0.2
+TOKEN_LOCK_TIMEOUT = 30
+
+# Workspaces are tagged in their metadata with a fingerprint of the data they
+# were trained on, and the time they were last used by a run.  Tagged
+# workspaces last used at or after the time in this environment variable
+# belong to the current run and are never evicted
+TRAINING_FINGERPRINT_KEY = 'wa_testing_tool_fingerprint'
+LAST_USED_KEY = 'wa_testing_tool_last_used'
+RUN_STARTED_ENV = 'WA_TESTING_RUN_STARTED'
+
 logger = logging.getLogger(__name__)
 
 
@@ -127,45 +157,208 @@ def unmarshall_entity(entities_str):
     return entities
 
 
+@contextmanager
+def file_lock(file, timeout=TOKEN_LOCK_TIMEOUT):
+    """ Exclusive lock across processes on a file, held with a lock file
+        next to it.  A lock older than timeout seconds is considered left
+        behind by a killed process and taken over.
+    """
+    lock_file = file + '.lock'
+    while True:
+        try:
+            fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_file) > timeout:
+                    os.remove(lock_file)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_file)
+
+
+def token_is_fresh(access_token):
+    """ Whether a JWT access token is not yet due for refresh
+    """
+    claims = jwt.decode(access_token, algorithms=['RS256'],
+                        options={'verify_signature': False})
+    exp, iat = claims['exp'], claims['iat']
+    return time.time() < exp - (exp - iat) * TOKEN_REFRESH_SHARE
+
+
+class SharedIAMTokenManager(IAMTokenManager):
+    """ IAM token manager that reuses a fresh token saved to a cache file by
+        any process using the same API key, and saves the tokens it requests
+    """
+    def __init__(self, apikey, cache_file, **kwargs):
+        super().__init__(apikey, **kwargs)
+        self.cache_file = cache_file
+        # Tokens are looked up by a hash, the API key is never written
+        self.cache_key = hashlib.sha256(
+            '{} {}'.format(self.url, apikey).encode(UTF_8)).hexdigest()
+
+    def request_token(self):
+        directory = os.path.dirname(os.path.abspath(self.cache_file))
+        os.makedirs(directory, exist_ok=True)
+        with file_lock(self.cache_file):
+            tokens = {}
+            if os.path.exists(self.cache_file):
+                try:
+                    with open(self.cache_file, encoding=UTF_8) as f:
+                        tokens = json.load(f)
+                except ValueError:
+                    logger.warning('Ignoring corrupt token cache %s',
+                                   self.cache_file)
+            token_response = tokens.get(self.cache_key)
+            if token_response is not None and \
+               token_is_fresh(token_response[self.token_name]):
+                return token_response
+
+            token_response = super().request_token()
+            tokens[self.cache_key] = token_response
+            # Readable by the owner only, like the config file holding the key
+            fd = os.open(self.cache_file,
+                         os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            # The mode only applies to a new file
+            os.chmod(self.cache_file, 0o600)
+            with open(fd, 'w', encoding=UTF_8) as f:
+                json.dump(tokens, f)
+            return token_response
+
+
+def utc_timestamp():
+    """ Current UTC time in ISO 8601, which sorts in time order
+    """
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+_authenticators = {}
+_service_clients = {}
+
+
+def get_authenticator(auth_type, apikey):
+    """ Authenticator of the credentials, one per process so IAM tokens are
+        exchanged once and refreshed only when due
+    """
+    key = (auth_type, apikey)
+    if key not in _authenticators:
+        if auth_type == 'iam':
+            authenticator = IAMAuthenticator(apikey)
+            token_cache = os.environ.get(TOKEN_CACHE_ENV)
+            if token_cache:
+                authenticator.token_manager = \
+                    SharedIAMTokenManager(apikey, token_cache)
+        elif auth_type == 'bearer':
+            authenticator = BearerTokenAuthenticator(apikey)
+        else:
+            raise ValueError(f'Unknown auth type: "{auth_type}"')
+        _authenticators[key] = authenticator
+    return _authenticators[key]
+
+
+def get_service_client(service_class, authenticator, url, version,
+                       disable_ssl="False"):
+    """ SDK client of service_class, one per (service, url, version)
+    """
+    key = (service_class, url, version, str(disable_ssl), id(authenticator))
+    if key not in _service_clients:
+        client = service_class(version=version, authenticator=authenticator)
+        client.set_disable_ssl_verification(eval(str(disable_ssl)))
+        client.set_service_url(url)
+        _service_clients[key] = client
+    return _service_clients[key]
+
+
 def delete_workspaces(iam_apikey, url, version, workspace_ids, auth_type, disable_ssl):
     """ Delete workspaces
     """
-    if auth_type == 'iam':
-        authenticator = IAMAuthenticator(iam_apikey)
-    elif auth_type == 'bearer':
-        authenticator = BearerTokenAuthenticator(iam_apikey)
+    authenticator = get_authenticator(auth_type, iam_apikey)
+    if 'natural-language-understanding' in url:
+        c = get_service_client(NaturalLanguageUnderstandingV1, authenticator,
+                               url, version, disable_ssl)
     else:
-        raise ValueError(f'Unknown auth_type "{auth_type}"')
+        c = get_service_client(AssistantV1, authenticator, url, version,
+                               disable_ssl)
 
     for workspace_id in workspace_ids:
         if 'natural-language-understanding' in url:
-            c = NaturalLanguageUnderstandingV1(
-                    version=version,
-                    authenticator=authenticator
-                    )
-            c.set_service_url(url)
             c.delete_classifications_model(model_id=workspace_id)
         else:
-            c = AssistantV1(
-                    version=version,
-                    authenticator=authenticator
-                    )
-            c.set_disable_ssl_verification(eval(disable_ssl))
-            c.set_service_url(url)
             c.delete_workspace(workspace_id=workspace_id)
 
     print('Cleaned up workspaces')
 
-def parse_partial_credit_table(file):
+
+def workspace_exists(iam_apikey, url, version, workspace_id, auth_type,
+                     disable_ssl):
+    """ Whether a workspace or classifier has not been deleted
+    """
+    authenticator = get_authenticator(auth_type, iam_apikey)
+    try:
+        if 'natural-language-understanding' in url:
+            get_service_client(NaturalLanguageUnderstandingV1, authenticator,
+                               url, version, disable_ssl) \
+                .get_classifications_model(model_id=workspace_id)
+        else:
+            get_service_client(AssistantV1, authenticator, url, version,
+                               disable_ssl) \
+                .get_workspace(workspace_id=workspace_id)
+    except ApiException as e:
+        if e.code == 404:
+            return False
+        raise
+    return True
+
+def read_partial_credit_table(file):
+    """ Read partial credit table into a DataFrame of unique
+        (golden intent, partial credit intent) pairs and their score
+    """
     df = pd.read_csv(file, quoting=csv.QUOTE_ALL,
                      encoding=UTF_8)
-    df.fillna('0.0')
+    table = pd.DataFrame({
+        PARTIAL_CREDIT_GOLDEN_COLUMN:
+            df[PARTIAL_CREDIT_GOLDEN_COLUMN].astype(str).str.strip(),
+        PARTIAL_CREDIT_INTENT_COLUMN:
+            df[PARTIAL_CREDIT_INTENT_COLUMN].astype(str).str.strip(),
+        PARTIAL_CREDIT_SCORE_COLUMN:
+            pd.to_numeric(df[PARTIAL_CREDIT_SCORE_COLUMN],
+                          errors='coerce').fillna(0.0)})
+    # Later rows win, as they did in the nested dict
+    return table.drop_duplicates(
+        subset=[PARTIAL_CREDIT_GOLDEN_COLUMN, PARTIAL_CREDIT_INTENT_COLUMN],
+        keep='last')
+
+
+def parse_partial_credit_table(file):
+    """ Partial credit table as {golden intent: {intent: score}}
+    """
     table = {}
-    for _, row in df.iterrows():
-        golden_intent = row['Golden Intent'].strip()
-        if golden_intent not in table:
-            table[golden_intent] = {}
-        table[golden_intent][row['Partial Credit Intent'].strip()] = \
-            float(row['Partial Credit Intent Score'])
+    for golden_intent, intent, score in \
+            read_partial_credit_table(file).itertuples(index=False):
+        table.setdefault(golden_intent, {})[intent] = score
 
     return table
+
+
+def score_partial_credit(golden, predicted, credit_table):
+    """ Score every (golden, predicted) pair in one join against the credit
+        table from read_partial_credit_table: 1 for a match, the table score
+        for a listed pair and 0 otherwise.  Returns a series aligned to golden.
+    """
+    pairs = pd.DataFrame({
+        PARTIAL_CREDIT_GOLDEN_COLUMN: golden.astype(str).str.strip().values,
+        PARTIAL_CREDIT_INTENT_COLUMN: predicted.astype(str).str.strip().values})
+    scores = pairs.merge(credit_table, how='left',
+                         on=[PARTIAL_CREDIT_GOLDEN_COLUMN,
+                             PARTIAL_CREDIT_INTENT_COLUMN]) \
+                  [PARTIAL_CREDIT_SCORE_COLUMN].fillna(0.0)
+    scores[pairs[PARTIAL_CREDIT_GOLDEN_COLUMN] ==
+           pairs[PARTIAL_CREDIT_INTENT_COLUMN]] = 1.0
+    scores.index = golden.index
+    return scores
@@ -0,0 +1,159 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Non-blocking Watson Assistant and NLU client built on aiohttp
+
+    The ibm_watson SDK methods are synchronous, so awaiting them from a
+    coroutine still sends one request at a time.  This client issues the same
+    requests as AssistantV1.message / AssistantV2.message_stateless /
+    NaturalLanguageUnderstandingV1.analyze over a shared keep-alive connection
+    pool so that many utterances can be in flight.
+"""
+import json
+from urllib.parse import quote
+
+import aiohttp
+from ibm_cloud_sdk_core import ApiException
+from ibm_watson.common import get_sdk_headers
+
+DEFAULT_MAX_CONNECTIONS = 100
+KEEPALIVE_TIMEOUT = 30
+# Seconds a request may take, from connecting to reading the whole response
+DEFAULT_REQUEST_TIMEOUT = 60
+
+
+class AsyncApiException(ApiException):
+    """ Raised for an unsuccessful HTTP response, keeps the response headers
+    """
+    def __init__(self, code, message=None, headers=None):
+        super().__init__(code, message=message)
+        self.headers = headers if headers is not None else {}
+
+
+def error_message(status, body):
+    """ Extract the error message from a service error body
+    """
+    try:
+        error_json = json.loads(body)
+        if 'errors' in error_json and isinstance(error_json['errors'], list):
+            return error_json['errors'][0].get('message')
+        for key in ['error', 'message', 'errorMessage']:
+            if key in error_json:
+                return error_json[key]
+    except (ValueError, TypeError, IndexError, AttributeError):
+        pass
+    return body or 'HTTP {}'.format(status)
+
+
+class AsyncAssistantClient:
+    """ Async counterpart of the AssistantV1/AssistantV2 message and
+        NaturalLanguageUnderstandingV1 analyze operations.
+
+        Must be used as an async context manager so the connection pool is
+        opened and closed inside the running event loop:
+
+            async with AsyncAssistantClient(version, authenticator,
+                                            url) as conv:
+                resp = await conv.message(workspace_id, input=..., context=...)
+    """
+    def __init__(self, version, authenticator, service_url,
+                 disable_ssl_verification=False,
+                 max_connections=DEFAULT_MAX_CONNECTIONS,
+                 timeout=DEFAULT_REQUEST_TIMEOUT):
+        self.version = version
+        self.authenticator = authenticator
+        self.service_url = service_url.rstrip('/')
+        self.disable_ssl_verification = disable_ssl_verification
+        self.max_connections = max(1, max_connections)
+        self.timeout = timeout
+        self.session = None
+        # Size of the successful response bodies received
+        self.responses = 0
+        self.bytes_received = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ssl=False if self.disable_ssl_verification else None)
+        # A timed out request raises asyncio.TimeoutError, retried like
+        # other network errors
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def message(self, workspace_id, input=None, context=None):
+        """ Same request as AssistantV1.message
+        """
+        data = {'input': input, 'context': context}
+        path = '/v1/workspaces/{}/message'.format(quote(workspace_id, safe=''))
+        return await self.post(path, data, service_version='V1',
+                               operation_id='message')
+
+    async def message_stateless(self, assistant_id, input=None, context=None):
+        """ Same request as AssistantV2.message_stateless
+        """
+        data = {'input': input, 'context': context}
+        path = '/v2/assistants/{}/message'.format(quote(assistant_id, safe=''))
+        return await self.post(path, data, service_version='V2',
+                               operation_id='message_stateless')
+
+    async def analyze(self, features, text=None, language=None):
+        """ Same request as NaturalLanguageUnderstandingV1.analyze, with
+            features as a dict
+        """
+        data = {'features': features, 'text': text, 'language': language}
+        return await self.post('/v1/analyze', data, service_version='V1',
+                               operation_id='analyze',
+                               service_name='natural-language-understanding')
+
+    async def post(self, path, data, service_version, operation_id,
+                   service_name='assistant'):
+        """ POST a JSON body and return the decoded JSON response
+        """
+        headers = get_sdk_headers(service_name=service_name,
+                                  service_version=service_version,
+                                  operation_id=operation_id)
+        headers['content-type'] = 'application/json'
+        headers['Accept'] = 'application/json'
+        # Token managers cache the token, this only blocks on refresh
+        self.authenticator.authenticate({'headers': headers})
+
+        data = {k: v for (k, v) in data.items() if v is not None}
+        async with self.session.post(self.service_url + path,
+                                     params={'version': self.version},
+                                     data=json.dumps(data),
+                                     headers=headers) as response:
+            body = await response.read()
+            if response.status < 200 or response.status >= 300:
+                raise AsyncApiException(response.status,
+                                        message=error_message(
+                                            response.status,
+                                            body.decode('utf-8', 'replace')),
+                                        headers=dict(response.headers))
+            self.responses += 1
+            self.bytes_received += len(body)
+            return json.loads(body)
@@ -0,0 +1,95 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Append-only JSONL checkpoint of test results
+
+    Schema, one JSON object per line:
+    | {"workspace_id": ..., "rows": ...}                    (header)
+    | {"row": row index, "utterance": ..., <result columns>} (one per result)
+"""
+import json
+import os
+
+CHECKPOINT_FILE_SUFFIX = '.checkpoint.jsonl'
+ROW_KEY = 'row'
+UTTERANCE_KEY = 'utterance'
+
+
+def checkpoint_file(outfile):
+    """ Checkpoint file written next to the test output
+    """
+    return os.path.splitext(outfile)[0] + CHECKPOINT_FILE_SUFFIX
+
+
+class Checkpoint:
+    """ Each finished row is appended and flushed as soon as it completes so
+        an interrupted run loses nothing.  A resumed run only re-tests rows
+        missing from the file.
+    """
+    def __init__(self, file, workspace_id, rows):
+        self.file = file
+        self.header = {'workspace_id': workspace_id, 'rows': rows}
+        self.f = None
+
+    def load(self):
+        """ Return {row index: record} for a checkpoint of the same test,
+            or an empty dict if there is none
+        """
+        records = {}
+        if not os.path.exists(self.file):
+            return records
+        with open(self.file, 'r', encoding='utf-8') as f:
+            lines = iter(f)
+            try:
+                header = json.loads(next(lines))
+            except (StopIteration, ValueError):
+                return records
+            if header != self.header:
+                print("Checkpoint {} is for a different test ({}), "
+                      "starting over".format(self.file, header))
+                return records
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:  # Torn last line of an interrupted write
+                    continue
+                records[record[ROW_KEY]] = record
+        return records
+
+    def open(self, records={}):
+        """ Start a fresh checkpoint holding the given records
+        """
+        self.f = open(self.file, 'w', encoding='utf-8')
+        self.f.write(json.dumps(self.header) + '\n')
+        for record in records.values():
+            self.f.write(json.dumps(record) + '\n')
+        self.f.flush()
+
+    def append(self, row_idx, utterance, results):
+        record = {ROW_KEY: row_idx, UTTERANCE_KEY: utterance}
+        record.update(results)
+        self.f.write(json.dumps(record) + '\n')
+        self.f.flush()
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.file):
+            os.remove(self.file)
@@ -1,16 +1,12 @@
-from ibm_cloud_sdk_core.authenticators import BearerTokenAuthenticator, IAMAuthenticator, Authenticator
+from ibm_cloud_sdk_core.authenticators import Authenticator
 from argparse import Namespace
+from __init__ import get_authenticator
 
 def choose_auth(args: Namespace) -> Authenticator:
     """
-    Choose the authenticator type
+    Choose the authenticator type, reused for the same credentials
 
     :param args:
     :return:
     """
-    if args.auth_type == 'iam':
-        return IAMAuthenticator(args.iam_apikey)
-    elif args.auth_type == 'bearer':
-        return BearerTokenAuthenticator(args.iam_apikey)
-    else:
-        raise ValueError(f'Unknown auth type: "{args.auth_type}"')
\ No newline at end of file
+    return get_authenticator(args.auth_type, args.iam_apikey)
@@ -0,0 +1,65 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Circuit breaker stopping a misconfigured test run
+"""
+from retry_policy import status_code
+
+DEFAULT_FAILURE_THRESHOLD = 10
+# Responses no other utterance can succeed after: bad credentials, no access
+# to the instance, unknown workspace or model
+FATAL_STATUS_HINTS = {
+    401: 'check the API key and auth type',
+    403: 'the API key has no access to this service instance',
+    404: 'check the workspace id and the service URL'
+}
+
+
+class CircuitOpenError(Exception):
+    """ Raised instead of sending requests once the breaker is open
+    """
+
+
+class CircuitBreaker:
+    """ Opens on the first fatal response, or once threshold utterances in
+        a row failed (after their retries) or could not be analyzed.  Every
+        later request fails fast with the reason instead of being sent.
+    """
+    def __init__(self, threshold=DEFAULT_FAILURE_THRESHOLD):
+        self.threshold = threshold
+        self.consecutive_failures = 0
+        self.reason = None
+
+    def check(self):
+        if self.reason is not None:
+            raise CircuitOpenError(self.reason)
+
+    def on_success(self):
+        self.consecutive_failures = 0
+
+    def on_failure(self, exception):
+        self.consecutive_failures += 1
+        if self.reason is not None:
+            return
+        code = status_code(exception)
+        if code in FATAL_STATUS_HINTS:
+            self.reason = 'HTTP {} ({}): {}'.format(
+                code, FATAL_STATUS_HINTS[code], exception)
+        elif self.consecutive_failures >= self.threshold:
+            self.reason = '{} utterances in a row failed, last error: {}' \
+                .format(self.consecutive_failures, exception)
+        if self.reason is not None:
+            print("Stopping test, {}".format(self.reason))
@@ -31,9 +31,13 @@ def cell_to_str(x):
         return ""
     return str(x)
 
-def func(args):
-    in_df = pd.read_csv(args.in_file, quoting=csv.QUOTE_ALL,
-                        encoding=UTF_8, keep_default_na=False)
+def func(args, in_df=None):
+    """ Write the confusion matrix of the test output in args.in_file, or
+        of in_df when the caller already has it in memory
+    """
+    if in_df is None:
+        in_df = pd.read_csv(args.in_file, quoting=csv.QUOTE_ALL,
+                            encoding=UTF_8, keep_default_na=False)
     # Look for target columns
     if args.test_column not in in_df or args.golden_column not in in_df:
         raise ValueError('Missing required columns')
@@ -109,6 +113,7 @@ def func(args):
     plt.autoscale()
     out_image_file = args.out_file[:-4] + "_scaled.png"
     plt.savefig(out_image_file,bbox_inches='tight',dpi=400)
+    plt.close()
    
     print ("Wrote global-scaled confusion matrix diagram to {}.".format(out_image_file))
 
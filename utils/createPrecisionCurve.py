@@ -211,6 +211,7 @@ def func(args):
         plt.ylim(args.ymin, 1.0)
     # Save figure as file
     plt.savefig(args.outfile)
+    plt.close(fig)
 
     print("Wrote precision curve to {}".format(args.outfile))
 
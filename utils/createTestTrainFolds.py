@@ -27,9 +27,13 @@ from __init__ import FOLD_NUM_DEFAULT, UTF_8, GOLDEN_INTENT_COLUMN, \
 
 
 def func(args):
+    """ Write the train and test file of each fold, and return the
+        (train, test) frames of the folds
+    """
     df = pd.read_csv(args.infile, quoting=csv.QUOTE_ALL, encoding=UTF_8,
                      header=None)
-    kf = KFold(n_splits=args.fold_num, shuffle=True)
+    kf = KFold(n_splits=args.fold_num, shuffle=True, random_state=args.seed)
+    folds = []
     for fold_idx, (train_idx, test_idx) in \
              enumerate(kf.split(df.index.to_numpy())):
         out_directory = os.path.join(args.outdir, str(fold_idx))
@@ -42,6 +46,8 @@ def func(args):
                                  quoting=csv.QUOTE_ALL, encoding=UTF_8,
                                  index=False, header=[UTTERANCE_COLUMN,
                                                       GOLDEN_INTENT_COLUMN])
+        folds.append((df.iloc[train_idx], df.iloc[test_idx]))
+    return folds
 
 
 def create_parser():
@@ -52,6 +58,9 @@ def create_parser():
     parser.add_argument('-o', '--outdir', type=str, help='Output directory',
                         default=os.getcwd())
     parser.add_argument('-k', '--fold_num', type=int, default=FOLD_NUM_DEFAULT)
+    parser.add_argument('--seed', type=int,
+                        help='Seed of the fold shuffle, for the same folds '
+                             'on every run. Random by default')
 
     return parser
 
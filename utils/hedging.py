@@ -0,0 +1,112 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Hedged requests against tail latency
+
+    A request still unanswered after the observed p95 latency is sent a
+    second time, and whichever answer arrives first is used.  Hedges are
+    limited to a budget share of the requests so a uniformly slow service
+    is not sent twice the load.
+"""
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+
+HEDGE_PERCENTILE = 95
+# Latencies observed before hedging starts, and the window they are kept in
+MIN_SAMPLES = 20
+WINDOW = 1000
+# Requests between updates of the hedge delay
+UPDATE_INTERVAL = 50
+
+
+class Hedger:
+    """ Sends requests, hedging the slow ones within budget (a share of
+        requests, 0 disables hedging)
+    """
+    def __init__(self, budget=0.0, percentile=HEDGE_PERCENTILE):
+        self.budget = budget
+        self.percentile = percentile
+        self.latencies = deque(maxlen=WINDOW)
+        self.hedge_delay = None
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, latency):
+        self.latencies.append(latency)
+        if len(self.latencies) >= MIN_SAMPLES and \
+           (self.hedge_delay is None or
+                len(self.latencies) % UPDATE_INTERVAL == 0):
+            self.hedge_delay = float(np.percentile(self.latencies,
+                                                   self.percentile))
+
+    def can_hedge(self):
+        return self.hedges + 1 <= self.budget * self.requests
+
+    async def hedge(self, send, limiter):
+        await limiter.acquire()
+        return await send()
+
+    async def send(self, send, limiter):
+        """ Result of send(), the coroutine function sending the request,
+            or of its hedge if that answers first.  The limiter paces the
+            hedge like any other request.
+        """
+        self.requests += 1
+        started = time.monotonic()
+        if self.budget <= 0:
+            result = await send()
+            self.record(time.monotonic() - started)
+            return result
+
+        tasks = [asyncio.ensure_future(send())]
+        try:
+            if self.hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+                if not done and self.can_hedge():
+                    self.hedges += 1
+                    tasks.append(asyncio.ensure_future(
+                        self.hedge(send, limiter)))
+
+            # First success wins, an error only once every copy failed
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.hedge_wins += 1
+                        self.record(time.monotonic() - started)
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def summary(self):
+        return {'budget': self.budget,
+                'requests': self.requests,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'hedge_delay_ms': round(self.hedge_delay * 1000, 1)
+                                  if self.hedge_delay is not None else None}
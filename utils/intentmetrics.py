@@ -20,7 +20,8 @@ import csv
 import pandas as pd
 from argparse import ArgumentParser
 from sklearn.metrics import precision_recall_fscore_support
-from __init__ import UTF_8
+from __init__ import UTF_8, SCORE_COLUMN, read_partial_credit_table, \
+    score_partial_credit
 
 # For treemap
 import matplotlib
@@ -28,15 +29,28 @@ import matplotlib.pyplot as plt
 from  matplotlib.colors import LinearSegmentedColormap
 import squarify
 
-def func(args):
-    in_df = pd.read_csv(args.in_file, quoting=csv.QUOTE_ALL,
-                        encoding=UTF_8, keep_default_na=False)
+def func(args, in_df=None):
+    """ Write the metrics of the test output in args.in_file, or of in_df
+        when the caller already has it in memory
+    """
+    if in_df is None:
+        in_df = pd.read_csv(args.in_file, quoting=csv.QUOTE_ALL,
+                            encoding=UTF_8, keep_default_na=False)
+    else:
+        in_df = in_df.copy()
     # Look for target columns
     if args.test_column not in in_df or args.golden_column not in in_df:
         raise ValueError('Missing required columns')
 
     labels = in_df[args.golden_column].drop_duplicates().sort_values()
 
+    # Score from a partial credit table rather than the test output
+    if args.partial_credit_table is not None:
+        in_df[SCORE_COLUMN] = score_partial_credit(
+            in_df[args.golden_column], in_df[args.test_column],
+            read_partial_credit_table(args.partial_credit_table))
+        args.partial_credit_on = str(True)
+
     prfs_args = {}
     prfs_args['y_true'] = in_df[args.golden_column]
     prfs_args['y_pred'] = in_df[args.test_column]
@@ -51,7 +65,8 @@ def func(args):
         precision_recall_fscore_support(**prfs_args)
 
     # scikit learn doesn't give number of predictions
-    num_predictions = [(in_df[args.test_column] == label).sum() for label in labels]
+    num_predictions = in_df[args.test_column].value_counts() \
+                          .reindex(labels, fill_value=0).values
 
     #Raw accuracy as well
     in_df['correct'] = (in_df[args.golden_column] == in_df[args.test_column])
@@ -66,23 +81,19 @@ def func(args):
         accuracy = format(num_correct/samples, '.2f')
 
     if args.partial_credit_on is not None:
-        for idx, label in enumerate(labels):
-            retrieved_doc_indx = in_df[args.test_column] == label
-            relevant_doc_indx = in_df[args.golden_column] == label
-            retrieved_doc_num = len(in_df[retrieved_doc_indx])
-            relevant_doc_num  = len(in_df[relevant_doc_indx])
-
-            # precision and recall are 0 if retrieved and revelvant doc numbers are 0
-            precision = in_df[retrieved_doc_indx]['score'].sum() / retrieved_doc_num if retrieved_doc_num != 0 else 0
-            recall = in_df[relevant_doc_indx]['score'].sum()/ relevant_doc_num if relevant_doc_num != 0 else 0
-
-            precisions[idx] = precision
-            recalls[idx] = recall
-            fscores[idx] = 0
-            
-            # handling edge case where precision and recall are 0. Avoids DivideByZeroError
-            if precision != 0.0 and recall != 0.0:
-                fscores[idx] = (2 * precision * recall) / (precision + recall)
+        scores = in_df[SCORE_COLUMN].astype(float)
+        # Per label score sums and counts, over predictions and golden labels.
+        # Precision and recall are 0 if there are no retrieved/relevant docs
+        retrieved = scores.groupby(in_df[args.test_column]) \
+                          .agg(['sum', 'count']).reindex(labels)
+        relevant = scores.groupby(in_df[args.golden_column]) \
+                         .agg(['sum', 'count']).reindex(labels)
+        precisions = (retrieved['sum'] / retrieved['count']).fillna(0).values
+        recalls = (relevant['sum'] / relevant['count']).fillna(0).values
+
+        # 0/0 when precision and recall are both 0 is an f-score of 0
+        fscores = pd.Series(2 * precisions * recalls) \
+                    .div(precisions + recalls).fillna(0).values
 
     out_df = pd.DataFrame(data={'intent': labels,
                                 'recall': recalls,
@@ -128,6 +139,7 @@ def generateTreemap(base_out_file, out_df):
     cmap=LinearSegmentedColormap.from_list('rg',["r", "w", "g"], N=256)
 
     colors = [cmap(value) for value in out_df['f-score']]
+    plt.figure()
     treemap = squarify.plot(sizes=out_df['number of samples'],
                             label=out_df['intent'],
                             color=colors, alpha=.8,
@@ -152,6 +164,7 @@ def generateTreemap(base_out_file, out_df):
 
     metrics_file = base_out_file[:-4] + ".png"
     plt.savefig(metrics_file,bbox_inches='tight',dpi=400)
+    plt.close()
     print ("Wrote intent metrics tree map image to {}.".format(metrics_file))
 
 def create_parser():
@@ -170,6 +183,9 @@ def create_parser():
                         help='Golden column name')
     parser.add_argument('-p', '--partial_credit_on', type=str,
                         help='Use only if partial credit scoring ')
+    parser.add_argument('-c', '--partial_credit_table', type=str,
+                        help='Score with this partial credit table instead '
+                             'of the test output score column')
     return parser
 
 
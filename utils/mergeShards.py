@@ -0,0 +1,73 @@
+#! /usr/bin/python
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Merge the outputs of a sharded test back into one test output
+"""
+import csv
+import pandas as pd
+from argparse import ArgumentParser
+from sharding import ROW_ID_COLUMN
+from __init__ import UTF_8, save_dataframe_as_csv
+
+
+def func(args):
+    shard_dfs = []
+    for file in args.in_files:
+        shard_df = pd.read_csv(file, quoting=csv.QUOTE_ALL, encoding=UTF_8,
+                               keep_default_na=False)
+        if ROW_ID_COLUMN not in shard_df:
+            raise ValueError(
+                "{} has no '{}' column, is it a shard output?".format(
+                    file, ROW_ID_COLUMN))
+        shard_dfs.append(shard_df)
+    out_df = pd.concat(shard_dfs, ignore_index=True)
+
+    row_ids = out_df[ROW_ID_COLUMN]
+    duplicates = row_ids[row_ids.duplicated()].unique()
+    if len(duplicates) != 0:
+        raise ValueError("{} rows appear in more than one shard output, "
+                         "e.g. row ids {}".format(len(duplicates),
+                                                  list(duplicates[:10])))
+
+    rows = args.rows if args.rows is not None else row_ids.max() + 1
+    missing = pd.Index(range(rows)).difference(row_ids)
+    if len(missing) != 0:
+        raise ValueError("{} rows are missing from the shard outputs, "
+                         "e.g. row ids {}".format(len(missing),
+                                                  list(missing[:10])))
+
+    out_df = out_df.sort_values(ROW_ID_COLUMN, kind='stable') \
+                   .drop(columns=[ROW_ID_COLUMN])
+    save_dataframe_as_csv(df=out_df, file=args.out_file)
+    print("Merged {} rows from {} shards into {}".format(
+        len(out_df), len(shard_dfs), args.out_file))
+
+
+def create_parser():
+    parser = ArgumentParser(
+        description='Merge sharded test outputs in original row order')
+    parser.add_argument('-i', '--in_files', type=str, nargs='+',
+                        required=True, help='Shard output files')
+    parser.add_argument('-o', '--out_file', type=str, required=True,
+                        help='Merged output file path')
+    parser.add_argument('-n', '--rows', type=int,
+                        help='Number of rows in the test input, to detect missing trailing rows')
+    return parser
+
+
+if __name__ == '__main__':
+    ARGS = create_parser().parse_args()
+    func(ARGS)
@@ -0,0 +1,126 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Per-request latency, status and retry instrumentation of test runs
+"""
+import json
+import os
+import time
+from collections import Counter
+import numpy as np
+
+PERF_FILE_SUFFIX = '.perf.json'
+SUCCESS_STATUS = 200
+BUCKET_SECONDS = 1.0
+PERCENTILES = [50, 95, 99]
+
+
+def perf_file(outfile):
+    """ Performance summary written next to the test output
+    """
+    return os.path.splitext(outfile)[0] + PERF_FILE_SUFFIX
+
+
+class PerfRecorder:
+    """ Records every request attempt as (start, latency, status, retry).
+        Times are seconds since the recorder was created.
+    """
+    def __init__(self, bucket_seconds=BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self.t0 = time.monotonic()
+        self.starts = []
+        self.latencies = []
+        self.statuses = []
+        self.retries = []
+        # Attempts sent, recorded or not, and the first attempts of them
+        self.attempts_sent = 0
+        self.calls_sent = 0
+
+    def now(self):
+        return time.monotonic() - self.t0
+
+    def start(self, retry):
+        """ now(), counting an attempt as sent.  An attempt cancelled in
+            flight is sent but never recorded
+        """
+        self.attempts_sent += 1
+        self.calls_sent += int(retry == 0)
+        return self.now()
+
+    def record(self, start, status, retry):
+        """ Record an attempt started at start (from now()) that ended now.
+            retry is 0 for the first attempt of a call.
+        """
+        self.starts.append(start)
+        self.latencies.append(self.now() - start)
+        self.statuses.append(str(status))
+        self.retries.append(retry)
+
+    def summary(self):
+        starts = np.array(self.starts)
+        latencies = np.array(self.latencies)
+        ends = starts + latencies
+        attempts = len(latencies)
+        duration = float(ends.max() - starts.min()) if attempts else 0.0
+        statuses = Counter(self.statuses)
+        summary = {
+            'attempts': attempts,
+            'calls': self.retries.count(0),
+            'retries': attempts - self.retries.count(0),
+            'duration_seconds': round(duration, 3),
+            'requests_per_second':
+                round(attempts / duration, 3) if duration else 0.0,
+            'status_codes': dict(statuses),
+            'errors': {status: count for status, count in statuses.items()
+                       if status != str(SUCCESS_STATUS)},
+            'latency_ms': {},
+            'throughput': []
+        }
+        if attempts:
+            summary['latency_ms'] = {
+                'mean': round(float(latencies.mean()) * 1000, 1),
+                'max': round(float(latencies.max()) * 1000, 1)}
+            for p, value in zip(PERCENTILES,
+                                np.percentile(latencies, PERCENTILES)):
+                summary['latency_ms']['p{}'.format(p)] = \
+                    round(float(value) * 1000, 1)
+
+            # Completed requests and errors per time bucket
+            buckets = (ends // self.bucket_seconds).astype(int)
+            errors = np.array(self.statuses) != str(SUCCESS_STATUS)
+            completed = np.bincount(buckets)
+            failed = np.bincount(buckets, weights=errors,
+                                 minlength=len(completed))
+            summary['throughput'] = [
+                {'second': round(idx * self.bucket_seconds, 3),
+                 'requests': int(completed[idx]),
+                 'errors': int(failed[idx])}
+                for idx in range(len(completed))]
+        return summary
+
+    def save(self, file, extra=None):
+        """ Write the summary, with the extra sections if any
+        """
+        summary = self.summary()
+        summary.update(extra or {})
+        with open(file, 'w') as f:
+            json.dump(summary, f, indent=4)
+        print("{} requests in {}s ({} requests/sec), latency ms {}, "
+              "errors {}".format(summary['attempts'],
+                                 summary['duration_seconds'],
+                                 summary['requests_per_second'],
+                                 summary['latency_ms'], summary['errors']))
+        print("Wrote performance summary to {}".format(file))
@@ -0,0 +1,87 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Requests-per-second limiter shared by every in-flight test request
+"""
+import asyncio
+import time
+
+MIN_RATE = 0.5
+DECREASE_FACTOR = 0.5
+ADDITIVE_INCREASE = 1.0
+DECREASE_COOLDOWN = 1.0
+THROTTLE_STATUS_CODES = [429]
+
+
+def is_throttle_status(code):
+    """ True for responses that mean the service is overloaded
+    """
+    return code is not None and \
+        (code in THROTTLE_STATUS_CODES or 500 <= code < 600)
+
+
+class RateLimiter:
+    """ Token bucket with additive-increase/multiplicative-decrease control.
+
+        Requests are spaced 1/rate seconds apart.  A throttled (429) or 5xx
+        response halves the current rate, at most once per DECREASE_COOLDOWN
+        seconds so one burst of failures only counts once.  Every success adds
+        ADDITIVE_INCREASE/rate, i.e. roughly one request per second for each
+        second of clean traffic, until max_rate is reached again.
+    """
+    def __init__(self, max_rate, min_rate=MIN_RATE,
+                 decrease_factor=DECREASE_FACTOR,
+                 additive_increase=ADDITIVE_INCREASE):
+        self.max_rate = float(max_rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.decrease_factor = decrease_factor
+        self.additive_increase = additive_increase
+        self.rate = self.max_rate
+        self.next_time = None
+        self.last_decrease = -DECREASE_COOLDOWN
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """ Wait for the next request slot
+        """
+        async with self.lock:
+            now = time.monotonic()
+            if self.next_time is None or self.next_time < now:
+                self.next_time = now
+            wait = self.next_time - now
+            self.next_time += 1.0 / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        self.rate = min(self.max_rate,
+                        self.rate + self.additive_increase / self.rate)
+
+    def on_throttle(self):
+        now = time.monotonic()
+        if now - self.last_decrease < DECREASE_COOLDOWN:
+            return
+        self.last_decrease = now
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        print("Throttled, reducing request rate to {:.2f}/sec".format(self.rate))
+
+    def on_response(self, code):
+        """ Adjust the rate for an HTTP status code
+        """
+        if is_throttle_status(code):
+            self.on_throttle()
+        elif code is not None and code < 400:
+            self.on_success()
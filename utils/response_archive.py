@@ -0,0 +1,128 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Gzip compressed JSONL archive of raw service responses
+
+    Schema, one JSON object per line:
+    | {"workspace_id": ..., "apiversion": ..., "rows": ...}       (header)
+    | {"rows": [row indices], "utterance": ..., "response": ...} (one per sent utterance)
+
+    Row indices are positions in the test output CSV written next to the
+    archive, so archived responses can be joined back to golden intents.
+"""
+import gzip
+import json
+import os
+import zlib
+
+ARCHIVE_FILE_SUFFIX = '.responses.jsonl.gz'
+ROWS_KEY = 'rows'
+UTTERANCE_KEY = 'utterance'
+RESPONSE_KEY = 'response'
+
+
+def archive_file(outfile):
+    """ Response archive written next to the test output
+    """
+    return os.path.splitext(outfile)[0] + ARCHIVE_FILE_SUFFIX
+
+
+def response_intents(response):
+    """ Ranked [(intent, confidence)] of a v1, v2 or NLU classify response
+    """
+    if 'intents' in response:
+        intents = response['intents']
+    elif 'output' in response and 'intents' in response['output']:
+        intents = response['output']['intents']
+    else:
+        return [(c['class_name'], c['confidence'])
+                for c in response.get('classifications', [])]
+    return [(i['intent'], i['confidence']) for i in intents]
+
+
+def read_header(file):
+    try:
+        with gzip.open(file, 'rt', encoding='utf-8') as f:
+            return json.loads(f.readline())
+    except (OSError, EOFError, ValueError):
+        return None
+
+
+def read_records(file):
+    """ Return (header, [record]) of an archive, as far as it can be read
+    """
+    records = []
+    with gzip.open(file, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        try:
+            for line in f:
+                records.append(json.loads(line))
+        except (EOFError, zlib.error, ValueError) as e:
+            # Archive of a killed process, keep what was written
+            print("Archive {} is truncated ({}), read {} records".format(
+                file, e, len(records)))
+    return header, records
+
+
+def read_archive(file):
+    """ Return (header, {row index: response}) of an archive.  Rows of a
+        resumed test may appear twice, the last response wins.
+    """
+    header, records = read_records(file)
+    responses = {}
+    for record in records:
+        for row_idx in record[ROWS_KEY]:
+            responses[row_idx] = record[RESPONSE_KEY]
+    return header, responses
+
+
+class ResponseArchive:
+    """ Responses are compressed as they are written.  A resumed test
+        continues the archive of the same test.
+    """
+    def __init__(self, file, header):
+        self.file = file
+        self.header = header
+        self.f = None
+        # Row indices archived by the run resumed
+        self.rows = set()
+
+    def open(self, resume=False):
+        records = []
+        if resume and read_header(self.file) == self.header:
+            # A killed run leaves an unfinished gzip member that nothing
+            # appended after it could be read past, so the archive is
+            # rewritten with what can be read of it
+            _, records = read_records(self.file)
+        self.f = gzip.open(self.file + '.tmp', 'wt', encoding='utf-8')
+        self.f.write(json.dumps(self.header) + '\n')
+        for record in records:
+            self.f.write(json.dumps(record) + '\n')
+            self.rows.update(record[ROWS_KEY])
+        self.f.close()
+        os.replace(self.file + '.tmp', self.file)
+        self.f = gzip.open(self.file, 'at', encoding='utf-8')
+
+    def write(self, row_indices, utterance, response):
+        self.f.write(json.dumps({ROWS_KEY: row_indices,
+                                 UTTERANCE_KEY: utterance,
+                                 RESPONSE_KEY: response}) + '\n')
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+            print("Wrote response archive to {}".format(self.file))
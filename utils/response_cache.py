@@ -0,0 +1,136 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Persistent cache of service responses
+
+    Responses are stored in SQLite, keyed by a hash of the model fingerprint,
+    the API version and the utterance as sent.  The fingerprint changes
+    whenever the trained model may answer differently, so a hit is always the
+    response the service would have returned.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+
+from __init__ import TRAINING_FINGERPRINT_KEY, LAST_USED_KEY
+
+# Workspace export keys that do not change classification
+VOLATILE_WORKSPACE_KEYS = ['workspace_id', 'name', 'description', 'created',
+                           'updated', 'status', 'status_errors', 'webhooks',
+                           'counts', 'pagination']
+# Workspace metadata keys of the reuse tags, the last used time changes
+# every time a workspace is reused
+VOLATILE_METADATA_KEYS = [TRAINING_FINGERPRINT_KEY, LAST_USED_KEY]
+CLASSIFIER_KEYS = ['model_id', 'model_version', 'version', 'created',
+                   'last_trained', 'last_deployed']
+COMMIT_INTERVAL = 100
+
+# (file, thread) -> [connection, number of open caches using it]
+_connections = {}
+
+
+def hash_json(value):
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def workspace_fingerprint(workspace):
+    """ Fingerprint of an exported v1 workspace, ignoring metadata that
+        does not affect its responses
+    """
+    workspace = {k: v for (k, v) in workspace.items()
+                 if k not in VOLATILE_WORKSPACE_KEYS}
+    if 'metadata' in workspace:
+        workspace['metadata'] = {k: v for (k, v)
+                                 in workspace['metadata'].items()
+                                 if k not in VOLATILE_METADATA_KEYS}
+    return hash_json(workspace)
+
+
+def classifier_fingerprint(model):
+    """ Fingerprint of an NLU classifications model: its id and version
+    """
+    return hash_json({k: model[k] for k in CLASSIFIER_KEYS if k in model})
+
+
+def connect(file):
+    """ SQLite connection shared by every cache on the same file in this
+        thread, so caches of several workspaces never lock each other out.
+        SQLite connections cannot be used from another thread, so the
+        in-process k-fold threads each open their own
+    """
+    key = (file, threading.get_ident())
+    if key not in _connections:
+        db = sqlite3.connect(file, timeout=60)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('CREATE TABLE IF NOT EXISTS responses '
+                   '(key TEXT PRIMARY KEY, response TEXT NOT NULL)')
+        db.commit()
+        _connections[key] = [db, 0]
+    _connections[key][1] += 1
+    return key, _connections[key][0]
+
+
+def disconnect(key):
+    _connections[key][0].commit()
+    _connections[key][1] -= 1
+    if _connections[key][1] == 0:
+        _connections.pop(key)[0].close()
+
+
+class ResponseCache:
+    """ SQLite-backed response cache with hit/miss statistics.
+        Safe to share between the fold processes of one k-fold run, and
+        between the workspaces tested by one process.
+    """
+    def __init__(self, file, fingerprint, api_version):
+        self.file = file
+        self.prefix = '{}\0{}\0'.format(fingerprint, api_version)
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+        self.connection, self.db = connect(file)
+
+    def key(self, utterance):
+        return hashlib.sha256(
+            (self.prefix + utterance).encode('utf-8')).hexdigest()
+
+    def get(self, utterance):
+        row = self.db.execute('SELECT response FROM responses WHERE key = ?',
+                              (self.key(utterance),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, utterance, response):
+        self.db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?)',
+                        (self.key(utterance), json.dumps(response)))
+        self.pending += 1
+        if self.pending >= COMMIT_INTERVAL:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        disconnect(self.connection)
+
+    def print_stats(self):
+        lookups = self.hits + self.misses
+        print("Response cache {}: {} hits, {} misses ({:.1f}% hit rate)".format(
+            self.file, self.hits, self.misses,
+            100.0 * self.hits / lookups if lookups else 0))
@@ -0,0 +1,107 @@
+#! /usr/bin/python
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+""" Generate top-k intent metrics from an archive of raw test responses,
+    without calling the service again
+"""
+import csv
+import pandas as pd
+from argparse import ArgumentParser
+from response_archive import read_archive, response_intents, archive_file
+from __init__ import UTF_8, GOLDEN_INTENT_COLUMN, save_dataframe_as_csv
+
+RANK_COLUMN = 'golden intent rank'
+
+
+def golden_ranks(golden_intents, responses):
+    """ 1-based rank of the golden intent among the returned intents,
+        0 if it was not returned at all.  golden_intents is indexed by
+        test output row
+    """
+    ranks = []
+    for row_idx, golden_intent in golden_intents.items():
+        intents = [intent for intent, _ in
+                   response_intents(responses[row_idx])]
+        ranks.append(intents.index(golden_intent) + 1
+                     if golden_intent in intents else 0)
+    return pd.Series(ranks, index=golden_intents.index)
+
+
+def func(args):
+    in_df = pd.read_csv(args.in_file, quoting=csv.QUOTE_ALL,
+                        encoding=UTF_8, keep_default_na=False)
+    if args.golden_column not in in_df:
+        raise ValueError('Missing required columns')
+
+    archive = args.archive_file or archive_file(args.in_file)
+    _, responses = read_archive(archive)
+    missing = [row_idx for row_idx in range(len(in_df))
+               if row_idx not in responses]
+    if missing:
+        print("{} rows have no archived response and are skipped".format(
+            len(missing)))
+        in_df = in_df.drop(index=missing)
+
+    ranks = golden_ranks(in_df[args.golden_column], responses)
+    samples = len(ranks)
+
+    out_df = pd.DataFrame({'k': range(1, args.top_k + 1)})
+    out_df['correct'] = [((ranks > 0) & (ranks <= k)).sum()
+                         for k in out_df['k']]
+    out_df['total'] = samples
+    out_df['top-k accuracy'] = \
+        (out_df['correct'] / samples).round(4) if samples else 0
+    save_dataframe_as_csv(df=out_df, file=args.out_file)
+    print("Wrote top-k metrics output to {}.".format(args.out_file))
+
+    # Mean reciprocal rank, a golden intent that is not returned counts 0
+    mrr = (1 / ranks[ranks > 0]).sum() / samples if samples else 0
+    print("Top-1 accuracy {:.4f}, top-{} accuracy {:.4f}, "
+          "mean reciprocal rank {:.4f} over {} archived responses.".format(
+              out_df['top-k accuracy'].iloc[0], args.top_k,
+              out_df['top-k accuracy'].iloc[-1], mrr, samples))
+
+    if args.rank_file is not None:
+        rank_df = in_df.copy()
+        rank_df[RANK_COLUMN] = ranks
+        save_dataframe_as_csv(df=rank_df, file=args.rank_file)
+        print("Wrote per utterance golden intent ranks to {}.".format(
+            args.rank_file))
+
+
+def create_parser():
+    parser = ArgumentParser(
+        description='Generate top-k intent metrics from archived responses')
+    parser.add_argument('-i', '--in_file', type=str, required=True,
+                        help='Test output file the archive was written for')
+    parser.add_argument('-a', '--archive_file', type=str,
+                        help='Response archive, defaults to the one next to the test output')
+    parser.add_argument('-o', '--out_file', type=str,
+                        help='Output file path',
+                        default='topk-metrics.csv')
+    parser.add_argument('-g', '--golden_column', type=str,
+                        default=GOLDEN_INTENT_COLUMN,
+                        help='Golden column name')
+    parser.add_argument('-k', '--top_k', type=int, default=5,
+                        help='Largest k to report accuracy for')
+    parser.add_argument('--rank_file', type=str,
+                        help='Also write the test output with the rank of each golden intent')
+    return parser
+
+
+if __name__ == '__main__':
+    ARGS = create_parser().parse_args()
+    func(ARGS)
@@ -0,0 +1,131 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Error-class aware retry policy for test requests
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+DEFAULT_MAX_RETRIES = 5
+BASE_DELAY = 0.5
+MAX_DELAY = 60.0
+# 4xx responses worth retrying, every other 4xx is an auth/validation error
+RETRYABLE_CLIENT_STATUS_CODES = [408, 409, 425, 429]
+NETWORK_ERROR_KEY = 'network'
+RETRIES_FILE_SUFFIX = '.retries.json'
+
+
+def status_code(exception):
+    """ HTTP status code carried by an SDK or aiohttp client exception
+    """
+    return getattr(exception, 'code', None)
+
+
+def is_network_error(exception):
+    """ Connection error or timeout, without a response
+    """
+    return isinstance(exception, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+def response_headers(exception):
+    """ Response headers of an SDK (http_response) or async client exception
+    """
+    headers = getattr(exception, 'headers', None)
+    if headers is None and getattr(exception, 'http_response', None) is not None:
+        headers = exception.http_response.headers
+    return headers or {}
+
+
+def parse_retry_after(value):
+    """ Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retries_file(outfile):
+    """ Retry counter file written next to the test output
+    """
+    return os.path.splitext(outfile)[0] + RETRIES_FILE_SUFFIX
+
+
+class RetryPolicy:
+    """ Exponential backoff with full jitter, honoring Retry-After.
+
+        Connection errors, timeouts, 429 and 5xx responses are retried up to
+        max_retries times.  Other 4xx responses (bad credentials, unknown
+        workspace, invalid request) fail immediately since retrying cannot fix
+        them, and so does any other exception, which is a bug rather than a
+        service error.  Retries are counted per status code for the run
+        report.
+    """
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base_delay=BASE_DELAY,
+                 max_delay=MAX_DELAY):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = Counter()
+        self.failures = Counter()
+
+    def is_retryable(self, exception):
+        code = status_code(exception)
+        if code is None:
+            return is_network_error(exception)
+        return code in RETRYABLE_CLIENT_STATUS_CODES or code >= 500
+
+    def should_retry(self, exception, attempt):
+        """ Decide whether the attempt-th retry may be sent, and count it
+        """
+        key = str(status_code(exception) or
+                  (NETWORK_ERROR_KEY if is_network_error(exception)
+                   else type(exception).__name__))
+        if attempt >= self.max_retries or not self.is_retryable(exception):
+            self.failures[key] += 1
+            return False
+        self.retries[key] += 1
+        return True
+
+    def backoff(self, exception, attempt):
+        """ Seconds to wait before retry number attempt (1-based)
+        """
+        retry_after = parse_retry_after(
+            response_headers(exception).get('Retry-After'))
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def save(self, file):
+        with open(file, 'w') as f:
+            json.dump({'retries': dict(self.retries),
+                       'total_retries': sum(self.retries.values()),
+                       'failures': dict(self.failures)}, f, indent=4)
+        print("Wrote retry counts to {}".format(file))
@@ -0,0 +1,172 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Sequential sampling of a test set to estimate accuracy early
+
+    Utterances are tested in a random order stratified by golden intent, so
+    every prefix of the order is a proportional sample of the test set.
+    Duplicate rows share one response, so each distinct utterance is one
+    sample.  The
+    running accuracy carries a Wilson interval, narrowed by the finite
+    population correction since rows are drawn without replacement, and the
+    test stops once the interval is within the target margin.
+"""
+import json
+import math
+import os
+import random
+from collections import Counter
+from statistics import NormalDist
+
+DEFAULT_CONFIDENCE_LEVEL = 0.95
+# Smallest sample an interval is trusted on
+MIN_SAMPLES = 30
+SAMPLING_FILE_SUFFIX = '.sampling.json'
+
+
+def sampling_file(outfile):
+    """ Sampling report written next to the test output
+    """
+    return os.path.splitext(outfile)[0] + SAMPLING_FILE_SUFFIX
+
+
+def stratified_order(golden, seed=0):
+    """ Samples of golden, {sample: golden intent}, in random order with
+        every golden intent spread evenly through the order in proportion
+        to its count
+    """
+    rng = random.Random(seed)
+    samples_by_intent = {}
+    for sample, intent in golden.items():
+        samples_by_intent.setdefault(intent, []).append(sample)
+    keys = {}
+    for samples in samples_by_intent.values():
+        rng.shuffle(samples)
+        for rank, sample in enumerate(samples):
+            keys[sample] = (rank + rng.random()) / len(samples)
+    return sorted(keys, key=keys.get)
+
+
+def wilson_interval(correct, total, z, population=None):
+    """ (lower, upper) bound of the accuracy of total samples out of
+        population rows, correct of them right
+    """
+    if total == 0:
+        return 0.0, 1.0
+    p = correct / total
+    if population is not None and population > 1:
+        if total >= population:
+            return p, p
+        # Sampling without replacement has the variance of a larger sample
+        total = total * (population - 1) / (population - total)
+    denominator = 1 + z * z / total
+    center = (p + z * z / (2 * total)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / total
+                           + z * z / (4 * total * total)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+class AccuracySampler:
+    """ Running accuracy of the tested samples, overall and per golden
+        intent.  golden is {sample: golden intent}
+    """
+    def __init__(self, golden, margin,
+                 confidence_level=DEFAULT_CONFIDENCE_LEVEL, per_intent=False,
+                 min_samples=MIN_SAMPLES):
+        self.golden = golden
+        self.margin = margin
+        self.confidence_level = confidence_level
+        self.z = NormalDist().inv_cdf(0.5 + confidence_level / 2)
+        self.per_intent = per_intent
+        self.min_samples = min_samples
+        self.population = Counter(golden)
+        self.tested = Counter()
+        self.correct = Counter()
+        self.added = set()
+
+    def add(self, sample, predicted):
+        """ Add the prediction of a sample, once
+        """
+        if sample in self.added:
+            return
+        self.added.add(sample)
+        intent = self.golden[sample]
+        self.tested[intent] += 1
+        self.correct[intent] += int(predicted == intent)
+
+    def interval(self, intent=None):
+        if intent is None:
+            return wilson_interval(sum(self.correct.values()),
+                                   sum(self.tested.values()), self.z,
+                                   len(self.golden))
+        return wilson_interval(self.correct[intent], self.tested[intent],
+                               self.z, self.population[intent])
+
+    def within_margin(self, intent=None):
+        lower, upper = self.interval(intent)
+        return (upper - lower) / 2 <= self.margin
+
+    def done(self):
+        """ Whether the target margin is reached, or every sample is tested
+        """
+        tested = sum(self.tested.values())
+        if tested == len(self.golden):
+            return True
+        if tested < self.min_samples or not self.within_margin():
+            return False
+        return not self.per_intent or \
+            all(self.within_margin(intent) for intent in self.population)
+
+    def estimate(self, intent=None):
+        if intent is None:
+            correct, tested = sum(self.correct.values()), \
+                              sum(self.tested.values())
+        else:
+            correct, tested = self.correct[intent], self.tested[intent]
+        lower, upper = self.interval(intent)
+        return {'accuracy': correct / tested if tested else None,
+                'lower': lower, 'upper': upper,
+                'tested': tested}
+
+    def summary(self, rows_tested, rows_total, calls_made, calls_saved):
+        summary = {'confidence_level': self.confidence_level,
+                   'target_margin': self.margin,
+                   'utterances_tested': sum(self.tested.values()),
+                   'utterances_total': len(self.golden),
+                   'rows_tested': rows_tested,
+                   'rows_total': rows_total,
+                   'calls_made': calls_made,
+                   'calls_saved': calls_saved}
+        summary.update(self.estimate())
+        if self.per_intent:
+            summary['intents'] = {intent: self.estimate(intent)
+                                  for intent in sorted(self.population)}
+        return summary
+
+    def save(self, file, rows_tested, rows_total, calls_made, calls_saved):
+        """ Write the summary.  calls_made counts the requests sent, retries
+            and hedges included, and calls_saved the utterances never sent
+        """
+        summary = self.summary(rows_tested, rows_total, calls_made,
+                               calls_saved)
+        with open(file, 'w') as f:
+            json.dump(summary, f, indent=4)
+        print("Accuracy {:.4f} ({:.4f}-{:.4f}) from {} of {} rows, "
+              "{} calls saved".format(
+                  summary['accuracy'] or 0, summary['lower'],
+                  summary['upper'], summary['rows_tested'],
+                  summary['rows_total'], summary['calls_saved']))
+        print("Wrote sampling report to {}".format(file))
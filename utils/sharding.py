@@ -0,0 +1,62 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Deterministic split of a test input into shards tested separately
+
+    A row belongs to shard hash(row id) mod N, where the row id is its
+    position in the test input.  Every machine computes the same split
+    without coordination, and shard outputs carry the row id so
+    mergeShards.py can restore the original order.
+"""
+import hashlib
+from argparse import ArgumentTypeError
+
+ROW_ID_COLUMN = 'row id'
+
+
+def parse_shard(value):
+    """ argparse type of 'i/N', the i-th of N shards counting from 1
+    """
+    try:
+        index, count = [int(part) for part in value.split('/')]
+    except ValueError:
+        raise ArgumentTypeError(
+            "Shard '{}' is not of the form i/N".format(value))
+    if count < 1 or not 1 <= index <= count:
+        raise ArgumentTypeError(
+            "Shard '{}' is not between 1/N and N/N".format(value))
+    return index, count
+
+
+def shard_of(row_id, count):
+    """ 1-based shard of a row id
+    """
+    digest = hashlib.md5(str(row_id).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+
+def select_shard(df, shard, row_offset=0):
+    """ Rows of df in the shard, re-indexed from 0 and with their
+        original position in ROW_ID_COLUMN.  row_offset is the position
+        of the first row of df in the test input.
+    """
+    index, count = shard
+    row_ids = [row_id for row_id in range(row_offset, row_offset + len(df))
+               if shard_of(row_id, count) == index]
+    selected = df.iloc[[row_id - row_offset for row_id in row_ids]] \
+                 .reset_index(drop=True)
+    selected[ROW_ID_COLUMN] = row_ids
+    return selected
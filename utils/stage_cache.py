@@ -0,0 +1,115 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Content-addressed cache of the run.py pipeline stages
+
+    A stage is keyed by a hash of its parameters and of the content of its
+    input files.  Once it succeeds the key is recorded in a manifest in the
+    output directory, with the hashes of the files the stage wrote.  Stages
+    depend on each other through those files, so the stages form a DAG and
+    a changed file re-runs only the stages downstream of it.  A stage whose
+    key is unchanged and whose outputs are still as it wrote them is
+    skipped, which also makes an interrupted run continue at the first
+    stage that did not complete.
+"""
+import hashlib
+import json
+import os
+import threading
+
+MANIFEST_FILENAME = '.stages.json'
+BLOCK_SIZE = 1 << 20
+
+
+def file_digest(path):
+    """ sha256 of the file content, None if there is no such file
+    """
+    if not os.path.isfile(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stage_key(inputs, params):
+    """ Hash of the stage parameters and its input files' content
+    """
+    digest = hashlib.sha256(
+        json.dumps(params, sort_keys=True, default=str).encode())
+    for path in inputs:
+        digest.update('\0{}\0{}'.format(path, file_digest(path)).encode())
+    return digest.hexdigest()
+
+
+class StageCache:
+    """ Manifest of the stages completed in out_dir.  Without out_dir the
+        cache is off and every stage runs.  The k-fold stages run in
+        threads, so the manifest is only read and written under a lock
+    """
+    def __init__(self, out_dir=None):
+        self.file = None
+        self.stages = {}
+        self.lock = threading.Lock()
+        if out_dir is None:
+            return
+        self.file = os.path.join(out_dir, MANIFEST_FILENAME)
+        if os.path.exists(self.file):
+            with open(self.file) as f:
+                self.stages = json.load(f)
+
+    def fresh(self, name, key, outputs):
+        """ Whether stage name completed with this key, and its outputs are
+            unchanged since
+        """
+        with self.lock:
+            entry = self.stages.get(name)
+        return entry is not None and entry['key'] == key and \
+            set(entry['outputs']) == set(outputs) and \
+            all(file_digest(path) == digest
+                for path, digest in entry['outputs'].items())
+
+    def record(self, name, key, outputs):
+        if self.file is None:
+            return
+        entry = {'key': key,
+                 'outputs': {path: file_digest(path) for path in outputs}}
+        tmp_file = '{}.{}.tmp'.format(self.file, threading.get_ident())
+        with self.lock:
+            self.stages[name] = entry
+            with open(tmp_file, 'w') as f:
+                json.dump(self.stages, f, indent=4)
+            os.replace(tmp_file, self.file)
+
+    def run(self, name, action, inputs=(), outputs=(), params=None,
+            cacheable=True, valid=None):
+        """ Exit code of action(), or 0 without calling it when the stage is
+            fresh.  A stage is not cacheable when it depends on something
+            the key cannot see, like the state of a remote service.  valid()
+            checks such a state of a fresh stage, False runs it again
+        """
+        key = stage_key(inputs, params or {})
+        if cacheable and self.fresh(name, key, outputs) and \
+                (valid is None or valid()):
+            print("Stage '{}' is up to date".format(name))
+            return 0
+        with self.lock:
+            self.stages.pop(name, None)
+        code = action()
+        if code == 0 and cacheable:
+            self.record(name, key, outputs)
+        return code
@@ -0,0 +1,188 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Service adapters of the test runner
+
+    A backend sends one utterance over the shared AsyncAssistantClient,
+    maps the response to test output columns and fingerprints the tested
+    model for the response cache (None when the model cannot be
+    fingerprinted).  Its name labels the cache and archive.
+
+    In lean mode, v2 is asked explicitly for no debug output and no
+    context in its responses.  Alternate intents are always asked for: with
+    the top intent only, a response below the irrelevance threshold comes
+    back without intents.  v1 has no request option that trims its
+    responses.
+"""
+from ibm_watson import AssistantV1, NaturalLanguageUnderstandingV1
+from response_cache import workspace_fingerprint, classifier_fingerprint
+
+from __init__ import CONFIDENCE_COLUMN, PREDICTED_INTENT_COLUMN, \
+    DETECTED_ENTITY_COLUMN, DIALOG_RESPONSE_COLUMN, marshall_entity, \
+    get_service_client
+
+NLU_VERSION = '2022-04-07'
+NLU_LANGUAGE = 'en'
+
+
+def message_context():
+    # Include user_id in request body for Plus and Premium plans
+    return {'metadata': {'user_id': 'test'}}
+
+
+def parse_assistant_response(resp):
+    """ Test output columns of a v1 or v2 message response
+    """
+    columns = {}
+    intents = []
+    if 'intents' in resp:
+        intents = resp['intents']
+    if 'output' in resp and 'intents' in resp['output']:
+        intents = resp['output']['intents']
+
+    if len(intents) != 0:
+        columns[PREDICTED_INTENT_COLUMN] = intents[0]['intent']
+        columns[CONFIDENCE_COLUMN] = intents[0]['confidence']
+
+    if 'entities' in resp:
+        columns[DETECTED_ENTITY_COLUMN] = marshall_entity(resp['entities'])
+    if 'output' in resp and 'entities' in resp['output']:
+        columns[DETECTED_ENTITY_COLUMN] = \
+            marshall_entity(resp['output']['entities'])
+
+    response_text = ''
+    response_text_list = []
+    if 'text' in resp['output']:
+        response_text_list = resp['output']['text']
+    elif 'generic' in resp['output'] and len(resp['output']['generic']) != 0 and 'text' in resp['output']['generic'][0]:
+        response_text_list = [ resp['output']['generic'][0]['text'] ]
+    #Auto-disambiguation (suggestions)
+    elif 'generic' in resp['output'] and len(resp['output']['generic']) != 0 and 'title' in resp['output']['generic'][0]:
+        response_text_list = resp['output']['generic'][0]['title']
+        suggestions = resp['output']['generic'][0]['suggestions']
+        for suggestion in suggestions:
+            response_text_list += " " + suggestion ['label']
+
+    if len(response_text_list) != 0:
+        response_text_list = [text for text in response_text_list if type(text) == str]
+        response_text = ' '.join(response_text_list)
+
+    columns[DIALOG_RESPONSE_COLUMN] = response_text
+    return columns
+
+
+class AssistantV1Backend:
+    """ Watson Assistant v1 workspace message
+    """
+    name = 'v1'
+
+    def __init__(self, args):
+        self.args = args
+        self.version = args.version
+        self.lean = args.lean
+
+    async def send(self, client, workspace_id, utterance):
+        return await client.message(
+            workspace_id=workspace_id,
+            input={
+                'text': utterance,
+                'alternate_intents': True
+            },
+            context=message_context())
+
+    def parse(self, resp):
+        return parse_assistant_response(resp)
+
+    def fingerprint(self, authenticator, workspace_id):
+        """ Content of the exported workspace
+        """
+        conv = get_service_client(AssistantV1, authenticator, self.args.url,
+                                  self.version, self.args.disable_ssl)
+        workspace = conv.get_workspace(workspace_id=workspace_id,
+                                       export=True).get_result()
+        return workspace_fingerprint(workspace)
+
+
+class AssistantV2Backend(AssistantV1Backend):
+    """ Watson Assistant v2 stateless message to an assistant environment
+    """
+    name = 'v2'
+
+    async def send(self, client, workspace_id, utterance):
+        options = {'alternate_intents': True}
+        if self.lean:
+            options.update({'debug': False, 'return_context': False})
+        return await client.message_stateless(
+            assistant_id=workspace_id,
+            input={
+                'message_type': 'text',
+                'text': utterance,
+                'options': options
+            },
+            context=message_context())
+
+    def fingerprint(self, authenticator, workspace_id):
+        """ None, v2 environments cannot be exported so a redeployed
+            assistant could not be told apart and is never cached
+        """
+        return None
+
+
+class NLUBackend:
+    """ Natural Language Understanding classifications model
+    """
+    name = 'nlu'
+
+    def __init__(self, args):
+        self.args = args
+        self.version = NLU_VERSION
+        # Classifications cannot be trimmed
+        self.lean = False
+
+    async def send(self, client, workspace_id, utterance):
+        return await client.analyze(
+            features={'classifications': {'model': workspace_id}},
+            text=utterance,
+            language=NLU_LANGUAGE)
+
+    def parse(self, resp):
+        columns = {}
+        classes = resp['classifications']
+        if len(classes) != 0:
+            columns[PREDICTED_INTENT_COLUMN] = classes[0]['class_name']
+            columns[CONFIDENCE_COLUMN] = classes[0]['confidence']
+        return columns
+
+    def fingerprint(self, authenticator, workspace_id):
+        """ Id and version of the classifications model
+        """
+        nlu = get_service_client(NaturalLanguageUnderstandingV1,
+                                 authenticator, self.args.url, self.version,
+                                 self.args.disable_ssl)
+        model = nlu.get_classifications_model(
+            model_id=workspace_id).get_result()
+        return classifier_fingerprint(model)
+
+
+def assistant_backend(args):
+    """ Backend of the Assistant API version chosen with -p/--apiversion
+    """
+    if args.apiversion.lower() == 'v1':
+        return AssistantV1Backend(args)
+    if args.apiversion.lower() == 'v2':
+        return AssistantV2Backend(args)
+    raise ValueError('Unknown Watson Assistant API version "{}"'.format(
+        args.apiversion))
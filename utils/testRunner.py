@@ -0,0 +1,681 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Test runner shared by testConversation.py and testNLC.py
+
+    Sends every test utterance through a service backend (testBackends.py)
+    over one connection pool and rate limiter, with timeouts, retries,
+    hedging, a circuit breaker, checkpointing, response caching, archiving, sharding, chunked
+    output and sequential sampling.
+"""
+import os
+import csv
+import math
+import asyncio
+import pandas as pd
+
+from choose_auth import choose_auth
+from async_client import AsyncAssistantClient, DEFAULT_REQUEST_TIMEOUT
+from rate_limiter import RateLimiter
+from retry_policy import RetryPolicy, retries_file, status_code, \
+    NETWORK_ERROR_KEY
+from checkpoint import Checkpoint, checkpoint_file, UTTERANCE_KEY
+from response_cache import ResponseCache
+from response_archive import ResponseArchive, archive_file
+from perf_recorder import PerfRecorder, perf_file, SUCCESS_STATUS
+from circuit_breaker import CircuitBreaker, CircuitOpenError, \
+    DEFAULT_FAILURE_THRESHOLD
+from sequential_sampling import AccuracySampler, stratified_order, \
+    sampling_file, DEFAULT_CONFIDENCE_LEVEL
+from hedging import Hedger
+from sharding import parse_shard, select_shard, ROW_ID_COLUMN
+
+from __init__ import UTF_8, CONFIDENCE_COLUMN, \
+    UTTERANCE_COLUMN, PREDICTED_INTENT_COLUMN, \
+    DETECTED_ENTITY_COLUMN, DIALOG_RESPONSE_COLUMN, \
+    save_dataframe_as_csv, INTENT_JUDGE_COLUMN, BOOL_MAP, \
+    read_partial_credit_table, score_partial_credit, SCORE_COLUMN
+
+test_out_header = [PREDICTED_INTENT_COLUMN, CONFIDENCE_COLUMN,
+                   DETECTED_ENTITY_COLUMN, DIALOG_RESPONSE_COLUMN,
+                   SCORE_COLUMN]
+# Columns filled from the response, saved in the checkpoint
+response_columns = test_out_header[:4]
+
+MAX_RETRY_LIMIT = 5
+g_tested_utterances = 0
+
+def normalize_utterance(utterance):
+    """ Text actually sent to the service for an input utterance
+    """
+    # Replace newline chars before sending to WA
+    return utterance.replace('\n', ' ')
+
+async def post(backend, client, workspace_id, utterance, sem, limiter, retry_policy, perf, breaker, hedger):
+    """ Single post restrained by semaphore and request rate limiter,
+        retried according to the retry policy and hedged when slow.  Every
+        attempt is recorded.  Nothing is sent once the circuit breaker is
+        open.
+    """
+    attempt = 0
+    async with sem:
+        while True:
+            breaker.check()
+            try:
+                await limiter.acquire()
+                started = perf.start(attempt)
+                res = await hedger.send(
+                    lambda: backend.send(client, workspace_id, utterance),
+                    limiter)
+                perf.record(started, SUCCESS_STATUS, attempt)
+                limiter.on_success()
+                break
+            except Exception as e:
+                perf.record(started, status_code(e) or NETWORK_ERROR_KEY,
+                            attempt)
+                limiter.on_response(status_code(e))
+                if not retry_policy.should_retry(e, attempt):
+                    print(e)
+                    breaker.on_failure(e)
+                    raise e
+                attempt += 1
+                delay = retry_policy.backoff(e, attempt)
+                print(f"RETRY {attempt} in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+
+    global g_tested_utterances
+    g_tested_utterances += 1
+    if g_tested_utterances % 10 == 0:
+        print("Tested",g_tested_utterances, "utterances...")
+    return res
+
+async def fill_df(utterance, row_idx, results, backend, workspace_id, client, sem, limiter, retry_policy, perf, breaker, hedger, checkpoint, cache):
+    """ Send utterance to the service, or look it up in the response cache,
+        and save response to the result columns and checkpoint.
+        Returns the raw response.  Responses that cannot be analyzed count
+        as failures for the circuit breaker.
+    """
+    input_utterance = utterance
+    utterance = normalize_utterance(utterance)
+    resp = cache.get(utterance) if cache is not None else None
+    if resp is None:
+        resp = await post(backend, client, workspace_id, utterance, sem, limiter, retry_policy, perf, breaker, hedger)
+        if cache is not None:
+            cache.put(utterance, resp)
+    try:
+        for column, value in backend.parse(resp).items():
+            results[column][row_idx] = value
+        breaker.on_success()
+    except Exception as e:
+        print("analysis error",e)
+        breaker.on_failure(e)
+
+    if checkpoint is not None:
+        checkpoint.append(row_idx, input_utterance,
+                          {column: results[column][row_idx]
+                           for column in response_columns})
+    return resp
+
+async def fill_duplicates(row_indices, utterances, results, checkpoint,
+                          archive, row_offset, *fill_args):
+    """ Test the first of several rows with the same utterance and copy its
+        result to the others
+    """
+    first_idx = row_indices[0]
+    resp = await fill_df(utterances[first_idx], first_idx, results, *fill_args)
+    if archive is not None:
+        archive.write([row_offset + row_idx for row_idx in row_indices],
+                      utterances[first_idx], resp)
+    row_results = {column: results[column][first_idx]
+                   for column in response_columns}
+    for row_idx in row_indices[1:]:
+        for column, value in row_results.items():
+            results[column][row_idx] = value
+        if checkpoint is not None:
+            checkpoint.append(row_idx, utterances[row_idx], row_results)
+
+class HeldArchive:
+    """ Archive records held back until the rows kept after early stop are
+        known, then written renumbered like the saved rows
+    """
+    def __init__(self):
+        self.records = []
+
+    def write(self, row_indices, utterance, response):
+        self.records.append((row_indices, utterance, response))
+
+    def flush(self, archive, new_index):
+        """ Write the records of the rows in new_index, {old row: new row}
+        """
+        for row_indices, utterance, response in self.records:
+            kept = [new_index[row_idx] for row_idx in row_indices
+                    if row_idx in new_index]
+            if kept:
+                archive.write(kept, utterance, response)
+        self.records = []
+
+class TestChunk:
+    """ Rows of a test input that are tested together and saved at once
+    """
+    def __init__(self, in_df, out_df, test_column, row_offset, tested={}):
+        self.in_df = in_df
+        self.out_df = out_df
+        # Position of the first row in the test output
+        self.row_offset = row_offset
+
+        # Initial columns for test output
+        for column in test_out_header:
+            self.out_df[column] = ''
+
+        # Responses are collected in plain lists and assigned to out_df once
+        self.utterances = self.out_df[test_column].tolist()
+        self.results = {column: [''] * len(self.utterances)
+                        for column in response_columns}
+        for row_idx, record in tested.items():
+            for column in response_columns:
+                self.results[column][row_idx] = record[column]
+
+        # Send each distinct utterance once, duplicates share its result
+        self.duplicate_rows = {}
+        for row_idx, utterance in enumerate(self.utterances):
+            if row_idx not in tested:
+                utterance = normalize_utterance(utterance)
+                self.duplicate_rows.setdefault(utterance, []).append(row_idx)
+
+    def select(self, rows):
+        """ Keep only the given rows, in their input order
+        """
+        merged = self.in_df is self.out_df
+        self.out_df = self.out_df.iloc[rows].reset_index(drop=True)
+        if merged:
+            self.in_df = self.out_df
+        elif self.in_df is not None:
+            self.in_df = self.in_df.iloc[rows].reset_index(drop=True)
+        self.utterances = [self.utterances[row_idx] for row_idx in rows]
+        self.results = {column: [values[row_idx] for row_idx in rows]
+                        for column, values in self.results.items()}
+
+    def aggregate(self, args):
+        out_df = self.out_df
+        for column in response_columns:
+            out_df[column] = self.results[column]
+        if args.golden_intent_column is not None:
+            golden_intent_column = args.golden_intent_column
+            if self.in_df is None or \
+               golden_intent_column not in self.in_df.columns:
+                print("No golden intent column '{}' is found in input."
+                      .format(golden_intent_column))
+            else:  # Add INTENT_JUDGE_COLUMN based on golden_intent_column
+                out_df[INTENT_JUDGE_COLUMN] = \
+                    (self.in_df[golden_intent_column]
+                        == out_df[PREDICTED_INTENT_COLUMN]).map(BOOL_MAP)
+                out_df[SCORE_COLUMN] = \
+                    out_df[INTENT_JUDGE_COLUMN].map({'yes': 1, 'no': 0})
+
+        if args.partial_credit_table is not None:
+            credit_table = read_partial_credit_table(args.partial_credit_table)
+            out_df[SCORE_COLUMN] = score_partial_credit(
+                out_df[args.golden_intent_column],
+                out_df[PREDICTED_INTENT_COLUMN], credit_table)
+        return out_df
+
+class TestJob:
+    """ One input file tested against one workspace into one output file,
+        with its own retry counts, performance record, cache scope and
+        archive.
+
+        By default the whole input is tested as one chunk, checkpointed row
+        by row.  With a chunk size, the input is read, tested and appended
+        to the output one chunk at a time so memory stays flat; the output
+        itself is then the checkpoint a resumed run continues from.
+    """
+    def __init__(self, args, backend, infile, workspace_id, outfile,
+                 authenticator):
+        self.args = args
+        self.backend = backend
+        self.infile = infile
+        self.workspace_id = workspace_id
+        self.outfile = outfile
+        self.chunk_size = args.chunk_size
+        if args.early_stop_margin is not None:
+            if args.golden_intent_column is None or args.test_column is None:
+                raise ValueError("Early stop needs the test and golden "
+                                 "intent columns of the input")
+            if self.chunk_size is not None:
+                raise ValueError("Early stop cannot be used with chunks")
+
+        self.retry_policy = RetryPolicy(max_retries=MAX_RETRY_LIMIT)
+        self.perf = PerfRecorder()
+        self.breaker = CircuitBreaker(args.failure_threshold)
+        self.hedger = Hedger(args.hedge_budget)
+        # Response body sizes of the run, set once it completes
+        self.response_bytes = None
+
+        self.checkpoint = None
+        self.archive = None
+        self.chunk = None
+        self.skip_rows = 0
+        self.rows_written = 0
+        if self.chunk_size is None:
+            self.chunk = self.load()
+        else:
+            if args.archive:
+                self.open_archive(None)
+            if args.resume:
+                self.skip_rows, self.rows_written = \
+                    resume_position(outfile, args.shard)
+                print("Resuming {} after {} input rows".format(
+                    outfile, self.skip_rows))
+
+        self.cache = None
+        if args.cache_file is not None:
+            fingerprint = backend.fingerprint(authenticator, workspace_id)
+            if fingerprint is None:
+                print("Responses of {} are not cached, its content cannot "
+                      "be fingerprinted".format(workspace_id))
+            else:
+                # Responses differ with the request options too
+                self.cache = ResponseCache(
+                    args.cache_file, fingerprint,
+                    '{} {} lean={}'.format(
+                        backend.name, backend.version, backend.lean))
+
+    def open_archive(self, rows):
+        self.archive = ResponseArchive(
+            archive_file(self.outfile),
+            {'workspace_id': self.workspace_id,
+             'apiversion': self.backend.name, 'rows': rows})
+        self.archive.open(self.args.resume)
+
+    def load(self):
+        """ Whole input as one chunk, with rows of a resumed checkpoint
+            already filled in
+        """
+        in_df, out_df, test_column = next(
+            read_test_input(self.args, self.infile))
+
+        # Results are appended to the checkpoint as they complete
+        self.checkpoint = Checkpoint(checkpoint_file(self.outfile),
+                                     self.workspace_id, len(out_df))
+        utterances = out_df[test_column].tolist()
+        tested = {}
+        if self.args.resume:
+            tested = {row_idx: record
+                      for row_idx, record in self.checkpoint.load().items()
+                      if row_idx < len(utterances) and
+                      record[UTTERANCE_KEY] == utterances[row_idx]}
+            if self.args.archive:
+                # Rows tested by the killed run but lost from its archive
+                # are sent again
+                self.open_archive(len(out_df))
+                tested = {row_idx: record
+                          for row_idx, record in tested.items()
+                          if row_idx in self.archive.rows}
+            print("Resuming from {}, {} utterances already tested".format(
+                self.checkpoint.file, len(tested)))
+        elif self.args.archive:
+            self.open_archive(len(out_df))
+        self.checkpoint.open(tested)
+        return TestChunk(in_df, out_df, test_column, 0, tested)
+
+    def chunks(self):
+        if self.chunk is not None:
+            yield self.chunk
+            return
+        for in_df, out_df, test_column in read_test_input(
+                self.args, self.infile, self.chunk_size, self.skip_rows):
+            yield TestChunk(in_df, out_df, test_column, self.rows_written)
+
+    def sampler(self, chunk):
+        """ Accuracy sampler of the chunk with its resumed rows added, or
+            None without early stop
+        """
+        args = self.args
+        if args.early_stop_margin is None:
+            return None
+        if args.golden_intent_column not in chunk.in_df.columns:
+            raise ValueError("No golden intent column '{}' is found in input."
+                             .format(args.golden_intent_column))
+        # One sample per distinct utterance, with the golden intent of its
+        # first row
+        golden = {}
+        for utterance, intent in zip(
+                chunk.utterances,
+                chunk.in_df[args.golden_intent_column].tolist()):
+            golden.setdefault(normalize_utterance(utterance), intent)
+        sampler = AccuracySampler(golden, args.early_stop_margin,
+                                  args.confidence_level,
+                                  args.early_stop_per_intent)
+        untested = set(row_idx for rows in chunk.duplicate_rows.values()
+                       for row_idx in rows)
+        for row_idx, utterance in enumerate(chunk.utterances):
+            if row_idx not in untested:
+                sampler.add(normalize_utterance(utterance),
+                            chunk.results[PREDICTED_INTENT_COLUMN][row_idx])
+        return sampler
+
+    async def run(self, client, sem, limiter):
+        """ Test and save every chunk.  A chunk with failed utterances is
+            not saved, its other utterances are still tested unless the
+            circuit breaker opens.
+
+            With early stop, utterances are sent in stratified random order
+            and the rest is cancelled once accuracy is within the margin.
+            Only the tested rows are saved.
+        """
+        for chunk in self.chunks():
+            print("Testing",len(chunk.duplicate_rows),"distinct utterances in",
+                  sum(len(rows) for rows in chunk.duplicate_rows.values()),
+                  "rows of",self.infile,"against",self.workspace_id,"...")
+            groups = list(chunk.duplicate_rows.values())
+            sampler = self.sampler(chunk)
+            archive = self.archive
+            if sampler is not None and archive is not None:
+                archive = HeldArchive()
+            stopped = sampler is not None and sampler.done()
+            if sampler is not None:
+                position = {utterance: order for order, utterance in enumerate(
+                    stratified_order(sampler.golden, self.args.sampling_seed))}
+                groups.sort(key=lambda rows: position[normalize_utterance(
+                    chunk.utterances[rows[0]])])
+
+            async def test_group(row_indices):
+                nonlocal stopped
+                await fill_duplicates(row_indices, chunk.utterances,
+                                      chunk.results, self.checkpoint,
+                                      archive, chunk.row_offset,
+                                      self.backend, self.workspace_id,
+                                      client, sem, limiter,
+                                      self.retry_policy, self.perf,
+                                      self.breaker, self.hedger,
+                                      self.checkpoint, self.cache)
+                if sampler is None:
+                    return
+                first_idx = row_indices[0]
+                sampler.add(normalize_utterance(chunk.utterances[first_idx]),
+                            chunk.results[PREDICTED_INTENT_COLUMN][first_idx])
+                if not stopped and sampler.done():
+                    stopped = True
+                    for task in tasks:
+                        if task is not asyncio.current_task():
+                            task.cancel()
+
+            tasks = [asyncio.ensure_future(test_group(row_indices))
+                     for row_indices in groups]
+            if stopped:
+                for task in tasks:
+                    task.cancel()
+            try:
+                outcomes = await asyncio.gather(*tasks,
+                                                return_exceptions=True)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+            errors = [outcome for outcome in outcomes
+                      if isinstance(outcome, BaseException) and not
+                      (stopped and isinstance(outcome,
+                                              asyncio.CancelledError))]
+            if len(errors) != 0:
+                self.print_partial_results()
+                if self.breaker.reason is not None:
+                    raise CircuitOpenError(self.breaker.reason)
+                raise RuntimeError("{} utterances failed, first error: {}"
+                                   .format(len(errors), errors[0]))
+            if sampler is not None:
+                untested = set(row_idx
+                               for rows, outcome in zip(groups, outcomes)
+                               if outcome is not None for row_idx in rows)
+                kept = [row_idx for row_idx in range(len(chunk.utterances))
+                        if row_idx not in untested]
+                rows_total = len(chunk.utterances)
+                chunk.select(kept)
+                if archive is not self.archive:
+                    archive.flush(self.archive, {
+                        chunk.row_offset + row_idx: chunk.row_offset + new_idx
+                        for new_idx, row_idx in enumerate(kept)})
+                # Cached utterances were not sent either
+                calls_started = self.perf.calls_sent + \
+                    (self.cache.hits if self.cache is not None else 0)
+                sampler.save(sampling_file(self.outfile), len(kept),
+                             rows_total,
+                             self.perf.attempts_sent + self.hedger.hedges,
+                             len(groups) - calls_started)
+            self.save(chunk)
+
+    def save(self, chunk):
+        print("Aggregating output...")
+        out_df = chunk.aggregate(self.args)
+        if self.chunk_size is None:
+            save_dataframe_as_csv(df=out_df, file=self.outfile)
+            print("Wrote result file to {}".format(self.outfile))
+            self.checkpoint.remove()
+            return
+
+        # Write the chunk in one call so an interruption rarely tears a row
+        first = self.rows_written == 0
+        with open(self.outfile, 'w' if first else 'a', encoding=UTF_8,
+                  newline='') as f:
+            f.write(out_df.to_csv(quoting=csv.QUOTE_ALL, index=False,
+                                  header=first))
+        self.rows_written += len(out_df)
+        print("Wrote {} rows to {}".format(self.rows_written, self.outfile))
+
+    def print_partial_results(self):
+        if self.checkpoint is not None:
+            print("Completed utterances are kept in {}, rerun with --resume "
+                  "to test the rest".format(self.checkpoint.file))
+        else:
+            print("{} rows are saved to {}, rerun with --resume to test the "
+                  "rest".format(self.rows_written, self.outfile))
+
+    def close(self):
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+        if self.archive is not None:
+            self.archive.close()
+        self.retry_policy.save(retries_file(self.outfile))
+        extra = {}
+        if self.hedger.budget > 0:
+            extra['hedging'] = self.hedger.summary()
+        if self.response_bytes is not None:
+            extra['response_bytes'] = self.response_bytes
+        self.perf.save(perf_file(self.outfile), extra)
+        if self.cache is not None:
+            self.cache.close()
+            self.cache.print_stats()
+
+async def gather_all_tasks(jobs, args, backend, authenticator):
+    """ Test every job over one shared connection pool and rate limiter.
+        Returns the exception each job failed with, or None.
+    """
+    concurrency = max(1, math.ceil(args.rate_limit))
+    sem = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(args.rate_limit)
+    # Hedges are sent beside the semaphore, at most one for each request in
+    # flight, and must not wait for a connection when the others are slow
+    max_connections = concurrency
+    if args.hedge_budget > 0:
+        max_connections += concurrency
+    async with AsyncAssistantClient(
+            version=backend.version,
+            authenticator=authenticator,
+            service_url=args.url,
+            disable_ssl_verification=eval(args.disable_ssl),
+            max_connections=max_connections,
+            timeout=args.timeout) as client:
+        errors = await asyncio.gather(
+            *(job.run(client, sem, limiter) for job in jobs),
+            return_exceptions=True)
+
+        # Measured on the responses of the test, runs with and without lean
+        # mode compare by their perf files
+        responses = client.responses
+        response_bytes = {'lean': backend.lean, 'responses': responses,
+                          'bytes_per_response':
+                              round(client.bytes_received / responses)
+                              if responses else None}
+        print("Received {bytes_per_response} bytes per response".format(
+            **response_bytes))
+        for job in jobs:
+            job.response_bytes = response_bytes
+        return errors
+
+def read_test_input(args, infile, chunk_size=None, skip_rows=0):
+    """ Yield (input df, output df, test column) for each chunk of the test
+        input after the first skip_rows rows, or once for the whole input
+    """
+    test_column = UTTERANCE_COLUMN
+    read_args = {'quoting': csv.QUOTE_ALL, 'encoding': UTF_8,
+                 'keep_default_na': False, 'chunksize': chunk_size}
+    if args.test_column is not None:  # Test input has multiple columns
+        test_column = args.test_column
+        read_args['skiprows'] = range(1, skip_rows + 1)
+    else:
+        read_args['header'] = None
+        read_args['skiprows'] = skip_rows
+    reader = pd.read_csv(infile, **read_args)
+    if chunk_size is None:
+        reader = [reader]
+
+    row_offset = skip_rows
+    for in_df in reader:
+        in_df = in_df.reset_index(drop=True)
+        rows = len(in_df)
+        if args.test_column is not None:
+            if test_column not in in_df:  # Look for target test_column
+                raise ValueError(
+                    "Test column {} doesn't exist in file.".format(test_column))
+
+            if args.merge_input:  # Merge rest of columns from input to output
+                out_df = in_df
+            else:
+                out_df = in_df[[test_column]].copy()
+                out_df.columns = [test_column]
+
+        else:
+            if in_df.shape[1] != 1:
+                raise ValueError('Unknown test column')
+            # Test input has only one column and no header
+            out_df = in_df
+            out_df.columns = [test_column]
+            in_df = None
+
+        if args.shard is not None:
+            merged = out_df is in_df
+            out_df = select_shard(out_df, args.shard, row_offset)
+            if merged:
+                in_df = out_df
+            elif in_df is not None:
+                in_df = select_shard(in_df, args.shard, row_offset)
+        row_offset += rows
+        yield in_df, out_df, test_column
+
+def resume_position(outfile, shard):
+    """ (input rows consumed, output rows written) by the chunks already
+        saved to the output
+    """
+    if not os.path.exists(outfile):
+        return 0, 0
+    rows_written = 0
+    last_row_id = -1
+    for out_df in pd.read_csv(outfile, quoting=csv.QUOTE_ALL, encoding=UTF_8,
+                              keep_default_na=False, chunksize=10000):
+        rows_written += len(out_df)
+        if shard is not None and len(out_df) != 0:
+            last_row_id = out_df[ROW_ID_COLUMN].iloc[-1]
+    if shard is not None:
+        return int(last_row_id) + 1, rows_written
+    return rows_written, rows_written
+
+def job_specs(args):
+    """ (input file, workspace id, output file) of each test job. Either
+        every option has one value per job, or a single input file is
+        tested against several workspaces.
+    """
+    num_jobs = max(len(args.infile), len(args.workspace_id))
+    if len(args.infile) not in [1, num_jobs] or \
+       len(args.workspace_id) not in [1, num_jobs] or \
+       len(args.outfile) != num_jobs:
+        raise ValueError(
+            "Expected one output file per workspace and one input file, "
+            "or as many input files as workspaces")
+    infiles = args.infile * num_jobs if len(args.infile) == 1 else args.infile
+    workspace_ids = args.workspace_id * num_jobs \
+        if len(args.workspace_id) == 1 else args.workspace_id
+    return list(zip(infiles, workspace_ids, args.outfile))
+
+def run(args, backend):
+    """ Test every (input file, workspace id, output file) job of args
+        with the backend
+    """
+    authenticator = choose_auth(args)
+
+    jobs = []
+    try:
+        for infile, workspace_id, outfile in job_specs(args):
+            jobs.append(TestJob(args, backend, infile, workspace_id, outfile,
+                                authenticator))
+        errors = asyncio.run(gather_all_tasks(jobs, args, backend,
+                                              authenticator))
+    finally:
+        for job in jobs:
+            job.close()
+
+    # Completed jobs are saved even if others failed
+    for job, error in zip(jobs, errors):
+        if error is not None:
+            print("Test of {} against {} failed: {}".format(
+                job.outfile, job.workspace_id, error))
+    for error in errors:
+        if error is not None:
+            raise error
+
+def add_runner_arguments(parser):
+    """ Options of the shared runner, common to every test script
+    """
+    parser.add_argument('-r', '--rate_limit', type=float, default=1,
+                        help='Maximum number of requests per second')
+    parser.add_argument('--resume', action='store_true', default=False,
+                        help='Resume an interrupted test from its checkpoint, only untested utterances are sent')
+    parser.add_argument('--cache_file', type=str,
+                        help='SQLite response cache, utterances already answered by the same model content are not sent again')
+    parser.add_argument('--archive', action='store_true', default=False,
+                        help='Archive raw responses to a compressed JSONL file next to the output, for offline analysis with responsemetrics.py')
+    parser.add_argument('--chunk_size', type=int,
+                        help='Stream the input this many rows at a time, appending each tested chunk to the output. Memory stays flat for any input size')
+    parser.add_argument('--shard', type=parse_shard,
+                        help='Test only shard i/N of the input rows, merge shard outputs with mergeShards.py')
+    parser.add_argument('--early_stop_margin', type=float,
+                        help='Test utterances in random order stratified by golden intent and stop once accuracy is known within this margin, e.g. 0.01 for +/-1%%. Needs -t and -g')
+    parser.add_argument('--early_stop_per_intent', action='store_true',
+                        default=False,
+                        help='With early stop, also wait until the accuracy of every golden intent is within the margin')
+    parser.add_argument('--confidence_level', type=float,
+                        default=DEFAULT_CONFIDENCE_LEVEL,
+                        help='Confidence level of the early stop accuracy interval')
+    parser.add_argument('--sampling_seed', type=int, default=0,
+                        help='Seed of the early stop test order')
+    parser.add_argument('--lean', action='store_true', default=False,
+                        help='Ask Assistant v2 for no debug output and no context in its responses. The bytes received per response are reported')
+    parser.add_argument('--timeout', type=float,
+                        default=DEFAULT_REQUEST_TIMEOUT,
+                        help='Seconds before a request is abandoned and retried')
+    parser.add_argument('--hedge_budget', type=float, default=0.0,
+                        help='Share of requests that may be sent twice when slower than the observed p95 latency, the first answer is used. 0.05 allows 5%% extra requests, 0 disables hedging')
+    parser.add_argument('--failure_threshold', type=int,
+                        default=DEFAULT_FAILURE_THRESHOLD,
+                        help='Stop the test after this many utterances in a row failed. Authentication errors and unknown workspaces stop it at once')
@@ -20,28 +20,38 @@
     | utterance | intent |
     Entity input schema (headerless):
     | entity | value | synonym/pattern 0 | synonym/pattern 1 | ...
+
+    Every workspace created is tagged in its metadata with a fingerprint of
+    the content sent.  With --reuse an existing workspace with the same
+    fingerprint is used instead of training a new one, and --workspace_limit
+    deletes the least recently used tagged workspaces to stay under a limit.
 """
+import hashlib
 import json
-from time import sleep
+import os
+import time
 import csv
 import pandas as pd
 from argparse import ArgumentParser
 from ibm_watson import AssistantV1
+from ibm_cloud_sdk_core import ApiException
 from ibm_cloud_sdk_core.authenticators import IAMAuthenticator, BearerTokenAuthenticator
 import sys
 import traceback
 
 from choose_auth import choose_auth
+from training_poller import assistant_training_poller
 
 from __init__ import UTF_8, DEFAULT_WA_VERSION,\
                   UTTERANCE_COLUMN, INTENT_COLUMN, \
-                  TIME_TO_WAIT, WORKSPACE_ID_TAG
+                  WORKSPACE_ID_TAG, get_service_client, \
+                  TRAINING_FINGERPRINT_KEY, LAST_USED_KEY, RUN_STARTED_ENV, \
+                  utc_timestamp
 
 ENTITY_COLUMN = 'entity'
 ENTITY_VALUE_COLUMN = 'value'
 EXAMPLES_COLUMN = 'examples'
 ENTITY_VALUES_ARR_COLUMN = 'values'
-SLEEP_INCRE = 10
 INTENT_CSV_HEADER = [UTTERANCE_COLUMN, INTENT_COLUMN]
 ENTITY_CSV_HEADER = [ENTITY_COLUMN, ENTITY_VALUE_COLUMN]
 
@@ -100,10 +110,74 @@ def to_entity_values(entity_group):
     return values
 
 
-def func(args):
+def training_fingerprint(workspace):
+    """ sha256 of the workspace content, whatever its name and description
+    """
+    return hashlib.sha256(json.dumps(workspace, sort_keys=True)
+                          .encode(UTF_8)).hexdigest()
+
+
+def tagged_workspaces(conv):
+    """ The workspaces carrying a training fingerprint, and the number of
+        workspaces in the instance
+    """
+    workspaces = []
+    count = 0
+    cursor = None
+    while True:
+        resp = conv.list_workspaces(cursor=cursor).get_result()
+        for workspace in resp['workspaces']:
+            count += 1
+            if TRAINING_FINGERPRINT_KEY in (workspace.get('metadata') or {}):
+                workspaces.append(workspace)
+        cursor = resp.get('pagination', {}).get('next_cursor')
+        if cursor is None:
+            return workspaces, count
+
+
+def last_used(workspace):
+    return workspace['metadata'].get(LAST_USED_KEY, '')
+
+
+def find_trained_workspace(workspaces, fingerprint):
+    """ Most recently used workspace trained on fingerprint, None if none
+    """
+    matches = [workspace for workspace in workspaces
+               if workspace['metadata'][TRAINING_FINGERPRINT_KEY] ==
+               fingerprint and workspace.get('status') != 'Failed']
+    return max(matches, key=last_used, default=None)
+
+
+def evict_workspaces(conv, workspaces, count, limit, reserve=1, keep=()):
+    """ Delete the least recently used tagged workspaces until reserve more
+        workspaces fit under limit.  Workspaces still training, used by
+        the current run or trained on a fingerprint in keep are kept
+    """
+    run_started = os.environ.get(RUN_STARTED_ENV)
+    evictable = sorted(
+        [workspace for workspace in workspaces
+         if workspace.get('status', 'Available') == 'Available' and
+         (run_started is None or last_used(workspace) < run_started) and
+         workspace['metadata'][TRAINING_FINGERPRINT_KEY] not in keep],
+        key=last_used)
+    for workspace in evictable[:max(count - limit + reserve, 0)]:
+        try:
+            conv.delete_workspace(workspace_id=workspace[WORKSPACE_ID_TAG])
+        except ApiException as e:
+            # Evicted meanwhile by another training
+            if e.code != 404:
+                raise
+        print('Evicted workspace {} last used {}'.format(
+            workspace[WORKSPACE_ID_TAG], last_used(workspace) or 'never'),
+            file=sys.stderr)
+
+
+def build_workspace(args, intent_df=None):
+    """ Content of the workspace trained by args, without its name and
+        description.  intent_df, the headerless intent frame, replaces
+        args.intentfile when the caller already has it in memory
+    """
     entities = []
-    workspace_name = ''
-    workspace_description = ''
     intents = []
     language = 'en'
     dialog_nodes = []
@@ -132,15 +206,21 @@ def func(args):
             if 'system_settings' in workspace_json:
                 system_settings = workspace_json['system_settings']
 
-    if args.intentfile is not None:
+    if intent_df is not None:
+        # Read back as from the intent file, empty cells as empty strings
+        intent_df = intent_df.set_axis(INTENT_CSV_HEADER, axis=1).fillna('')
+    elif args.intentfile is not None:
+        intent_df = pd.read_csv(filepath_or_buffer=args.intentfile, quoting=csv.QUOTE_ALL,
+                                encoding=UTF_8, header=None,
+                                names=INTENT_CSV_HEADER,
+                                keep_default_na=False)
+
+    if intent_df is not None:
         # First, group utterances by INTENT_COLUMN. In each intent group,
         # construct the CreateIntent[] and return as a cell of the series.
         # Convert the series into dataframe and restore the intent column
         # from index to an explicit column.
-        intent_df = pd.read_csv(filepath_or_buffer=args.intentfile, quoting=csv.QUOTE_ALL,
-                                encoding=UTF_8, header=None,
-                                names=INTENT_CSV_HEADER,
-                                keep_default_na=False) \
+        intent_df = intent_df \
                       .groupby(by=[INTENT_COLUMN]).apply(to_examples) \
                       .to_frame().reset_index(level=[INTENT_COLUMN]) \
                       .rename(columns={0: EXAMPLES_COLUMN})
@@ -175,53 +255,100 @@ def func(args):
                      'values': row[ENTITY_VALUES_ARR_COLUMN]}
                     for _, row in entity_df.iterrows()]
 
-    authenticator = choose_auth(args)
+    # Tags copied along with the base JSON of a tagged workspace
+    metadata = {key: value for key, value in metadata.items()
+                if key not in (TRAINING_FINGERPRINT_KEY, LAST_USED_KEY)}
+    return {'language': language, 'intents': intents,
+            'entities': entities, 'dialog_nodes': dialog_nodes,
+            'counterexamples': counterexamples, 'metadata': metadata,
+            'learning_opt_out': learning_opt_out,
+            'system_settings': system_settings}
 
-    conv = AssistantV1(
-        version=args.version,
-        authenticator=authenticator
-    )
-    conv.set_disable_ssl_verification(eval(args.disable_ssl))
-    conv.set_service_url(args.url)
+
+def service_client(args):
+    # Workspaces trained together share the client and its poller
+    return get_service_client(AssistantV1, choose_auth(args), args.url,
+                              args.version, args.disable_ssl)
+
+
+def reserve_workspaces(trainings, limit, slots=None):
+    """ Evict once for trainings, the (args, intent_df) of workspaces about
+        to train together, so that they never exceed limit between them.
+        A training that will reuse a workspace takes no slot and its
+        workspace is kept.  At most slots new workspaces exist at once
+    """
+    conv = service_client(trainings[0][0])
+    fingerprints = [training_fingerprint(build_workspace(args, intent_df))
+                    for args, intent_df in trainings]
+    workspaces, count = tagged_workspaces(conv)
+    reused = {fingerprint for (args, _), fingerprint
+              in zip(trainings, fingerprints)
+              if args.reuse and
+              find_trained_workspace(workspaces, fingerprint) is not None}
+    new = len([fingerprint for fingerprint in fingerprints
+               if fingerprint not in reused])
+    evict_workspaces(conv, workspaces, count, limit,
+                     reserve=min(new, slots or new), keep=reused)
+
+
+def func(args, intent_df=None, out=None):
+    """ Train a workspace and print its JSON to out (stdout by default).
+        intent_df, the headerless intent frame, replaces args.intentfile
+        when the caller already has it in memory
+    """
+    workspace_name = ''
+    workspace_description = ''
+    workspace = build_workspace(args, intent_df)
+    conv = service_client(args)
 
     if args.workspace_name is not None:
         workspace_name = args.workspace_name
     if args.workspace_description is not None:
         workspace_description = args.workspace_description
 
-    # Create workspace with provided content
-    raw_resp = conv.create_workspace(name=workspace_name, language=language,
-                                 description=workspace_description,
-                                 intents=intents, entities=entities,
-                                 dialog_nodes=dialog_nodes,
-                                 counterexamples=counterexamples,
-                                 metadata=metadata,
-                                 learning_opt_out=learning_opt_out,
-                                 system_settings=system_settings)
-    try:
-       #V2 API syntax
-       resp = raw_resp.get_result()
-    except:
-       #V1 API syntax
-       resp = raw_resp
-
-    # Poke the training status every SLEEP_INCRE secs
-    sleep_counter = 0
-    while sleep_counter < TIME_TO_WAIT:
-        raw_resp = conv.get_workspace(workspace_id=resp[WORKSPACE_ID_TAG])
+    fingerprint = training_fingerprint(workspace)
+    poller = assistant_training_poller(conv)
+
+    reused = None
+    if args.reuse or args.workspace_limit is not None:
+        workspaces, count = tagged_workspaces(conv)
+        if args.reuse:
+            reused = find_trained_workspace(workspaces, fingerprint)
+        if reused is None and args.workspace_limit is not None:
+            evict_workspaces(conv, workspaces, count, args.workspace_limit)
+
+    if reused is not None:
+        workspace_id = reused[WORKSPACE_ID_TAG]
+        print('Reusing workspace {} trained on the same data'.format(
+            workspace_id), file=sys.stderr)
+        conv.update_workspace(workspace_id=workspace_id,
+                              metadata=dict(reused['metadata'],
+                                            **{LAST_USED_KEY: utc_timestamp()}))
+        if reused.get('status', 'Available') == 'Available':
+            resp = conv.get_workspace(workspace_id=workspace_id).get_result()
+        else:
+            resp = poller.wait(workspace_id)
+    else:
+        # Create workspace with provided content
+        workspace['metadata'] = dict(workspace['metadata'], **{
+            TRAINING_FINGERPRINT_KEY: fingerprint,
+            LAST_USED_KEY: utc_timestamp()})
+        started = time.monotonic()
+        raw_resp = conv.create_workspace(name=workspace_name,
+                                         description=workspace_description,
+                                         **workspace)
         try:
            #V2 API syntax
            resp = raw_resp.get_result()
         except:
            #V1 API syntax
            resp = raw_resp
-        if resp['status'] == 'Available':
-            print(json.dumps(resp, indent=4))  # double quoted valid JSON
-            return
-        sleep_counter += SLEEP_INCRE
-        sleep(10)
 
-    raise TrainTimeoutException('Assistant training is timeout')
+        resp = poller.wait(resp[WORKSPACE_ID_TAG], started)
+    if resp is None:
+        raise TrainTimeoutException('Assistant training is timeout')
+    print(json.dumps(resp, indent=4),  # double quoted valid JSON
+          file=out or sys.stdout)
 
 
 def create_parser():
@@ -246,6 +373,10 @@ def create_parser():
                         help='Authentication type, IAM is default, bearer is required for CP4D.', choices=['iam', 'bearer'])
     parser.add_argument('--disable_ssl', type=str, default="False",
                         help="Disables SSL verification. BE CAREFUL ENABLING THIS. Default is False", choices=["True", "False"])
+    parser.add_argument('--reuse', action='store_true',
+                        help='Use an available workspace trained on the same data instead of training a new one')
+    parser.add_argument('--workspace_limit', type=int,
+                        help='Delete the least recently used workspaces created by this tool to keep at most this many workspaces')
     return parser
 
 
@@ -20,7 +20,8 @@
     | utterance | intent |
 """
 import json
-from time import sleep
+import sys
+import time
 import csv
 import pandas as pd
 from argparse import ArgumentParser
@@ -28,11 +29,11 @@ from ibm_watson import NaturalLanguageUnderstandingV1
 from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
 
 from choose_auth import choose_auth
+from training_poller import nlu_training_poller
 
 from __init__ import UTF_8, \
                   UTTERANCE_COLUMN, INTENT_COLUMN, \
-                  TIME_TO_WAIT, CLASSIFIER_ID_TAG
-SLEEP_INCRE = 10
+                  CLASSIFIER_ID_TAG, get_service_client
 CLASS_CSV_HEADER = [UTTERANCE_COLUMN, INTENT_COLUMN]
 
 
@@ -42,17 +43,16 @@ class TrainTimeoutException(Exception):
     def __init__(self, message):
         self.message = message
 
-def func(args):
+def func(args, out=None):
+    """ Train a classifier and print its JSON to out (stdout by default)
+    """
     classifier_name = ''
 
     authenticator = choose_auth(args)
 
-    nlu = NaturalLanguageUnderstandingV1(
-        version='2022-04-07',
-        authenticator=authenticator
-    ) 
-    nlu.set_service_url(args.url)
-    nlu.set_disable_ssl_verification(eval(args.disable_ssl))
+    # Classifiers trained together share the client and its poller
+    nlu = get_service_client(NaturalLanguageUnderstandingV1, authenticator,
+                             args.url, '2022-04-07', args.disable_ssl)
     
     classifier_name = "My Classifier"
     if args.classifier_name is not None:
@@ -64,6 +64,7 @@ def func(args):
     else:
         exit(-1)
     
+    started = time.monotonic()
     with open(training_data_file, 'r') as training_data:
         classifier = nlu.create_classifications_model(
                 language='en',
@@ -74,19 +75,11 @@ def func(args):
                 model_version="1.0.1"
                 ).get_result()
 
-    resp = classifier
-    # Poke the training status every SLEEP_INCRE secs
-    sleep_counter = 0
-    while sleep_counter < TIME_TO_WAIT:
-        raw_resp = nlu.get_classifications_model(model_id=resp['model_id'])
-        resp = raw_resp.get_result()
-        #try status again 
-        if resp['status'] == 'available':
-            print(json.dumps(resp, indent=4))  # double quoted valid JSON
-            return
-        sleep_counter += SLEEP_INCRE
-        sleep(SLEEP_INCRE)
-    raise TrainTimeoutException('NLU training timeout')
+    resp = nlu_training_poller(nlu).wait(classifier['model_id'], started)
+    if resp is None:
+        raise TrainTimeoutException('NLU training timeout')
+    print(json.dumps(resp, indent=4),  # double quoted valid JSON
+          file=out or sys.stdout)
 
 
 def create_parser():
@@ -0,0 +1,206 @@
+# coding: utf-8
+
+# Copyright 2018 IBM All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Adaptive polling of workspace and classifier training
+
+    One poller per service client tracks every model still training, on an
+    event loop of its own.  A model is first checked after a short interval
+    that grows by BACKOFF up to MAX_INTERVAL, so a small workspace is seen
+    as soon as it is available and a large one is not polled needlessly.
+    With several models pending, a single list call fetches the status of
+    all of them.  The training time observed for each model is reported.
+"""
+import asyncio
+import concurrent.futures
+import sys
+import threading
+import time
+
+from __init__ import TIME_TO_WAIT
+
+INITIAL_INTERVAL = 1.0
+MAX_INTERVAL = 10.0
+BACKOFF = 1.5
+# Slack given to the poll loop beyond the timeout before wait() gives up
+WAIT_MARGIN = 60.0
+
+
+class TrainingFailedError(Exception):
+    """ Raised when the service reports that training failed
+    """
+
+
+class TrainingPoller:
+    """ Waits for the models of a service to finish training.  list_models()
+        returns every model and get_model(model_id) one of them, as dicts
+        with id_key and a status
+    """
+    def __init__(self, list_models, get_model, id_key, available,
+                 failed=(), initial_interval=INITIAL_INTERVAL,
+                 max_interval=MAX_INTERVAL, backoff=BACKOFF,
+                 timeout=TIME_TO_WAIT):
+        self.list_models = list_models
+        self.get_model = get_model
+        self.id_key = id_key
+        self.available = available
+        self.failed = failed
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        # model id -> [future, started, interval, next poll time]
+        self.pending = {}
+        self.training_times = {}
+        self.list_calls = 0
+        self.get_calls = 0
+        self.loop = None
+        self.task = None
+        self.changed = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever,
+                                 daemon=True).start()
+
+    def wait(self, model_id, started=None):
+        """ Model once available, None if it still trains after the timeout.
+            started is the time.monotonic() training began at, now by
+            default.  Safe to call from several threads
+        """
+        self.start()
+        started = started or time.monotonic()
+        result = asyncio.run_coroutine_threadsafe(
+            self.wait_async(model_id, started), self.loop)
+        try:
+            return result.result(self.timeout + WAIT_MARGIN -
+                                 (time.monotonic() - started))
+        except concurrent.futures.TimeoutError:
+            result.cancel()
+            self.loop.call_soon_threadsafe(self.pending.pop, model_id, None)
+            return None
+
+    async def wait_async(self, model_id, started):
+        future = self.loop.create_future()
+        now = time.monotonic()
+        self.pending[model_id] = [future, started, self.initial_interval,
+                                  now + self.initial_interval]
+        if self.task is None or self.task.done():
+            self.changed = asyncio.Event()
+            self.task = self.loop.create_task(self.poll())
+        else:
+            self.changed.set()
+        return await future
+
+    async def fetch(self):
+        """ Status of the pending models, by id
+        """
+        loop = asyncio.get_running_loop()
+        models = {}
+        if len(self.pending) > 1:
+            self.list_calls += 1
+            for model in await loop.run_in_executor(None, self.list_models):
+                if model[self.id_key] in self.pending:
+                    models[model[self.id_key]] = model
+        for model_id in list(self.pending):
+            if model_id not in models:
+                self.get_calls += 1
+                models[model_id] = await loop.run_in_executor(
+                    None, self.get_model, model_id)
+        return models
+
+    async def poll(self):
+        """ Polls until no model is pending.  Any error, from the service or
+            in the status it returned, fails every pending wait
+        """
+        try:
+            await self.poll_pending()
+        except Exception as e:
+            for future, _, _, _ in self.pending.values():
+                if not future.done():
+                    future.set_exception(e)
+            self.pending.clear()
+
+    async def poll_pending(self):
+        while self.pending:
+            delay = min(entry[3] for entry in self.pending.values()) - \
+                time.monotonic()
+            if delay > 0:
+                # A model added meanwhile may be due sooner
+                self.changed.clear()
+                try:
+                    await asyncio.wait_for(self.changed.wait(), delay)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+            models = await self.fetch()
+            now = time.monotonic()
+            for model_id, model in models.items():
+                if model_id not in self.pending:
+                    continue
+                entry = self.pending[model_id]
+                future, started, interval, next_poll = entry
+                if model['status'] == self.available:
+                    self.training_times[model_id] = now - started
+                    print('{} trained in {:.1f}s'.format(
+                        model_id, now - started), file=sys.stderr)
+                    future.set_result(model)
+                elif model['status'] in self.failed:
+                    future.set_exception(TrainingFailedError(
+                        '{} training {}'.format(model_id, model['status'])))
+                elif now - started >= self.timeout:
+                    future.set_result(None)
+                else:
+                    if next_poll <= now:
+                        entry[2] = min(interval * self.backoff,
+                                       self.max_interval)
+                        entry[3] = now + entry[2]
+                    continue
+                del self.pending[model_id]
+
+
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+
+def assistant_training_poller(client):
+    """ Shared poller of the Assistant v1 workspaces of client
+    """
+    with _pollers_lock:
+        if id(client) not in _pollers:
+            _pollers[id(client)] = TrainingPoller(
+                lambda: client.list_workspaces().get_result()['workspaces'],
+                lambda workspace_id: client.get_workspace(
+                    workspace_id=workspace_id).get_result(),
+                'workspace_id', 'Available', failed=('Failed',))
+        return _pollers[id(client)]
+
+
+def nlu_training_poller(client):
+    """ Shared poller of the NLU classifications models of client
+    """
+    with _pollers_lock:
+        if id(client) not in _pollers:
+            _pollers[id(client)] = TrainingPoller(
+                lambda: client.list_classifications_models()
+                              .get_result()['models'],
+                lambda model_id: client.get_classifications_model(
+                    model_id=model_id).get_result(),
+                'model_id', 'available', failed=('error',))
+        return _pollers[id(client)]